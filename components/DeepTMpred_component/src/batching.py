@@ -0,0 +1,71 @@
+"""
+Length-bucketed batching for the DeepTMpred model. The sequences are sorted by length and
+grouped into batches under a budget of padded tokens, so a batch never pads short sequences
+to the longest sequence of the whole partition and the memory use per batch stays bounded.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# the ESM batch converter adds a begin and an end token to every sequence
+SPECIAL_TOKENS = 2
+
+
+def length_bucketed_batches(lengths: Sequence[int], max_tokens: int,
+                            max_batch_size: Optional[int] = None) -> List[List[int]]:
+    """
+    Group the records into batches of similar length.
+
+    The padded size of a batch (number of sequences * longest sequence, including the
+    special tokens) stays within `max_tokens`. A sequence that is longer than the budget
+    on its own gets a batch of its own.
+
+    Returns the indices of the records in every batch.
+    """
+    batches = []
+    current: List[int] = []
+    for index in np.argsort(np.asarray(lengths, dtype=np.int64), kind="stable"):
+        # the records are sorted, so the new record is the longest in the batch
+        padded_length = int(lengths[index]) + SPECIAL_TOKENS
+        batch_full = max_batch_size is not None and len(current) >= max_batch_size
+        if current and (batch_full or padded_length * (len(current) + 1) > max_tokens):
+            batches.append(current)
+            current = []
+        current.append(int(index))
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def padded_tokens(lengths: Sequence[int], batches: List[List[int]]) -> int:
+    """The total number of tokens, including padding, processed for the batches."""
+    return sum(len(batch) * (max(lengths[i] for i in batch) + SPECIAL_TOKENS)
+               for batch in batches)
+
+
+def results_by_id(ids: Sequence[str], batch_results: List[List[tuple]]) -> Dict[str, tuple]:
+    """
+    Map the results of the batches to the id of their record, which is the first item of
+    every result. The data loader may reorder the records of a batch, so the results are
+    never matched to the records by position.
+
+    Raises a ValueError when a result has an unexpected or repeated id, or when an id has
+    no result.
+    """
+    expected = set(ids)
+    results: Dict[str, tuple] = {}
+    for batch_result in batch_results:
+        for result in batch_result:
+            id_ = result[0]
+            if id_ not in expected:
+                raise ValueError(f"The model returned a result for the unexpected id {id_}")
+            if id_ in results:
+                raise ValueError(f"The model returned more than one result for the id {id_}")
+            results[id_] = tuple(result[1:])
+
+    missing = expected.difference(results)
+    if missing:
+        raise ValueError(f"The model returned no result for {len(missing)} ids, "
+                         f"e.g. {sorted(missing)[:5]}")
+    return results
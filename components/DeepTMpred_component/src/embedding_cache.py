@@ -0,0 +1,174 @@
+"""
+The EmbeddingCache stores the per-residue ESM embeddings on disk, keyed by sequence
+checksum and model version, so the expensive backbone forward pass is skipped for
+sequences that were seen before.
+
+The embeddings are stored as float16 in append-only shard files and read back as
+memory-mapped arrays. A SQLite index holds the location of every embedding.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DTYPE = np.float16
+# SQLite limits the number of parameters in one statement
+LOOKUP_CHUNK_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    The EmbeddingCache stores the per-residue ESM embeddings in float16 shard files,
+    keyed by sequence checksum and model version.
+
+    Every cache instance appends to a shard of its own, so processes sharing the directory
+    never write to the same file. When the shards grow beyond `max_bytes`, the least
+    recently used shards (by the last access of any of their embeddings) are removed.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, directory: str, model_version: str, max_bytes: Optional[int] = None,
+                 shard_bytes: int = 256 * 1024 ** 2):
+        self.directory = directory
+        self.model_version = model_version
+        self.max_bytes = max_bytes
+        self.shard_bytes = shard_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._shard = None
+        self._shard_file = None
+        self._connection = sqlite3.connect(os.path.join(directory, "index.sqlite"),
+                                           check_same_thread=False, timeout=60)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    sequence_checksum TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    shard TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    dim INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (sequence_checksum, model_version)
+                ) WITHOUT ROWID""")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_shard ON embeddings (shard)")
+
+    def _select(self, columns: str, checksums: Iterable[str]):
+        checksums = sorted(set(checksums))
+        for i in range(0, len(checksums), LOOKUP_CHUNK_SIZE):
+            chunk = checksums[i:i + LOOKUP_CHUNK_SIZE]
+            yield from self._connection.execute(
+                f"SELECT {columns} FROM embeddings WHERE model_version = ? "  # nosec
+                f"AND sequence_checksum IN ({','.join('?' * len(chunk))})",
+                [self.model_version, *chunk])
+
+    def contains(self, checksums: Iterable[str]) -> Set[str]:
+        """The checksums that have a cached embedding, without counting hits or misses."""
+        with self._lock:
+            return {row[0] for row in self._select("sequence_checksum", checksums)}
+
+    def get_many(self, checksums: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up the embeddings of many sequences at once. Returns memory-mapped float16
+        arrays of shape (rows, dim) for the sequences that are in the cache.
+        """
+        checksums = set(checksums)
+        found, missing_shards = {}, set()
+        with self._lock:
+            for checksum, shard, offset, rows, dim in self._select(
+                    "sequence_checksum, shard, offset, rows, dim", checksums):
+                try:
+                    found[checksum] = np.memmap(os.path.join(self.directory, shard), dtype=DTYPE,
+                                                mode="r", offset=offset, shape=(rows, dim))
+                except (FileNotFoundError, ValueError):
+                    # the shard was evicted by another process
+                    missing_shards.add(shard)
+
+            with self._connection:
+                self._connection.executemany(
+                    "DELETE FROM embeddings WHERE shard = ?", [[shard] for shard in missing_shards])
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_access = ? "
+                    "WHERE sequence_checksum = ? AND model_version = ?",
+                    [(time.time(), checksum, self.model_version) for checksum in found])
+
+            self.hits += len(found)
+            self.misses += len(checksums) - len(found)
+        return found
+
+    def put_many(self, embeddings: Dict[str, np.ndarray]) -> None:
+        """Store the (rows, dim) embeddings of many sequences as float16."""
+        with self._lock:
+            rows = []
+            for checksum, embedding in embeddings.items():
+                embedding = np.ascontiguousarray(embedding, dtype=DTYPE)
+                shard_file = self._active_shard()
+                offset = shard_file.tell()
+                shard_file.write(embedding.tobytes())
+                rows.append((checksum, self.model_version, self._shard, offset,
+                             embedding.shape[0], embedding.shape[1], time.time()))
+            if self._shard_file is not None:
+                self._shard_file.flush()
+
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._evict()
+
+    def _active_shard(self):
+        """The shard file this instance appends to, a new one is started when it is full."""
+        if self._shard_file is None or self._shard_file.tell() >= self.shard_bytes:
+            if self._shard_file is not None:
+                self._shard_file.close()
+            self._shard = f"shard-{uuid.uuid4().hex}.f16"
+            self._shard_file = open(os.path.join(self.directory, self._shard), "ab")
+        return self._shard_file
+
+    def size_bytes(self) -> int:
+        """The size of all shard files in the cache directory."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.name.startswith("shard-"))
+
+    def _evict(self) -> None:
+        """Remove the least recently used shards until the cache fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+
+        size = self.size_bytes()
+        while size > self.max_bytes:
+            row = self._connection.execute(
+                "SELECT shard FROM embeddings WHERE shard != ? GROUP BY shard "
+                "ORDER BY MAX(last_access) LIMIT 1", [self._shard]).fetchone()
+            if row is None:
+                break
+            with self._connection:
+                self._connection.execute("DELETE FROM embeddings WHERE shard = ?", row)
+            path = os.path.join(self.directory, row[0])
+            if os.path.exists(path):
+                size -= os.path.getsize(path)
+                os.remove(path)
+            logger.info("Evicted embedding shard %s", row[0])
+
+    def stats(self) -> Dict[str, float]:
+        """The number of hits and misses and the hit rate."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self) -> None:
+        """Close the active shard and the index."""
+        if self._shard_file is not None:
+            self._shard_file.close()
+        self._connection.close()
@@ -1,35 +1,109 @@
 """
 The DeepTMpred component predicts the number of transmembrane helices
 in a protein sequence using the DeepTMpred model.
+
+With a feature cache, the predictions are stored by sequence checksum and model version,
+and the model only runs on the sequences that are not in the cache.
 """
 import logging
-from typing import Any, Dict, Tuple
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 from fondant.component import PandasTransformComponent
-from .run_deeptm import deeptmpred
+from batching import length_bucketed_batches, padded_tokens
+from embedding_cache import EmbeddingCache
+from feature_cache import FeatureCache, arguments_hash, cached_features
+from instrumentation import instrumented, span
+from topology import pack_topology
 
 
 logger = logging.getLogger(__name__)
 
+TMH_MODEL_PATH = "model_files/deepTMpred-b.pth"
+ORIENTATION_MODEL_PATH = "model_files/orientaion-b.pth"
+# orientation class of the OrientationNet for an N-terminus on the cytoplasmic side
+N_TERMINUS_INSIDE = 0
+
 
+@instrumented
 class DeepTMpredComponent(PandasTransformComponent):
     """
     The DeepTMpred component predicts the number of transmembrane helices
     in a protein sequence using the DeepTMpred model.
     """
-
-    def __init__(self, *_):
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, max_tokens: int = 8192, max_batch_size: int = 64,
+                num_threads: int = 0, num_interop_threads: int = 0,
+                optimization: str = "none", optimized_model_dir: Optional[str] = None,
+                max_boundary_shift: int = 2, embedding_cache_dir: Optional[str] = None,
+                embedding_cache_max_gb: float = 10, mmap_weights: bool = True,
+                per_residue_output: bool = False, feature_cache_path: Optional[str] = None):
         # pylint: disable=super-init-not-called
+        # pylint: disable=too-many-arguments,too-many-locals
         self.columns = ['tmh_num_helices', 'tmh_total_length',
                         'tmh_avg_length_total', 'tmh_max_length', 'tmh_min_length']
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.per_residue_output = per_residue_output
 
         self.check_existence_of_files()
 
+        # torch, ESM and the deepTMpred package take seconds to import, so they are only
+        # imported once the model files are known to exist
+        # pylint: disable=import-outside-toplevel
+        import torch
+        from model_weights import load_mmap_models, memory_usage
+        from optimized_inference import model_fingerprint, optimize_models
+        from run_deeptm import configure_threads, load_models
+
+        configure_threads(num_threads, num_interop_threads)
+
+        # the models are loaded once and reused for every partition, memory-mapped weights
+        # are shared between the worker processes on one host
+        start = time.perf_counter()
+        self.device = torch.device('cpu')
+        if mmap_weights:
+            self.model, self.orientation_model, self.batch_converter = load_mmap_models(
+                TMH_MODEL_PATH, ORIENTATION_MODEL_PATH)
+        else:
+            self.model, self.orientation_model, self.batch_converter = load_models(
+                TMH_MODEL_PATH, ORIENTATION_MODEL_PATH, device=self.device)
+        logger.info("Loaded the DeepTMpred models in %.1fs, memory: %s",
+                    time.perf_counter() - start, memory_usage())
+
+        # an optimization is only used when it agrees with the full precision model
+        self.model, self.orientation_model, self.agreement_report = optimize_models(
+            self.model, self.orientation_model, self.batch_converter, optimization,
+            [TMH_MODEL_PATH, ORIENTATION_MODEL_PATH], cache_dir=optimized_model_dir,
+            max_boundary_shift=max_boundary_shift, device=self.device)
+
+        # the embeddings depend on the backbone weights and on the optimization in use
+        accepted = self.agreement_report is not None and self.agreement_report["accepted"]
+        self.embedding_cache = None
+        if embedding_cache_dir:
+            model_version = model_fingerprint(
+                [TMH_MODEL_PATH], optimization if accepted else "none")
+            self.embedding_cache = EmbeddingCache(
+                embedding_cache_dir, model_version, int(embedding_cache_max_gb * 1024 ** 3))
+
+        # the predictions depend on the weights of both models, and only hold the per-residue
+        # probabilities when they are in the output
+        self.feature_cache = None
+        if feature_cache_path:
+            self.feature_cache = FeatureCache(
+                feature_cache_path, "DeepTMpred", model_fingerprint(
+                    [TMH_MODEL_PATH, ORIENTATION_MODEL_PATH], optimization if accepted else "none"))
+        self.feature_groups = {
+            "predictions": arguments_hash({"per_residue_output": per_residue_output})}
+
     def check_existence_of_files(self) -> None:  # pylint: disable=no-self-use
         """Check if the required files exist in the model_files directory."""
 
-        deep_tm_pred_files = ["model_files/deepTMpred-b.pth", "model_files/orientaion-b.pth"]
+        deep_tm_pred_files = [TMH_MODEL_PATH, ORIENTATION_MODEL_PATH]
         for file in deep_tm_pred_files:
             try:
                 with open(file, 'r'):
@@ -41,41 +115,95 @@ class DeepTMpredComponent(PandasTransformComponent):
     def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """Transform the dataframe by adding new features."""
 
-        input_file = "sequence.fasta"
-
-        self.create_columns(dataframe)
-
-        for _, row in dataframe.iterrows():
-            transmembrane_helices = self.run_deeptmpred_model(
-                input_file, row.sequence_checksum, row.sequence)
-            features = self.calculate_features(transmembrane_helices)
-            dataframe = self.insert_features_into_dataframe(
-                dataframe, features, row.sequence_checksum)
+        checksums = dataframe['sequence_checksum'].tolist()
+
+        def compute(_: List[str], positions: List[int]) -> Dict[str, Dict[str, list]]:
+            records = dataframe if len(positions) == len(dataframe) else \
+                dataframe.iloc[positions]
+            # every partition gets its own scratch directory for the fasta file, so partitions
+            # that run at the same time on one worker never share a file
+            with tempfile.TemporaryDirectory(prefix="deeptmpred-") as scratch_dir:
+                input_file = os.path.join(scratch_dir, "sequence.fasta")
+                predicted = self.run_deeptmpred_model(input_file, records)
+            predicted = [predicted.get(checksums[position], ([], None, None))
+                         for position in positions]
+            return {"predictions": {
+                "helices": [helices for helices, _, _ in predicted],
+                "probability": [probability if self.per_residue_output else None
+                                for _, probability, _ in predicted],
+                "orientation": [orientation for _, _, orientation in predicted]}}
+
+        columns = cached_features(self.feature_cache, checksums, self.feature_groups, compute)
+        if self.feature_cache is not None:
+            logger.info("Feature cache: %s", self.feature_cache.stats())
+        predictions = list(zip(columns["helices"], columns["probability"],
+                               columns["orientation"]))
+        features = [self.calculate_features(helices) for helices, _, _ in predictions]
+        dataframe = self.insert_features_into_dataframe(dataframe, features)
+
+        # the per-residue columns stay empty unless per_residue_output is set
+        dataframe['tmh_residue_probability'] = pd.Series(
+            [probability if self.per_residue_output else None for _, probability, _ in predictions],
+            index=dataframe.index, dtype=object)
+        dataframe['tmh_topology'] = pd.Series(
+            [pack_topology(helices, len(sequence), orientation == N_TERMINUS_INSIDE)
+             if self.per_residue_output else None
+             for (helices, _, orientation), sequence in zip(predictions, dataframe['sequence'])],
+            index=dataframe.index, dtype=object)
 
         return dataframe
 
-    def create_columns(self, dataframe: pd.DataFrame) -> None:
-        """Create new columns in the dataframe to store the new features."""
-
-        for column in self.columns:
-            dataframe[column] = None
-
     def run_deeptmpred_model(self, input_file: str,
-                            sequence_checksum: str,
-                            sequence: str) -> Dict[str, Any]:
-        # pylint: disable=no-self-use
-        """Run the DeepTMpred model."""
-
+                            dataframe: pd.DataFrame) -> Dict[str, tuple]:
+        """
+        Run the DeepTMpred model on all sequences of the partition in batches of
+        similar length. Returns the transmembrane helices, the per-residue probabilities
+        and the orientation per sequence checksum.
+        """
+        # already imported with the models
+        # pylint: disable=import-outside-toplevel
+        from run_deeptm import data_iter, predictions_by_id, test_model
+
+        # duplicate sequences are only predicted once
+        records = dataframe.drop_duplicates('sequence_checksum')
         with open(input_file, 'w') as f:
-            f.write(f'>{sequence_checksum}\n{sequence}')
-
-        deeptmpred_topo = deeptmpred(
-            input_file, "model_files/deepTMpred-b.pth", "model_files/orientaion-b.pth")
-
-        return deeptmpred_topo
+            for sequence_checksum, sequence in zip(records['sequence_checksum'],
+                                                records['sequence']):
+                f.write(f'>{sequence_checksum}\n{sequence}\n')
+
+        lengths = records['sequence'].str.len().tolist()
+        batches = self.create_batches(records['sequence_checksum'].tolist(), lengths)
+        padding = 1 - sum(lengths) / max(padded_tokens(lengths, batches), 1)
+        logger.info("Predicting %s sequences in %s batches, %.1f%% padding",
+                    len(lengths), len(batches), 100 * padding)
+
+        test_iter = data_iter(input_file, None, None, self.batch_converter,
+                            label=False, batches=batches)
+        with span("deeptmpred_inference"):
+            deeptmpred_topo = test_model(self.model, self.orientation_model, test_iter,
+                                        self.device, embedding_cache=self.embedding_cache)
+        if self.embedding_cache is not None:
+            logger.info("Embedding cache: %s", self.embedding_cache.stats())
+
+        return predictions_by_id(deeptmpred_topo, records['sequence_checksum'].tolist())
+
+    def create_batches(self, checksums: List[str], lengths: List[int]) -> List[List[int]]:
+        """
+        Group the records into batches of similar length. The records with a cached
+        embedding are batched separately, so their batches skip the ESM backbone.
+        """
+        cached = self.embedding_cache.contains(checksums) if self.embedding_cache else set()
+
+        batches = []
+        for is_cached in (True, False):
+            group = [i for i, checksum in enumerate(checksums) if (checksum in cached) == is_cached]
+            for batch in length_bucketed_batches([lengths[i] for i in group],
+                                                 self.max_tokens, self.max_batch_size):
+                batches.append([group[i] for i in batch])
+        return batches
 
     def calculate_features(self,
-                        transmembrane_helices: Dict) -> Tuple[int, int, int, int, int]:
+                        transmembrane_helices: List[List[int]]) -> Tuple[int, int, int, int, int]:
         # pylint: disable=no-self-use
         """Calculate features based on the parsed output."""
 
@@ -95,16 +223,12 @@ class DeepTMpredComponent(PandasTransformComponent):
             tmh_biggest_length, tmh_smallest_length
 
     def insert_features_into_dataframe(self, dataframe: pd.DataFrame,
-                                    features: tuple,
-                                    sequence_checksum: str) -> pd.DataFrame:
-        """Insert the new features into the dataframe."""
-
-        # Find the index where sequence_checksum matches in the dataframe
-        index = dataframe[dataframe['sequence_checksum']
-                        == sequence_checksum].index[0]
+                                    features: List[tuple]) -> pd.DataFrame:
+        """Insert the new features, one tuple per row, into the dataframe."""
 
-        # Insert the features into the dataframe
-        for column, feature in zip(self.columns, features):
-            dataframe.at[index, column] = feature
+        features = pd.DataFrame(features, columns=self.columns, index=dataframe.index)
+        for column in self.columns:
+            dtype = 'Float64' if column == 'tmh_avg_length_total' else 'Int64'
+            dataframe[column] = features[column].astype(dtype)
 
         return dataframe
@@ -0,0 +1,144 @@
+"""
+Memory-mapped DeepTMpred weights.
+
+The ESM backbone, the DeepTMpred heads and the ESM alphabet are converted once into a single
+checkpoint. That checkpoint is loaded with `torch.load(mmap=True)`, so the weights are not
+copied into the memory of the process: the worker processes on one host share the read-only
+pages of the file through the page cache and start without deserializing the weights.
+
+Run this module to measure the startup time and memory of a number of worker processes:
+
+    python model_weights.py --workers 4
+"""
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import torch
+
+from run_deeptm import load_models
+
+logger = logging.getLogger(__name__)
+
+
+def converted_checkpoint_path(model_paths: List[str], directory: Optional[str] = None) -> str:
+    """
+    The path of the converted checkpoint. The name depends on the size and modification time
+    of the original files and on the torch version, so a new model is converted again.
+    """
+    digest = hashlib.sha256(torch.__version__.encode())
+    for path in model_paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}-{stat.st_size}-{stat.st_mtime_ns}".encode())
+
+    directory = directory or os.path.dirname(model_paths[0])
+    return os.path.join(directory, f"deepTMpred-mmap-{digest.hexdigest()[:16]}.pt")
+
+
+def convert_checkpoint(tmh_model_path: str, orientation_model_path: str,
+                       args_path: str = './args.pt', directory: Optional[str] = None) -> str:
+    """
+    Convert the original checkpoints into one checkpoint that can be memory-mapped.
+    The conversion is skipped when the converted checkpoint exists. Returns its path.
+    """
+    path = converted_checkpoint_path(
+        [tmh_model_path, orientation_model_path, args_path], directory)
+    if os.path.exists(path):
+        return path
+
+    start = time.perf_counter()
+    model, orientation_model, batch_converter = load_models(
+        tmh_model_path, orientation_model_path, args_path)
+
+    # write to a temporary file first, workers that start at the same time never
+    # see a partially written checkpoint
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp",
+                                     delete=False) as f:
+        torch.save({"model": model, "orientation_model": orientation_model,
+                    "alphabet": batch_converter.alphabet}, f)
+    os.replace(f.name, path)
+
+    logger.info("Converted the DeepTMpred weights to %s in %.1fs",
+                path, time.perf_counter() - start)
+    return path
+
+
+def load_mmap_models(tmh_model_path: str, orientation_model_path: str,
+                     args_path: str = './args.pt', directory: Optional[str] = None):
+    """
+    Load the models from the converted checkpoint with memory-mapped weights.
+    Returns the models and the batch converter of the ESM alphabet, like `load_models`.
+    """
+    path = convert_checkpoint(tmh_model_path, orientation_model_path, args_path, directory)
+
+    # the checkpoint contains the model classes, it is created by the component itself
+    checkpoint = torch.load(path, mmap=True, map_location="cpu", weights_only=False)
+    model, orientation_model = checkpoint["model"], checkpoint["orientation_model"]
+    model.eval()
+    orientation_model.eval()
+    return model, orientation_model, checkpoint["alphabet"].get_batch_converter()
+
+
+def memory_usage() -> Dict[str, float]:
+    """
+    The resident memory of this process in MB, split in the pages shared with other
+    processes (such as the memory-mapped weights) and the private pages.
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, value = line.split(":", 1)
+                if name in ("Rss", "Shared_Clean", "Shared_Dirty",
+                            "Private_Clean", "Private_Dirty"):
+                    usage[name] = int(value.split()[0]) / 1024
+    except (FileNotFoundError, ValueError):
+        # only available on Linux
+        return {}
+
+    return {"rss_mb": usage["Rss"],
+            "shared_mb": usage["Shared_Clean"] + usage["Shared_Dirty"],
+            "private_mb": usage["Private_Clean"] + usage["Private_Dirty"]}
+
+
+def _measure_worker(arguments) -> Dict[str, float]:
+    tmh_model_path, orientation_model_path, args_path, mmap = arguments
+    start = time.perf_counter()
+    if mmap:
+        load_mmap_models(tmh_model_path, orientation_model_path, args_path)
+    else:
+        load_models(tmh_model_path, orientation_model_path, args_path)
+    return {"startup_seconds": time.perf_counter() - start, **memory_usage()}
+
+
+def measure_workers(tmh_model_path: str, orientation_model_path: str,
+                    args_path: str = './args.pt', workers: int = 4,
+                    mmap: bool = True) -> List[Dict[str, float]]:
+    """Start the workers at the same time and return their startup time and memory."""
+    if mmap:
+        convert_checkpoint(tmh_model_path, orientation_model_path, args_path)
+
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        return pool.map(_measure_worker,
+                        [(tmh_model_path, orientation_model_path, args_path, mmap)] * workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tmh-model", default="model_files/deepTMpred-b.pth")
+    parser.add_argument("--orientation-model", default="model_files/orientaion-b.pth")
+    parser.add_argument("--args", default="./args.pt")
+    cli_args = parser.parse_args()
+
+    for use_mmap in (False, True):
+        for worker, result in enumerate(measure_workers(
+                cli_args.tmh_model, cli_args.orientation_model, cli_args.args,
+                cli_args.workers, use_mmap)):
+            print(f"mmap={use_mmap} worker={worker} " +
+                  " ".join(f"{key}={value:.1f}" for key, value in result.items()))
@@ -0,0 +1,141 @@
+"""
+Optimized CPU inference for the DeepTMpred models.
+
+The linear layers of the ESM backbone and the DeepTMpred heads can be quantized to int8
+(dynamic quantization) and/or the ESM backbone can be compiled with `torch.compile`.
+Before an optimization is used, the topologies it predicts for a reference set are compared
+with those of the full precision model. The optimization is only accepted when the number
+of helices agrees for every reference sequence and the helix boundaries shift by at most
+`max_boundary_shift` residues, otherwise the full precision models are used.
+
+The quantized weights and the agreement report are cached on disk per model version,
+so the agreement check only runs once.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from run_deeptm import data_iter, test_model
+from topology import Topology, compare_topologies
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZATIONS = ["none", "int8", "compile", "int8+compile"]
+REFERENCE_FASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "reference_sequences.fasta")
+
+
+def model_fingerprint(paths: List[str], optimization: str) -> str:
+    """Hash the model files, the optimization and the torch version."""
+    digest = hashlib.sha256(f"{optimization}-{torch.__version__}".encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(functools.partial(f.read, 1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def predict_fasta(model, orientation_model, batch_converter, fasta_path: str,
+                  device) -> List[Topology]:
+    """Predict the topology of every record in the fasta file, in the order of the file."""
+    test_iter = data_iter(fasta_path, None, None, batch_converter, label=False)
+    tmh_dict = test_model(model, orientation_model, test_iter, device)
+    return [helices for batch in tmh_dict for _, helices, _, _ in batch]
+
+
+def quantize(model, orientation_model):
+    """Quantize the linear layers of both models to int8, the originals are kept."""
+    def quantize_model(module):
+        return torch.ao.quantization.quantize_dynamic(
+            module, {torch.nn.Linear}, dtype=torch.qint8, inplace=False)
+
+    return quantize_model(model), quantize_model(orientation_model)
+
+
+def apply_optimization(model, orientation_model, optimization: str,
+                       quantized_state: Optional[Tuple[Dict, Dict]] = None):
+    """
+    Apply the optimization to the models. Previously quantized weights are loaded
+    when they are given.
+    """
+    if "int8" in optimization:
+        model, orientation_model = quantize(model, orientation_model)
+        if quantized_state is not None:
+            model.load_state_dict(quantized_state[0])
+            orientation_model.load_state_dict(quantized_state[1])
+
+    if "compile" in optimization:
+        # the backbone is the expensive part, sequence lengths differ between batches
+        model.esm = torch.compile(model.esm, dynamic=True)
+
+    return model, orientation_model
+
+
+def optimize_models(model, orientation_model, batch_converter, optimization: str,
+                    model_paths: List[str], cache_dir: Optional[str] = None,
+                    max_boundary_shift: int = 2, reference_fasta: str = REFERENCE_FASTA,
+                    device=torch.device("cpu")):
+    # pylint: disable=too-many-arguments,too-many-locals
+    """
+    Optimize the models when the optimized models agree with the full precision models
+    on the reference set. Returns the models to use and the agreement report.
+    """
+    if optimization not in OPTIMIZATIONS:
+        raise ValueError(f"Unknown optimization {optimization}. Choose from {OPTIMIZATIONS}.")
+    if optimization == "none":
+        return model, orientation_model, None
+
+    report_path = weights_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        # the compiled kernels are cached by inductor in the same directory
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(cache_dir, "inductor"))
+        fingerprint = model_fingerprint(model_paths, optimization)
+        report_path = os.path.join(cache_dir, f"{optimization}-{fingerprint}.json")
+        weights_path = os.path.join(cache_dir, f"{optimization}-{fingerprint}.pt")
+
+    if report_path and os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+        if not report["accepted"]:
+            logger.warning("Optimization %s was rejected before: %s", optimization, report)
+            return model, orientation_model, report
+
+        quantized_state = torch.load(weights_path) if "int8" in optimization else None
+        logger.info("Using the cached %s optimization: %s", optimization, report)
+        return (*apply_optimization(model, orientation_model, optimization, quantized_state),
+                report)
+
+    reference = predict_fasta(model, orientation_model, batch_converter, reference_fasta, device)
+    optimized_model, optimized_orientation_model = apply_optimization(
+        model, orientation_model, optimization)
+    candidate = predict_fasta(optimized_model, optimized_orientation_model, batch_converter,
+                              reference_fasta, device)
+
+    report = compare_topologies(reference, candidate)
+    report["optimization"] = optimization
+    report["accepted"] = report["count_agreement"] == 1.0 and \
+        report["max_boundary_shift"] <= max_boundary_shift
+
+    if report_path:
+        if report["accepted"] and "int8" in optimization:
+            torch.save((optimized_model.state_dict(), optimized_orientation_model.state_dict()),
+                       weights_path)
+        with open(report_path, "w") as f:
+            json.dump(report, f)
+
+    if not report["accepted"]:
+        logger.warning("Optimization %s drifts from the full precision model, "
+                       "using the full precision model: %s", optimization, report)
+        # without quantization the backbone was compiled in place
+        model.esm = getattr(model.esm, "_orig_mod", model.esm)
+        return model, orientation_model, report
+
+    logger.info("Optimization %s agrees with the full precision model: %s",
+                optimization, report)
+    return optimized_model, optimized_orientation_model, report
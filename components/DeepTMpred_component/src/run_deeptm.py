@@ -3,8 +3,10 @@ DeepTMpred model taken from the DeepTMpred repository
 https://github.com/ISYSLAB-HUST/DeepTMpred
 """
 
-import re
+import logging
+from typing import Dict, List, Tuple
 
+import numpy as np
 import torch
 from torch.utils.data import DataLoader
 
@@ -12,46 +14,87 @@ from deepTMpred.model import FineTuneEsmCNN, OrientationNet  # pylint: disable=i
 from deepTMpred.utils import load_model_and_alphabet_core  # pylint: disable=import-error
 from deepTMpred.data import FineTuneDataset, batch_collate  # pylint: disable=import-error
 
+from batching import results_by_id
+from topology import HELIX_LABEL, helix_segments
 
-def data_iter(data_path, pssm_dir, hmm_dir, batch_converter, label=False):
+logger = logging.getLogger(__name__)
+
+
+def data_iter(data_path, pssm_dir, hmm_dir, batch_converter, label=False, batches=None):
+    # pylint: disable=too-many-arguments
     """
-    Iterate over the data and return the data loader
+    Iterate over the data and return the data loader.
+    The batches are lists of record indices, all records form a single batch when not given.
     """
     data = FineTuneDataset(data_path, pssm_dir=pssm_dir,
                         hmm_file=hmm_dir, label=label)
-    test = DataLoader(data, len(data), collate_fn=batch_collate(
-        batch_converter, label=label))
+    collate_fn = batch_collate(batch_converter, label=label)
+    if batches is not None:
+        return DataLoader(data, batch_sampler=batches, collate_fn=collate_fn)
+    test = DataLoader(data, len(data), collate_fn=collate_fn)
     return test
 
 
+def configure_threads(num_threads=0, num_interop_threads=0):
+    """
+    Set the number of intra-op and inter-op threads used by torch on this worker.
+    A value of 0 keeps the torch default.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # can only be set once, before any inter-op parallel work has started
+            logger.warning("The number of inter-op threads was already set to %s",
+                           torch.get_num_interop_threads())
+
+
 def tmh_predict(id_list, predict_str, prob, orientation):
     """
-    Predict the transmembrane helices
+    Predict the transmembrane helices. Returns per record the id, the helices, the
+    per-residue transmembrane probability (float16) and the predicted orientation.
     """
-    cutoff = 5
     result = []
     for id_, predict, prob_, orientation_ in zip(id_list, predict_str, prob, orientation):
-        tmp = []
-        predict = list(map(str, predict))
-        for item in re.finditer(r'1+', ''.join(predict)):
-            if (item.end() - item.start() - 1) >= cutoff:
-                tmp.append([item.start() + 1, item.end()])
-        result.append((id_, tmp, prob_, orientation_))
+        labels = np.asarray(predict.cpu() if torch.is_tensor(predict) else predict).reshape(-1)
+        probability = np.asarray(prob_.float().cpu() if torch.is_tensor(prob_) else prob_)
+        if probability.ndim == 2:
+            # class probabilities per residue, keep the probability of the helix class
+            probability = probability[:, HELIX_LABEL]
+        result.append((id_, helix_segments(labels),
+                       probability[:len(labels)].astype(np.float16), orientation_))
     return result
 
 
-def test_model(model, orientation_model, test_loader, device):
+def test_model(model, orientation_model, test_loader, device, embedding_cache=None):
     """
-    Test the model
+    Test the model. When an embedding cache is given, the ESM backbone is skipped for
+    the batches of which all embeddings are cached, new embeddings are added to the cache.
     """
     model.eval()
-    with torch.no_grad():
+    with torch.inference_mode():
         tmh_dict = []
         for tokens, ids, matrix, token_lengths in test_loader:
-            tokens = tokens.to(device)
-            results = model.esm(tokens, repr_layers=[
-                                12], return_contacts=False)
-            token_embeddings = results["representations"][12][:, 1:, :]
+            token_embeddings = None
+            if embedding_cache is not None:
+                cached = embedding_cache.get_many(ids)
+                if len(cached) == len(ids):
+                    token_embeddings = stack_embeddings(
+                        [cached[id_] for id_ in ids], tokens.shape[1] - 1).to(device)
+
+            if token_embeddings is None:
+                tokens = tokens.to(device)
+                results = model.esm(tokens, repr_layers=[
+                                    12], return_contacts=False)
+                token_embeddings = results["representations"][12][:, 1:, :]
+                if embedding_cache is not None:
+                    # the residues and the end token, without the padding
+                    embedding_cache.put_many({
+                        id_: token_embeddings[i, :int(length) + 1].float().cpu().numpy()
+                        for i, (id_, length) in enumerate(zip(ids, token_lengths))})
+
             token_lengths = token_lengths.to(device)
             matrix = matrix.to(device)
             embeddings = torch.cat((matrix, token_embeddings), dim=2)
@@ -61,6 +104,15 @@ def test_model(model, orientation_model, test_loader, device):
     return tmh_dict
 
 
+def stack_embeddings(embeddings, width):
+    """Stack the cached (rows, dim) embeddings of a batch into a zero padded tensor."""
+    batch = torch.zeros(len(embeddings), width, embeddings[0].shape[1])
+    for i, embedding in enumerate(embeddings):
+        rows = min(len(embedding), width)
+        batch[i, :rows] = torch.from_numpy(np.asarray(embedding[:rows], dtype=np.float32))
+    return batch
+
+
 def test_prediction(model, orientation_model, embeddings, token_lengths, ids, tmh_dict):  # pylint: disable=too-many-arguments
     """
     Test the prediction using the model
@@ -73,23 +125,45 @@ def test_prediction(model, orientation_model, embeddings, token_lengths, ids, tm
     return tmh_dict
 
 
-def deeptmpred(test_file, tmh_model_path, orientation_model_path):
+def predictions_by_id(tmh_dict, ids) -> Dict[str, Tuple[List[List[int]], np.ndarray, int]]:
     """
-    Run the DeepTMpred model
+    Map the transmembrane helices ([start, end], 1-based), the per-residue probabilities and
+    the orientations predicted by `test_model` to the id of their record. Raises a ValueError
+    when the predictions do not match the ids one to one.
     """
-    device = torch.device('cpu')
+    return results_by_id(ids, tmh_dict)
 
+
+def load_models(tmh_model_path, orientation_model_path, args_path='./args.pt',
+                device=torch.device('cpu')):
+    """
+    Load the ESM model and the DeepTMpred helix and orientation models.
+    Returns the models and the batch converter of the ESM alphabet.
+    """
     model = FineTuneEsmCNN(768)
-    args_dict = torch.load('./args.pt')
+    args_dict = torch.load(args_path)
     pretrain_model, alphabet = load_model_and_alphabet_core(args_dict)
     batch_converter = alphabet.get_batch_converter()
     model.add_module('esm', pretrain_model.to(device))
-    model.load_state_dict(torch.load(tmh_model_path))
+    model.load_state_dict(torch.load(tmh_model_path, map_location=device))
     model = model.to(device)
+    model.eval()
 
     orientation_model = OrientationNet()
-    orientation_model.load_state_dict(torch.load(orientation_model_path))
+    orientation_model.load_state_dict(torch.load(orientation_model_path, map_location=device))
     orientation_model = orientation_model.to(device)
+    orientation_model.eval()
+
+    return model, orientation_model, batch_converter
+
+
+def deeptmpred(test_file, tmh_model_path, orientation_model_path):
+    """
+    Run the DeepTMpred model
+    """
+    device = torch.device('cpu')
+    model, orientation_model, batch_converter = load_models(
+        tmh_model_path, orientation_model_path, device=device)
 
     test_iter = data_iter(test_file, None, None, batch_converter, label=False)
     topo = test_model(model, orientation_model, test_iter, device)
@@ -0,0 +1,84 @@
+"""
+Helpers for the transmembrane helices predicted by DeepTMpred. A topology is the list of
+[start, end] (1-based, inclusive) helices of one sequence.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+Topology = List[List[int]]
+
+# DeepTMpred only reports helices of at least 6 residues
+MIN_HELIX_LENGTH = 6
+HELIX_LABEL = 1
+
+
+def helix_residues(topology: Topology) -> set:
+    """The residue numbers that are part of a transmembrane helix."""
+    return {residue for start, end in topology for residue in range(start, end + 1)}
+
+
+def helix_segments(labels: Sequence[int], min_length: int = MIN_HELIX_LENGTH) -> Topology:
+    """
+    Find the runs of helix labels in the per-residue labels of a sequence.
+    Returns the [start, end] (1-based, inclusive) of the runs of at least `min_length` residues.
+    """
+    helix = np.asarray(labels).reshape(-1) == HELIX_LABEL
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], helix, [False]]).astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    keep = ends - starts >= min_length
+    return np.stack([starts[keep] + 1, ends[keep]], axis=1).tolist()
+
+
+def pack_topology(topology: Topology, length: int, n_terminus_inside: bool) -> str:
+    """
+    Pack the topology of a sequence into one character per residue: M for a residue in a
+    transmembrane helix, i and o for the residues inside and outside the membrane.
+    The side changes after every helix, starting from the side of the N-terminus.
+    """
+    codes = np.full(length, "o", dtype="<U1")
+    boundaries = [0]
+    for start, end in topology:
+        boundaries += [start - 1, end]
+    boundaries.append(length)
+
+    inside = n_terminus_inside
+    for loop_start, loop_end in zip(boundaries[::2], boundaries[1::2]):
+        codes[loop_start:loop_end] = "i" if inside else "o"
+        inside = not inside
+    for start, end in topology:
+        codes[start - 1:end] = "M"
+    return "".join(codes)
+
+
+def compare_topologies(reference: List[Topology], candidate: List[Topology]) -> Dict[str, float]:
+    """
+    Compare the topologies predicted by an optimized model with the reference topologies
+    of the full precision model, sequence by sequence.
+
+    Returns the fraction of sequences with the same number of helices, the largest and the
+    mean shift of a helix boundary (for the sequences with the same number of helices) and
+    the mean Jaccard index of the helix residues.
+    """
+    if len(reference) != len(candidate):
+        raise ValueError(f"Expected {len(reference)} topologies, got {len(candidate)}.")
+
+    same_count, shifts, jaccard = 0, [], []
+    for expected, predicted in zip(reference, candidate):
+        if len(expected) == len(predicted):
+            same_count += 1
+            shifts.extend(abs(a - b) for helices in zip(expected, predicted)
+                          for a, b in zip(*helices))
+
+        expected_residues, predicted_residues = helix_residues(expected), helix_residues(predicted)
+        union = expected_residues | predicted_residues
+        jaccard.append(len(expected_residues & predicted_residues) / len(union) if union else 1.0)
+
+    n_sequences = len(reference)
+    return {
+        "sequences": n_sequences,
+        "count_agreement": same_count / n_sequences if n_sequences else 1.0,
+        "max_boundary_shift": max(shifts, default=0),
+        "mean_boundary_shift": sum(shifts) / len(shifts) if shifts else 0.0,
+        "residue_jaccard": sum(jaccard) / n_sequences if n_sequences else 1.0,
+    }
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from batching import SPECIAL_TOKENS, length_bucketed_batches, padded_tokens, results_by_id
+
+
+def test_batches_stay_within_the_token_budget():
+    random.seed(0)
+    lengths = [random.randint(20, 800) for _ in range(500)]
+    batches = length_bucketed_batches(lengths, max_tokens=4096, max_batch_size=32)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 32
+        assert len(batch) * (max(lengths[i] for i in batch) + SPECIAL_TOKENS) <= 4096
+
+    # sorting by length wastes far less padding than one batch over the whole partition
+    single_batch = len(lengths) * (max(lengths) + SPECIAL_TOKENS)
+    assert padded_tokens(lengths, batches) < 0.6 * single_batch
+
+
+def test_long_sequences_get_their_own_batch():
+    batches = length_bucketed_batches([10, 5000, 20], max_tokens=1000)
+    assert batches == [[0, 2], [1]]
+
+
+def predict(ids, batches, reorder=None):
+    """The results of a loader that may reorder the records of every batch."""
+    reorder = reorder or (lambda batch: batch)
+    return [[(ids[i], f"helices of {ids[i]}") for i in reorder(batch)] for batch in batches]
+
+
+def test_results_are_mapped_by_id_when_the_loader_reorders_a_batch():
+    ids = ["CRC0", "CRC1", "CRC2", "CRC3"]
+    batches = length_bucketed_batches([30, 10, 20, 10], max_tokens=40)
+    assert any(len(batch) > 1 for batch in batches)
+
+    results = results_by_id(ids, predict(ids, batches, reorder=lambda batch: batch[::-1]))
+
+    assert results == {id_: (f"helices of {id_}",) for id_ in ids}
+
+
+def test_results_that_do_not_match_the_ids_raise():
+    ids = ["CRC0", "CRC1", "CRC2"]
+    batches = [[0, 1], [2]]
+
+    with pytest.raises(ValueError, match="no result"):
+        results_by_id(ids, predict(ids, batches, reorder=lambda batch: batch[1:]))
+    with pytest.raises(ValueError, match="unexpected id CRC2"):
+        results_by_id(ids[:2], predict(ids, batches))
+    with pytest.raises(ValueError, match="more than one result"):
+        results_by_id(ids, predict(ids, batches, reorder=lambda batch: batch + batch))
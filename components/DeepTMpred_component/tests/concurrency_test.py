@@ -0,0 +1,44 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("deepTMpred")
+
+from src.main import DeepTMpredComponent, TMH_MODEL_PATH  # pylint: disable=wrong-import-position
+
+pytestmark = pytest.mark.skipif(not os.path.exists(TMH_MODEL_PATH),
+                                reason="the model files are not downloaded")
+
+SEQUENCES = [
+    "MLELLPTAVEGVSQAQITGRPEWIWLALGTALMGLGTLYFLVKGMGVSDPDAKKFYAITTLVPAIAFTMYLSMLLGYGLTMVPFGGEQNPIYWARYADWLFTTPLLLLDLALLVDADQGTILALVGADGIMIGTGLVGALTKVYSYRFVWWAISTAAMLYILYVLFFGFTSKAESMRPEVASTFKVLRNVTVVLWSAYPVVWLIGSEGAGIVPLNIETLLFMVLDVSAKVGFGLILLRSRAIFGEAEAPEPSAGDGAAATSD",
+    "MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ",
+    "MAGLKPEVVIRSQQWLLALAVAVLGLLVAGFIAYRWLRKSEE",
+]
+
+
+def create_partition(i):
+    return pd.DataFrame({"sequence": [sequence[i:] for sequence in SEQUENCES],
+                         "sequence_checksum": ["CRC1", "CRC2", "CRC3"]})
+
+
+def transform(dataframe):
+    return DeepTMpredComponent(per_residue_output=True).transform(dataframe)
+
+
+@pytest.mark.parametrize("executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_concurrent_partitions(executor):
+    expected = [transform(create_partition(i)) for i in range(3)]
+    scratch_before = set(os.listdir(tempfile.gettempdir()))
+
+    with executor(max_workers=3) as pool:
+        results = list(pool.map(transform, [create_partition(i) for i in range(3)] * 2))
+
+    for result, partition in zip(results, expected * 2):
+        pd.testing.assert_frame_equal(result.drop(columns="tmh_residue_probability"),
+                                      partition.drop(columns="tmh_residue_probability"))
+    assert not os.path.exists("sequence.fasta")
+    assert set(os.listdir(tempfile.gettempdir())) <= scratch_before
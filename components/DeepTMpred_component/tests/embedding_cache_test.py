@@ -0,0 +1,40 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def embedding(rows, seed):
+    return np.random.default_rng(seed).normal(size=(rows, 8)).astype(np.float32)
+
+
+def test_embeddings_are_stored_as_float16_and_memory_mapped(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "v1")
+    cache.put_many({"CRC1": embedding(10, 1), "CRC2": embedding(25, 2)})
+    cache.close()
+
+    # a new instance (e.g. the next run) reads the embeddings from the shards
+    cache = EmbeddingCache(str(tmp_path), "v1")
+    assert cache.contains(["CRC1", "CRC3"]) == {"CRC1"}
+    found = cache.get_many(["CRC1", "CRC2", "CRC3"])
+
+    assert isinstance(found["CRC2"], np.memmap) and found["CRC2"].dtype == np.float16
+    np.testing.assert_allclose(found["CRC2"], embedding(25, 2), atol=1e-2)
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3}
+
+    # other model versions do not share the embeddings
+    assert EmbeddingCache(str(tmp_path), "v2").get_many(["CRC1"]) == {}
+
+
+def test_least_recently_used_shards_are_evicted(tmp_path):
+    # every embedding fills a shard of its own
+    shard_bytes = 10 * 8 * 2
+    cache = EmbeddingCache(str(tmp_path), "v1", max_bytes=3 * shard_bytes,
+                           shard_bytes=shard_bytes)
+    for i in range(3):
+        cache.put_many({f"CRC{i}": embedding(10, i)})
+    cache.get_many(["CRC0"])
+
+    cache.put_many({"CRC3": embedding(10, 3)})
+
+    assert cache.size_bytes() <= 3 * shard_bytes
+    assert cache.contains(["CRC0", "CRC1", "CRC2", "CRC3"]) == {"CRC0", "CRC2", "CRC3"}
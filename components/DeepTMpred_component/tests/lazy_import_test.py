@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def test_main_does_not_import_torch():
+    # the partition tasks of a new worker import the component, torch is only imported
+    # when the models are loaded
+    code = "import sys, main; print('torch' in sys.modules, 'deepTMpred' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd="src", capture_output=True,
+                            text=True, check=True)
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_missing_model_files_fail_before_torch_is_imported(tmp_path, monkeypatch):
+    from src.main import DeepTMpredComponent  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        DeepTMpredComponent()
@@ -0,0 +1,42 @@
+from topology import compare_topologies, helix_segments, pack_topology
+
+
+def test_identical_topologies_agree():
+    topologies = [[], [[10, 30]], [[5, 25], [40, 61]]]
+    assert compare_topologies(topologies, topologies) == {
+        "sequences": 3, "count_agreement": 1.0, "max_boundary_shift": 0,
+        "mean_boundary_shift": 0.0, "residue_jaccard": 1.0}
+
+
+def test_drift_is_reported():
+    reference = [[[10, 30]], [[5, 25], [40, 61]]]
+    candidate = [[[12, 30]], [[5, 25]]]
+    report = compare_topologies(reference, candidate)
+
+    assert report["count_agreement"] == 0.5
+    # only the sequences with the same number of helices have comparable boundaries
+    assert report["max_boundary_shift"] == 2
+    assert report["mean_boundary_shift"] == 1.0
+    assert report["residue_jaccard"] == (19 / 21 + 21 / 43) / 2
+
+
+def test_helix_segments_match_the_regex_segmentation():
+    import re
+
+    import numpy as np
+
+    rng = np.random.default_rng(37)
+    for _ in range(200):
+        labels = np.repeat(rng.integers(0, 2, 30), rng.integers(1, 12, 30))
+        expected = [[m.start() + 1, m.end()]
+                    for m in re.finditer(r'1+', ''.join(map(str, labels)))
+                    if m.end() - m.start() - 1 >= 5]
+        assert helix_segments(labels) == expected
+
+    assert helix_segments([]) == []
+
+
+def test_pack_topology():
+    assert pack_topology([[3, 8], [12, 17]], 20, n_terminus_inside=True) == \
+        "iiMMMMMMoooMMMMMMiii"
+    assert pack_topology([], 4, n_terminus_inside=False) == "oooo"
@@ -2,32 +2,68 @@
 The BiopythonComponent class is a component that takes in a dataframe,
 performs the Biopython functions to generate new features
 and returns the dataframe with the new features added.
+
+With a feature cache, the features are stored by sequence checksum and only calculated for
+the sequences that are not in the cache.
 """
 import logging
+from typing import Dict, List, Optional
 
+from Bio.SeqUtils.CheckSum import crc64
 from Bio.SeqUtils.ProtParam import ProteinAnalysis
 from fondant.component import PandasTransformComponent
 import pandas as pd
 
+from feature_cache import FeatureCache, arguments_hash, cached_features
+from instrumentation import instrumented
+
 
 logger = logging.getLogger(__name__)
 
+# the version of the calculated features, change it when a feature changes so the feature
+# cache does not return the features of the earlier version
+FEATURES_VERSION = "1"
 
+
+@instrumented
 class BiopythonComponent(PandasTransformComponent):
     """The BiopythonComponent class is a component that takes in a dataframe,
     performs the Biopython functions to generate new features
     and returns the dataframe with the new features added."""
 
-    def __init__(self, *_):
+    def __init__(self, feature_cache_path: Optional[str] = None):
         # pylint: disable=super-init-not-called
-        pass
+        self.cache = None
+        if feature_cache_path:
+            self.cache = FeatureCache(feature_cache_path, "biopython", FEATURES_VERSION)
 
-    def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:  # pylint: disable=no-self-use
+    def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """The transform method takes in a dataframe,
         performs the Biopython functions to generate new features
         and returns the dataframe with the new features added."""
+        sequences = dataframe["sequence"]
+
+        def compute(_: List[str], positions: List[int]) -> Dict[str, Dict[str, list]]:
+            features = self.calculate_features(sequences.iloc[positions])
+            return {"biopython": {column: features[column].tolist()
+                                  for column in features.columns}}
+
+        checksums = [crc64(sequence) for sequence in sequences] if self.cache else \
+            [None] * len(sequences)
+        columns = cached_features(self.cache, checksums, {"biopython": arguments_hash({})},
+                                  compute)
+        if self.cache is not None:
+            logger.info("Feature cache: %s", self.cache.stats())
+
+        for column, values in columns.items():
+            dataframe[column] = list(values)
+        return dataframe
 
-        sequence_analysis = dataframe["sequence"].apply(ProteinAnalysis)
+    @staticmethod
+    def calculate_features(sequences: pd.Series) -> pd.DataFrame:
+        """Perform the Biopython functions on the sequences, one column per feature."""
+        dataframe = pd.DataFrame(index=sequences.index)
+        sequence_analysis = sequences.apply(ProteinAnalysis)
 
         dataframe["sequence_length"] = sequence_analysis.apply(
             lambda x: x.length)
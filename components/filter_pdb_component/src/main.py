@@ -7,15 +7,20 @@ with the ones in the dataframe using the checksum and filters out the ones that
 
 import logging
 import os
+from typing import List, Optional
 
-from google.cloud import storage
 import pandas as pd
 from fondant.component import PandasTransformComponent
 
+import endpoint_warmer
+from instrumentation import instrumented
+from structure_store import REFERENCE_COLUMNS, StructureStore, empty_references
+
 
 logger = logging.getLogger(__name__)
 
 
+@instrumented
 class FilterPDBComponent(PandasTransformComponent):
     """
     The FilterPDBComponent is a component that takes in a dataframe and,
@@ -25,13 +30,17 @@ class FilterPDBComponent(PandasTransformComponent):
     """
 
     def __init__(self, method: str, local_pdb_path: str, bucket_name: str,
-                project_id: str, google_cloud_credentials_path: str):
+                project_id: str, google_cloud_credentials_path: str,
+                pass_by_reference: bool = False,
+                trigger_endpoints: Optional[List[str]] = None):
         # pylint: disable=super-init-not-called
         # pylint: disable=too-many-arguments
 
         if method not in ["local", "remote"]:
             raise ValueError("method must be either 'local' or 'remote'")
         self.method = method
+        self.pass_by_reference = pass_by_reference
+        self.trigger_endpoints = trigger_endpoints or []
 
         if method == "local":
             self.local_pdb_files_path = local_pdb_path
@@ -62,50 +71,37 @@ class FilterPDBComponent(PandasTransformComponent):
         """Perform the transformation on the dataframe."""
 
         if self.method == "local":
-            dataframe = self.load_local_pdb_files(dataframe)
-
+            store = StructureStore("local", local_pdb_path=self.local_pdb_files_path)
         else:
-            storage_client = storage.Client(self.project_id)
-            bucket = storage_client.get_bucket(self.bucket_name)
-            dataframe = self.load_remote_pdb_files(dataframe, bucket)
-
-        return dataframe
-
-    @staticmethod
-    def load_remote_pdb_files(
-        dataframe: pd.DataFrame,
-        bucket: storage.Bucket) -> pd.DataFrame:
-        """Load the remote PDB files and filter out the ones that already exist."""
+            store = StructureStore("remote", bucket_name=self.bucket_name,
+                                   project_id=self.project_id)
 
-        # Collect all blob names first
-        blob_names = [blob.name for blob in bucket.list_blobs()]
+        dataframe = self.load_pdb_files(dataframe, store)
 
-        existing_blobs = [
-            blob for blob in blob_names if blob in dataframe['sequence_checksum'].values]
-
-        dataframe['pdb_string'] = ""
-
-        for row in dataframe.itertuples():
-            if row.sequence_checksum in existing_blobs:
-                blob = bucket.blob(row.sequence_checksum)
-                dataframe.at[row.Index,
-                            'pdb_string'] = blob.download_as_string()
-
-                # remove the blob from the list of existing blobs
-                existing_blobs.remove(row.sequence_checksum)
+        # the next stage predicts the missing structures, its endpoint scales up in the meantime
+        if self.trigger_endpoints and (dataframe["pdb_key"] == "").any():
+            endpoint_warmer.trigger_endpoints(self.trigger_endpoints)
 
         return dataframe
 
-    def load_local_pdb_files(self, dataframe: pd.DataFrame) -> pd.DataFrame:
-        """Load the local PDB files and filter out the ones that already exist."""
-
-        # create dict of existing PDB files
-        existing_pdb_files = {}
-        for filename in os.listdir(self.local_pdb_files_path):
-            with open(os.path.join(self.local_pdb_files_path, filename), "r") as file:
-                existing_pdb_files[filename.split(".")[0]] = file.read()
-
-        dataframe['pdb_string'] = dataframe['sequence_checksum'].apply(
-            lambda x: existing_pdb_files.get(x, ""))
+    def load_pdb_files(self, dataframe: pd.DataFrame, store: StructureStore) -> pd.DataFrame:
+        """
+        Look up the existing PDB files of the sequences in the store. The reference columns
+        are filled for the existing files, their content is only loaded into pdb_string when
+        the structures are not passed by reference.
+        """
+        references = store.references(dataframe["sequence_checksum"])
+
+        dataframe[REFERENCE_COLUMNS] = empty_references(dataframe.index)
+        found = dataframe["sequence_checksum"].isin(references)
+        if found.any():
+            dataframe.loc[found, REFERENCE_COLUMNS] = [
+                references[checksum] for checksum in dataframe.loc[found, "sequence_checksum"]]
+        dataframe["pdb_size"] = dataframe["pdb_size"].astype("int64")
+
+        dataframe["pdb_string"] = ""
+        if not self.pass_by_reference:
+            dataframe.loc[found, "pdb_string"] = [
+                store.get(key) for key in dataframe.loc[found, "pdb_key"]]
 
         return dataframe
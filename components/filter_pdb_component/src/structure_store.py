@@ -0,0 +1,107 @@
+"""
+The structure store holds the PDB files by sequence checksum, in a local directory or in a
+GCP Storage Bucket.
+
+When the structures are passed by reference, the dataframe only carries a reference to the
+PDB file in the store: its key, its size in bytes and the MD5 hash of its content. The
+components that need the structure fetch it from the store.
+
+This file is the same in the `src` folder of every component that uses it, every image only
+gets its own folder. Change it in `utils/structure_store.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+import base64
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+REFERENCE_COLUMNS = ["pdb_key", "pdb_size", "pdb_hash"]
+# the number of blobs that are looked up at the same time in the GCP Storage Bucket
+LOOKUP_CONCURRENCY = 16
+
+
+def content_hash(pdb_string: str) -> str:
+    """The MD5 hash of a PDB file, the same hash the GCP Storage Bucket keeps for a blob."""
+    return hashlib.md5(pdb_string.encode(), usedforsecurity=False).hexdigest()
+
+
+def empty_references(index: pd.Index) -> pd.DataFrame:
+    """The reference columns for rows without a structure in the store."""
+    return pd.DataFrame({"pdb_key": "", "pdb_size": 0, "pdb_hash": ""}, index=index)
+
+
+class StructureStore:
+    """
+    The StructureStore reads and writes the PDB files, by sequence checksum. The 'local'
+    method uses the files `<checksum>.pdb` in a directory, the 'remote' method uses the
+    blobs `<checksum>` in a GCP Storage Bucket.
+    """
+
+    def __init__(self, method: str, local_pdb_path: Optional[str] = None,
+                 bucket_name: Optional[str] = None, project_id: Optional[str] = None):
+        if method not in ["local", "remote"]:
+            raise ValueError("method must be either 'local' or 'remote'")
+        self.method = method
+        self.local_pdb_path = local_pdb_path
+        self.bucket = None
+
+        if method == "remote":
+            from google.cloud import storage  # pylint: disable=import-outside-toplevel
+            self.bucket = storage.Client(project_id).get_bucket(bucket_name)
+
+    def key(self, checksum: str) -> str:
+        """The key of the structure of a sequence in the store."""
+        return checksum if self.method == "remote" else f"{checksum}.pdb"
+
+    def references(self, checksums: Iterable[str]) -> Dict[str, Tuple[str, int, str]]:
+        """
+        The key, size and hash of the structures in the store, by checksum, for the
+        checksums that have a structure. The content is only read for local files.
+        """
+        checksums = set(checksums)
+        found = {}
+        if self.method == "remote":
+            # only the blobs of the checksums are looked up, not the whole bucket, and the
+            # lookups of a partition are sent concurrently
+            with ThreadPoolExecutor(max_workers=LOOKUP_CONCURRENCY) as executor:
+                blobs = list(executor.map(self.bucket.get_blob, checksums))
+            for blob in blobs:
+                if blob is not None:
+                    # composite blobs have no MD5 hash, their content is not checked
+                    md5_hash = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else ""
+                    found[blob.name] = (blob.name, blob.size, md5_hash)
+            return found
+
+        for checksum in checksums:
+            path = os.path.join(self.local_pdb_path, self.key(checksum))
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    content = file.read()
+                found[checksum] = (self.key(checksum), len(content),
+                                   hashlib.md5(content, usedforsecurity=False).hexdigest())
+        return found
+
+    def get(self, key: str, expected_hash: Optional[str] = None) -> str:
+        """Fetch a structure from the store, and check that it is the referenced one."""
+        if self.method == "remote":
+            pdb_string = self.bucket.blob(key).download_as_text()
+        else:
+            with open(os.path.join(self.local_pdb_path, key), "r") as file:
+                pdb_string = file.read()
+
+        if expected_hash and content_hash(pdb_string) != expected_hash:
+            raise ValueError(f"The structure {key} in the store changed since it was referenced.")
+        return pdb_string
+
+    def put(self, checksum: str, pdb_string: str) -> Tuple[str, int, str]:
+        """Store a structure. Returns its key, size and hash."""
+        key = self.key(checksum)
+        if self.method == "remote":
+            self.bucket.blob(key).upload_from_string(pdb_string)
+        else:
+            with open(os.path.join(self.local_pdb_path, key), "w+") as file:
+                file.write(pdb_string)
+        return key, len(pdb_string.encode()), content_hash(pdb_string)
@@ -9,10 +9,13 @@ from Bio.SeqUtils.CheckSum import crc64
 from fondant.component import PandasTransformComponent
 import pandas as pd
 
+from instrumentation import instrumented
+
 
 logger = logging.getLogger(__name__)
 
 
+@instrumented
 class GenerateProteinSequenceChecksumComponent(PandasTransformComponent):
     """
     The GenerateProteinSequenceChecksumComponent is a component
@@ -1,81 +1,111 @@
 """
 The IFeatureOmegaComponent class is a component that
 generates new features using iFeatureOmega.
+
+With a feature cache, the features are stored by sequence checksum per descriptor, and
+only the descriptors that are not in the cache are calculated, e.g. a descriptor that was
+added to the arguments.
 """
 
 import logging
+import os
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Optional
+
 import pandas as pd
 from fondant.component import PandasTransformComponent
-import iFeatureOmega_CLI.iFeatureOmegaCLI as iFO # pylint: disable=import-error
+
+from feature_cache import FeatureCache, arguments_hash, cached_features
+from instrumentation import instrumented
+
+if TYPE_CHECKING:
+    import iFeatureOmega_CLI.iFeatureOmegaCLI as iFO # pylint: disable=import-error
 
 
 logger = logging.getLogger(__name__)
 
+# all 20 standard amino acids, used to find the feature names
+REFERENCE_SEQUENCE = "ACDEFGHIKLMNPQRSTVWY"
+# the version of the calculated features, change it when a feature changes so the feature
+# cache does not return the features of the earlier version
+FEATURES_VERSION = "1"
 
+
+@instrumented
 class IFeatureOmegaComponent(PandasTransformComponent):
     """
     The IFeatureOmegaComponent class is a component that
     generates new features using iFeatureOmega.
     """
 
-    def __init__(self, descriptors: list):
+    def __init__(self, descriptors: list, feature_cache_path: Optional[str] = None):
         # pylint: disable=super-init-not-called
         self.descriptors = descriptors
+        self.cache = None
+        if feature_cache_path:
+            self.cache = FeatureCache(feature_cache_path, "iFeatureOmega", FEATURES_VERSION)
 
     def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """Perform the transformation on the dataframe."""
         sequences = dataframe["sequence"].tolist()
-
-        # Generate all features, only need one to get the column names
-        all_features = self.generate_all_features_names(sequences[0], dataframe)
-
-        # Add the columns to the dataframe
-        dataframe = pd.concat([dataframe, pd.DataFrame(columns=all_features)])
-
-        # Generate the iFeatureOmega features
-        dataframe = self.generate_ifeature_omega_values(sequences, dataframe)
-
-        return dataframe
+        checksums = dataframe["sequence_checksum"].tolist()
+
+        # every partition gets its own scratch directory for the fasta files, so partitions
+        # that run at the same time on one worker never share a file
+        with tempfile.TemporaryDirectory(prefix="ifeatureomega-") as scratch_dir:
+            def compute(descriptors: List[str],
+                        positions: List[int]) -> Dict[str, Dict[str, list]]:
+                return self.generate_ifeature_omega_values(
+                    descriptors, [sequences[position] for position in positions],
+                    [checksums[position] for position in positions], scratch_dir)
+
+            columns = cached_features(
+                self.cache, checksums,
+                {descriptor: arguments_hash({}) for descriptor in self.descriptors}, compute)
+        if self.cache is not None:
+            logger.info("Feature cache: %s", self.cache.stats())
+
+        features = pd.DataFrame({column: list(values) for column, values in columns.items()},
+                                index=dataframe.index)
+        return pd.concat([dataframe, features], axis=1)
 
     def generate_ifeature_omega_values(
         self,
+        descriptors: List[str],
         sequences: list,
-        dataframe: pd.DataFrame) -> pd.DataFrame:
-        """Generate the iFeatureOmega features for the sequences and add them to the dataframe."""
-        for sequence in sequences:
+        checksums: list,
+        scratch_dir: str) -> Dict[str, Dict[str, list]]:
+        """
+        Generate the iFeatureOmega features of the descriptors for the sequences, per
+        descriptor and column. Without sequences, a reference sequence is used to find the
+        columns, so an empty partition still gets all the columns.
+        """
+        features: Dict[str, Dict[str, list]] = {descriptor: {} for descriptor in descriptors}
+        for sequence, checksum in zip(sequences or [REFERENCE_SEQUENCE],
+                                      checksums or ["reference"]):
             ifeature_omega_protein = self.create_ifo_protein(
-                sequence, dataframe)
-            for descriptor in self.descriptors:
+                sequence, checksum, scratch_dir)
+            for descriptor in descriptors:
                 ifeature_omega_protein.get_descriptor(descriptor)
                 df_ifeature_protein = ifeature_omega_protein.encodings
-                dataframe.loc[dataframe["sequence"] == sequence,
-                            df_ifeature_protein.columns] = df_ifeature_protein.values[0]
+                for column, value in zip(df_ifeature_protein.columns,
+                                         df_ifeature_protein.values[0]):
+                    features[descriptor].setdefault(column, [])
+                    if sequences:
+                        features[descriptor][column].append(value)
 
-        return dataframe
+        return features
 
-    def create_ifo_protein(self, sequence: str, dataframe: pd.DataFrame) -> iFO.iProtein:
-        """Create an iProtein object from a sequence."""
+    def create_ifo_protein(self, sequence: str, checksum: str, scratch_dir: str) -> "iFO.iProtein":
+        """Create an iProtein object from a sequence, using a fasta file in the scratch dir."""
         # pylint: disable=no-self-use
-        # based on the sequence, give me the checksum_sequence in the dataframe
-        file_name = dataframe.loc[dataframe["sequence"]
-                                == sequence, "sequence_checksum"].values[0]
-
-        file_path = f"/{file_name}.txt"
+        # the CLI module imports all descriptor modules of iFeatureOmega, it is only
+        # imported by the first partition that needs it
+        # pylint: disable=import-outside-toplevel,import-error,redefined-outer-name
+        import iFeatureOmega_CLI.iFeatureOmegaCLI as iFO
+        file_path = os.path.join(scratch_dir, f"{checksum}.txt")
         with open(file_path, "w") as file:
-            file.write(f">{file_name}\n")
+            file.write(f">{checksum}\n")
             file.write(sequence)
 
         return iFO.iProtein(file_path)
-
-    def generate_all_features_names(self, sequence: str, dataframe: pd.DataFrame) -> list:
-        """Generate the names of all the features that will be generated by iFeatureOmega."""
-        all_features = []
-
-        single_protein = self.create_ifo_protein(sequence, dataframe)
-
-        for descriptor in self.descriptors:
-            single_protein.get_descriptor(descriptor)
-            df_ifeature_protein = single_protein.encodings
-            all_features.extend(df_ifeature_protein.columns)
-
-        return all_features
@@ -0,0 +1,36 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("iFeatureOmega_CLI")
+
+from src.main import IFeatureOmegaComponent  # pylint: disable=wrong-import-position
+
+SEQUENCES = ["MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ", "GSHMLEDPVAGKTLLV", "MAGLKPEVVIRSQQW"]
+
+
+def create_partition(i):
+    # the same checksums in every partition, with different sequences
+    return pd.DataFrame({"sequence": [sequence[i % 4:] for sequence in SEQUENCES],
+                         "sequence_checksum": ["CRC1", "CRC2", "CRC3"]})
+
+
+def transform(dataframe):
+    return IFeatureOmegaComponent(["AAC", "CTDC"]).transform(dataframe)
+
+
+@pytest.mark.parametrize("executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_concurrent_partitions(executor):
+    expected = [transform(create_partition(i)) for i in range(4)]
+    scratch_before = set(os.listdir(tempfile.gettempdir()))
+
+    with executor(max_workers=4) as pool:
+        results = list(pool.map(transform, [create_partition(i) for i in range(4)] * 3))
+
+    for result, partition in zip(results, expected * 3):
+        pd.testing.assert_frame_equal(result, partition)
+    # no scratch files are left behind
+    assert set(os.listdir(tempfile.gettempdir())) <= scratch_before
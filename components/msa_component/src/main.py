@@ -3,13 +3,18 @@ The MSA Component will take in a dataframe with a column of
 sequences and return a dataframe with the MSA sequences as a new column
 """
 import logging
+import os
 import shutil
 import subprocess  # nosec
+import tempfile
 import pandas as pd
 from fondant.component import PandasTransformComponent
 
+from instrumentation import instrumented, span
+
 logger = logging.getLogger(__name__)
 
+@instrumented
 class MSAComponent(PandasTransformComponent):
     """
     The MSA Component will take in a dataframe with a column of
@@ -26,56 +31,40 @@ class MSAComponent(PandasTransformComponent):
         to the dataframe
         """
 
-        msa_file_content = self.execute_clustalo_cmd(dataframe)
+        # every partition gets its own scratch directory, so partitions that run
+        # at the same time on one worker never share a file
+        with tempfile.TemporaryDirectory(prefix="msa-") as scratch_dir:
+            msa_file_content = self.execute_clustalo_cmd(dataframe, scratch_dir)
         dataframe = self.add_msa_sequences_to_dataframe(
             msa_file_content, dataframe)
 
         return dataframe
 
     @staticmethod
-    def create_fasta_file(dataframe: pd.DataFrame) -> str:
-        """Create a faste file from the dataframe"""
+    def create_fasta_file(dataframe: pd.DataFrame, scratch_dir: str) -> str:
+        """Create a fasta file from the dataframe in the scratch directory"""
 
-        #TODO: this should be stored in the run folder, and not in the root of .fondant
-        # however unclear right now how the correct folder name can be used in the container
-        # output_file = "/.fondant/" + datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + ".fasta"
-        output_file = "all_seq.fasta"
+        output_file = os.path.join(scratch_dir, "all_seq.fasta")
 
         with open(output_file, "w") as f:
-            for _, row in dataframe.iterrows():  # pylint: disable=unused-variable
-                f.write(f">{row['sequence_checksum']}\n{row['sequence']}\n")
+            for checksum, sequence in zip(dataframe['sequence_checksum'], dataframe['sequence']):
+                f.write(f">{checksum}\n{sequence}\n")
 
         return output_file
 
 
-    def execute_clustalo_cmd(self, dataframe: pd.DataFrame) -> str:  # pylint: disable=no-self-use
+    def execute_clustalo_cmd(self, dataframe: pd.DataFrame, scratch_dir: str) -> str:
         """Run Clustalo on the input file and return the content of the msa file"""
 
-        # need to make sure all sequences are there
-        # input_file = "all_sequences.fasta"
-        output_file = "msa.fasta"
-
-        # # Validate file extensions
-        # if not input_file.endswith('.fasta') or not output_file.endswith('.fasta'):
-        #     raise ValueError(
-        #         "Invalid file extensions. Only .fasta files are allowed.")
-
-        # Create output file
-        with open(output_file, "w") as f:
-            f.write("")
-
-        # Write sequences to input file
-        # with open(input_file, "w") as f:
-        #     for _, row in dataframe.iterrows():  # pylint: disable=unused-variable
-        #         f.write(f">{row['sequence_checksum']}\n{row['sequence']}\n")
-
-        input_file = self.create_fasta_file(dataframe)
+        input_file = self.create_fasta_file(dataframe, scratch_dir)
+        output_file = os.path.join(scratch_dir, "msa.fasta")
 
         # Get the full path to the Clustalo executable
         clustalo_path = shutil.which('clustalo')
         if clustalo_path:
-            subprocess.run([clustalo_path, '-t', 'Protein', '-i',  # nosec
-                            input_file, '-o', output_file, '--force'], check=True)  # nosec
+            with span("clustalo"):
+                subprocess.run([clustalo_path, '-t', 'Protein', '-i',  # nosec
+                                input_file, '-o', output_file, '--force'], check=True)  # nosec
         else:
             raise RuntimeError(
                 "Clustalo executable not found in system's PATH")
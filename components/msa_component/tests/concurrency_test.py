@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from src.main import MSAComponent
+
+pytestmark = pytest.mark.skipif(shutil.which("clustalo") is None,
+                                reason="clustalo is not installed")
+
+
+def create_partition(i):
+    sequences = ["MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ", "MKTAYIAKQRQISFVKSHFSRQ",
+                 "MKTAYIAKQRQLEERLGLIEVQ"]
+    sequences = [sequence[i % 5:] for sequence in sequences]
+    return pd.DataFrame({"sequence": sequences,
+                         "sequence_checksum": [f"P{i}S{j}" for j in range(len(sequences))]})
+
+
+def transform(dataframe):
+    return MSAComponent().transform(dataframe)
+
+
+@pytest.mark.parametrize("executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_concurrent_partitions(executor, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    partitions = [create_partition(i) for i in range(8)]
+    scratch_before = set(os.listdir(tempfile.gettempdir()))
+
+    with executor(max_workers=4) as pool:
+        results = list(pool.map(transform, partitions))
+
+    for result, partition in zip(results, partitions):
+        # every partition gets the alignment of its own sequences
+        aligned = result["msa_sequence"].str.replace("-", "")
+        assert aligned.tolist() == partition["sequence"].tolist()
+
+    # no scratch files are left behind
+    assert os.listdir(tmp_path) == []
+    assert set(os.listdir(tempfile.gettempdir())) <= scratch_before
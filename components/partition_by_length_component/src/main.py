@@ -0,0 +1,105 @@
+"""
+The PartitionByLengthComponent repartitions the dataset by a budget of residues, rows
+and bytes per partition instead of a fixed number of rows, so that every partition of
+the following components costs about the same amount of work and memory.
+"""
+import logging
+from typing import List, Optional
+
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+from fondant.component import DaskTransformComponent
+
+from instrumentation import instrumented
+
+
+logger = logging.getLogger(__name__)
+
+
+def plan_partitions(residues: np.ndarray, byte_sizes: np.ndarray, max_residues: int,
+                    max_bytes: int, max_rows: int, isolate_length: int = 0) -> List[int]:
+    # pylint: disable=too-many-arguments,too-many-locals
+    """
+    Cut the rows, in index order, into consecutive partitions. A partition is closed when
+    the next row would exceed the residue, byte or row budget. A row that exceeds a budget
+    on its own, or that is at least `isolate_length` long, gets a partition of its own.
+
+    Returns the position of the first row of every partition.
+    """
+    starts = []
+    total_residues = total_bytes = rows = 0
+    previous_isolated = False
+    for position, (length, size) in enumerate(zip(residues, byte_sizes)):
+        isolated = 0 < isolate_length <= length
+        over_budget = total_residues + length > max_residues or \
+            total_bytes + size > max_bytes or rows + 1 > max_rows
+        if rows == 0 or over_budget or isolated or previous_isolated:
+            starts.append(position)
+            total_residues = total_bytes = rows = 0
+
+        total_residues += length
+        total_bytes += size
+        rows += 1
+        previous_isolated = isolated
+    return starts
+
+
+@instrumented
+class PartitionByLengthComponent(DaskTransformComponent):
+    """
+    The PartitionByLengthComponent repartitions the dataset by a budget of residues, rows
+    and bytes per partition instead of a fixed number of rows, so that every partition of
+    the following components costs about the same amount of work and memory.
+    """
+
+    def __init__(self, max_residues_per_partition: int = 20000,
+                max_rows_per_partition: int = 1000, bytes_column: Optional[str] = None,
+                max_bytes_per_partition: int = 256 * 1024 ** 2, isolate_length: int = 0):
+        # pylint: disable=super-init-not-called
+        # pylint: disable=too-many-arguments
+        self.max_residues = max_residues_per_partition
+        self.max_rows = max_rows_per_partition
+        self.bytes_column = bytes_column
+        self.max_bytes = max_bytes_per_partition
+        self.isolate_length = isolate_length
+
+    def calculate_costs(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        The number of residues and the size of the bytes column of every row. A numeric
+        bytes column (e.g. pdb_size of a structure passed by reference) holds the size itself.
+        """
+        byte_sizes = 0
+        if self.bytes_column:
+            column = dataframe[self.bytes_column]
+            byte_sizes = column.fillna(0) if pd.api.types.is_numeric_dtype(column) \
+                else column.fillna("").str.len()
+        return pd.DataFrame({"residues": dataframe["sequence"].fillna("").str.len(),
+                            "bytes": byte_sizes}, index=dataframe.index).astype(np.int64)
+
+    def transform(self, dataframe: dd.DataFrame) -> dd.DataFrame:
+        """Repartition the dataframe, only the costs of the rows are collected."""
+        costs = dataframe.map_partitions(
+            self.calculate_costs,
+            meta=pd.DataFrame({"residues": [], "bytes": []}, dtype=np.int64)).compute()
+        costs = costs.sort_index()
+        if costs.index.has_duplicates:
+            raise ValueError("The index of the dataframe needs to be unique to repartition it.")
+
+        starts = plan_partitions(costs["residues"].to_numpy(), costs["bytes"].to_numpy(),
+                                self.max_residues, self.max_bytes, self.max_rows,
+                                self.isolate_length)
+        if not starts:
+            return dataframe[["sequence"]]
+
+        divisions = [costs.index[start] for start in starts] + [costs.index[-1]]
+        logger.info("Repartitioning %s rows (%s residues) from %s into %s partitions",
+                    len(costs), costs["residues"].sum(), dataframe.npartitions, len(starts))
+
+        dataframe = dataframe[["sequence"]]
+        if dataframe.known_divisions:
+            return dataframe.repartition(divisions=divisions)
+
+        # the rows are shuffled into the partitions when the divisions are not known
+        index_name = dataframe.index.name or "index"
+        return dataframe.reset_index().set_index(index_name, divisions=divisions)
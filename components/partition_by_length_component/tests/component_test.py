@@ -0,0 +1,59 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main import PartitionByLengthComponent, plan_partitions
+
+
+def test_plan_partitions_respects_the_budgets():
+    residues = np.array([100, 200, 300, 50, 5000, 10, 10, 10])
+    sizes = residues * 600
+
+    assert plan_partitions(residues, sizes, 400, 10 ** 9, 100) == [0, 2, 4, 5]
+    # the byte budget cuts earlier than the residue budget
+    assert plan_partitions(residues, sizes, 400, 200_000, 100) == [0, 2, 3, 4, 5]
+    # the row budget
+    assert plan_partitions(residues, sizes, 10 ** 9, 10 ** 9, 3) == [0, 3, 6]
+    # long sequences are isolated
+    assert plan_partitions(residues, sizes, 10 ** 9, 10 ** 9, 100, isolate_length=300) == \
+        [0, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("sorted_input", [True, False])
+def test_repartition_by_residues(sorted_input):
+    rng = np.random.default_rng(39)
+    lengths = rng.integers(50, 800, 200)
+    lengths[17] = 20000
+    dataframe = pd.DataFrame({"sequence": ["A" * length for length in lengths]},
+                             index=pd.Index([f"seq{i:04d}" for i in range(200)], name="id"))
+    if sorted_input:
+        ddf = dd.from_pandas(dataframe, npartitions=3)
+    else:
+        ddf = dd.from_pandas(dataframe.sample(frac=1, random_state=0), npartitions=3,
+                             sort=False)
+
+    component = PartitionByLengthComponent(max_residues_per_partition=5000,
+                                           max_rows_per_partition=50)
+    result = component.transform(ddf)
+    partitions = [partition for partition in result.partitions]
+    residues = [partition["sequence"].str.len().sum().compute() for partition in partitions]
+    rows = [len(partition) for partition in partitions]
+
+    assert sum(rows) == 200
+    assert all(0 < row <= 50 for row in rows)
+    # only the partition of the extreme sequence exceeds the residue budget
+    assert sorted(residues)[-1] == 20000 and sorted(residues)[-2] <= 5000
+    pd.testing.assert_frame_equal(result.compute().sort_index(), dataframe,
+                                  check_dtype=False, check_index_type=False)
+
+
+def test_byte_sizes_of_a_string_or_a_size_column():
+    dataframe = pd.DataFrame({"sequence": ["AAA", "AA"], "pdb_string": ["ATOM", None],
+                              "pdb_size": [4000, 0]})
+
+    costs = PartitionByLengthComponent(bytes_column="pdb_string").calculate_costs(dataframe)
+    assert costs["bytes"].tolist() == [4, 0]
+    costs = PartitionByLengthComponent(bytes_column="pdb_size").calculate_costs(dataframe)
+    assert costs["bytes"].tolist() == [4000, 0]
+    assert costs["residues"].tolist() == [3, 2]
@@ -0,0 +1,275 @@
+"""
+Instrumentation of the components: the `instrumented` class decorator measures every
+partition of the transform of a component, and `span` measures the hot calls inside it (the
+requests to an endpoint, clustalo, the model inference, ...).
+
+Per partition, the wall time, rows, residues (of the `sequence` column), bytes in and out,
+and the peak RSS of the process are recorded. The calls of a span are kept in a latency
+histogram per call. The metrics are only exported when `COMPONENT_METRICS_DIR` is set, after
+every partition, to files per stage and process in that directory:
+
+- `<stage>.<pid>.partitions.jsonl`: one json object per partition
+- `<stage>.<pid>.json`: the totals and histograms of the process
+- `<stage>.<pid>.prom`: the same in the Prometheus text format, for the textfile collector
+  of the node exporter
+
+`COMPONENT_PROFILE=cprofile` writes the cProfile stats of every partition to
+`<stage>.<pid>.<partition>.prof` (e.g. for `snakeviz` or `pstats`), and
+`COMPONENT_PROFILE=py-spy` records the process with `py-spy` (when it is installed) to
+`<stage>.<pid>.speedscope.json`.
+
+This file is the same in the `src` folder of every component, every image only gets its own
+folder. Change it in `utils/instrumentation.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+import atexit
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import resource
+import shutil
+import signal
+import subprocess  # nosec
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR_VARIABLE = "COMPONENT_METRICS_DIR"
+PROFILE_VARIABLE = "COMPONENT_PROFILE"
+# the upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+                   600)
+
+
+class Histogram:
+    """A latency histogram with the cumulative buckets of Prometheus."""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add the latency of one call."""
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The count, the sum and the cumulative count per bucket."""
+        return {"count": self.count, "sum": self.sum,
+                "buckets": dict(zip(map(str, LATENCY_BUCKETS), self.counts))}
+
+
+class Metrics:
+    """The metrics of one stage in this process."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.totals = {"partitions": 0, "rows": 0, "residues": 0, "bytes_in": 0,
+                       "bytes_out": 0, "seconds": 0.0}
+        self.peak_rss_bytes = 0
+        self.histograms: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, call: str, seconds: float, failed: bool = False) -> None:
+        """Add the latency of a call to its histogram, and count it when it failed."""
+        with self.lock:
+            self.histograms.setdefault(call, Histogram()).observe(seconds)
+            if failed:
+                self.errors[call] = self.errors.get(call, 0) + 1
+
+    def record_partition(self, partition: Dict[str, Any]) -> None:
+        """Add a partition to the totals and export the metrics."""
+        with self.lock:
+            self.totals["partitions"] += 1
+            for name in ["rows", "residues", "bytes_in", "bytes_out", "seconds"]:
+                self.totals[name] += partition[name]
+            self.peak_rss_bytes = max(self.peak_rss_bytes, partition["peak_rss_bytes"])
+            self.histograms.setdefault("transform", Histogram()).observe(partition["seconds"])
+        export(self, partition)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The totals, histograms and errors of the stage in this process."""
+        with self.lock:
+            return {"stage": self.stage, "pid": os.getpid(), **self.totals,
+                    "peak_rss_bytes": self.peak_rss_bytes,
+                    "calls": {call: histogram.to_dict()
+                              for call, histogram in self.histograms.items()},
+                    "errors": dict(self.errors)}
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text format."""
+        snapshot = self.to_dict()
+        labels = f'stage="{self.stage}",pid="{snapshot["pid"]}"'
+        lines = []
+        for name in ["partitions", "rows", "residues", "bytes_in", "bytes_out"]:
+            lines += [f"# TYPE component_{name}_total counter",
+                      f"component_{name}_total{{{labels}}} {snapshot[name]}"]
+        lines += ["# TYPE component_peak_rss_bytes gauge",
+                  f"component_peak_rss_bytes{{{labels}}} {snapshot['peak_rss_bytes']}",
+                  "# TYPE component_call_seconds histogram"]
+        for call, histogram in snapshot["calls"].items():
+            call_labels = f'{labels},call="{call}"'
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'component_call_seconds_bucket{{{call_labels},le="{bound}"}} '
+                             f'{count}')
+            lines += [f'component_call_seconds_bucket{{{call_labels},le="+Inf"}} '
+                      f'{histogram["count"]}',
+                      f"component_call_seconds_sum{{{call_labels}}} {histogram['sum']}",
+                      f"component_call_seconds_count{{{call_labels}}} {histogram['count']}"]
+        lines.append("# TYPE component_call_errors_total counter")
+        for call, count in snapshot["errors"].items():
+            lines.append(f'component_call_errors_total{{{labels},call="{call}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+_METRICS: Dict[str, Metrics] = {}
+_STAGE = "component"
+
+
+def metrics(stage: Optional[str] = None) -> Metrics:
+    """The metrics of a stage, by default the stage of the instrumented component."""
+    stage = stage or _STAGE
+    if stage not in _METRICS:
+        _METRICS[stage] = Metrics(stage)
+    return _METRICS[stage]
+
+
+@contextmanager
+def span(call: str) -> Iterator[None]:
+    """
+    Add the latency of the code in the block to the histogram of the call, in the metrics of
+    the instrumented component (there is one per image).
+    """
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        metrics().observe(call, time.perf_counter() - start, failed)
+
+
+def peak_rss_bytes() -> int:
+    """The peak resident memory of the process, getrusage reports kilobytes on Linux."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def frame_bytes(dataframe: pd.DataFrame) -> int:
+    """The memory of the columns of a dataframe, including the python objects."""
+    return int(dataframe.memory_usage(deep=True, index=False).sum())
+
+
+def instrumented(cls):
+    """
+    Measure every partition of the transform of a component class. The transform of a Dask
+    component builds the graph of all partitions at once, only its duration is measured.
+    """
+    global _STAGE  # pylint: disable=global-statement
+    _STAGE = cls.__name__
+    transform = cls.transform
+    partitions = itertools.count()
+
+    @functools.wraps(transform)
+    def instrumented_transform(self, dataframe, *args, **kwargs):
+        if not isinstance(dataframe, pd.DataFrame):
+            start = time.perf_counter()
+            try:
+                return transform(self, dataframe, *args, **kwargs)
+            finally:
+                metrics(cls.__name__).observe("graph", time.perf_counter() - start)
+                export(metrics(cls.__name__))
+
+        number = next(partitions)
+        partition = {"partition": number, "rows": len(dataframe),
+                     "residues": int(dataframe["sequence"].str.len().sum())
+                     if "sequence" in dataframe.columns else 0,
+                     "bytes_in": frame_bytes(dataframe)}
+        start = time.perf_counter()
+        with profiled(cls.__name__, number):
+            result = transform(self, dataframe, *args, **kwargs)
+        partition.update({"seconds": time.perf_counter() - start,
+                          "bytes_out": frame_bytes(result), "peak_rss_bytes": peak_rss_bytes(),
+                          "time": time.time()})
+        metrics(cls.__name__).record_partition(partition)
+        return result
+
+    cls.transform = instrumented_transform
+    return cls
+
+
+def export(registry: Metrics, partition: Optional[Dict[str, Any]] = None) -> None:
+    """Write the partition and the totals of the stage, when the metrics directory is set."""
+    directory = os.getenv(METRICS_DIR_VARIABLE)
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f"{registry.stage}.{os.getpid()}")
+    if partition is not None:
+        with open(f"{prefix}.partitions.jsonl", "a") as file:
+            file.write(json.dumps(partition) + "\n")
+    # the files are replaced at once, the collector may read them at any time
+    for suffix, content in [("json", json.dumps(registry.to_dict(), indent=2)),
+                            ("prom", registry.to_prometheus())]:
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            file.write(content)
+        os.replace(file.name, f"{prefix}.{suffix}")
+
+
+_PY_SPY_STARTED = False
+
+
+def start_py_spy(directory: str, stage: str) -> None:
+    """Record this process with py-spy until it exits."""
+    global _PY_SPY_STARTED  # pylint: disable=global-statement
+    if _PY_SPY_STARTED:
+        return
+    _PY_SPY_STARTED = True
+    py_spy = shutil.which("py-spy")
+    if py_spy is None:
+        logger.warning("%s=py-spy is set, but py-spy is not installed", PROFILE_VARIABLE)
+        return
+    output = os.path.join(directory, f"{stage}.{os.getpid()}.speedscope.json")
+    process = subprocess.Popen([py_spy, "record", "--pid", str(os.getpid()),  # nosec
+                                "--format", "speedscope", "--output", output])
+    # py-spy writes the recording when it is interrupted
+    atexit.register(process.send_signal, signal.SIGINT)
+
+
+@contextmanager
+def profiled(stage: str, partition: int) -> Iterator[None]:
+    """Profile the block with the profiler of `COMPONENT_PROFILE`, if any."""
+    profiler_name = os.getenv(PROFILE_VARIABLE, "").lower()
+    directory = os.getenv(METRICS_DIR_VARIABLE) or tempfile.gettempdir()
+    if profiler_name == "py-spy":
+        start_py_spy(directory, stage)
+    if profiler_name != "cprofile":
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # another partition of this process is being profiled
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f"{stage}.{os.getpid()}.{partition}.prof"))
@@ -2,68 +2,141 @@
 The PDBFeaturesComponent takes as argument the pdb file
 as string and will calculate features such as contact order, LRO, etc.
 """
+import io
 import logging
-import tempfile
+import os
+from typing import List, Optional
+
 import pandas as pd
+import numpy as np
 from Bio.PDB import PDBParser
 
 from fondant.component import PandasTransformComponent
 
+import endpoint_warmer
+from instrumentation import instrumented, span
 # from pdb_utils.calculate_buriedness import calculate_aligned_buriedness
 # from pdb_utils.calculate_distance_matrix import calculate_distance_matrix
-# from pdb_utils.calculate_hydrophobicity import calculate_hydrophobicity
+from pdb_utils.calculate_hydrophobicity import calculate_hydrophobicity
 # from pdb_utils.calculate_hydrophobicity_accessible_area import \
 #     calculate_hydrophobicity_accessible_area
-# from pdb_utils.calculate_interactions import calculate_interactions
+from pdb_utils.calculate_interactions import calculate_interactions
 from pdb_utils.calculate_long_range_order import calculate_long_range_order
 from pdb_utils.calculate_number_of_contacts import calculate_number_of_contacts
+from pdb_utils.calculate_secondary_structure import calculate_secondary_structure
+from pdb_utils.residue_neighbors import find_residue_neighbors
+from structure_store import StructureStore
 
 
 logger = logging.getLogger(__name__)
 
 
+@instrumented
 class PDBFeaturesComponent(PandasTransformComponent):
     """
     The PDBFeaturesComponent takes as argument the pdb file
     as string and will calculate features such as contact order, LRO, etc.
     """
 
-    def __init__(self, *_):
+    def __init__(self, per_residue_features: bool = False, method: Optional[str] = None,
+                 local_pdb_path: Optional[str] = None, bucket_name: Optional[str] = None,
+                 project_id: Optional[str] = None,
+                 google_cloud_credentials_path: Optional[str] = None,
+                 trigger_endpoints: Optional[List[str]] = None):
         # pylint: disable=super-init-not-called
-        pass
+        # pylint: disable=too-many-arguments
+        self.per_residue_features = per_residue_features
+        self.method = method
+        self.local_pdb_path = local_pdb_path
+        self.bucket_name = bucket_name
+        self.project_id = project_id
+        self.trigger_endpoints = trigger_endpoints or []
+        if method == "remote":
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_cloud_credentials_path
+            os.environ["GOOGLE_CLOUD_PROJECT"] = project_id
+        self.store = None
 
-    @staticmethod
-    def transform(dataframe: pd.DataFrame) -> pd.DataFrame:
+    def load_pdb_string(self, row: pd.Series) -> str:
+        """
+        The PDB file of a row. A structure that is passed by reference is only fetched
+        from the structure store here, when its features are calculated.
+        """
+        pdb_string = row.get("pdb_string") or ""
+        key = row.get("pdb_key") or ""
+        if pdb_string or not key:
+            return pdb_string
+
+        if self.store is None:
+            if self.method is None:
+                raise ValueError(f"The structure {key} is passed by reference, set the method "
+                                 "argument to fetch it from the structure store.")
+            self.store = StructureStore(self.method, local_pdb_path=self.local_pdb_path,
+                                        bucket_name=self.bucket_name, project_id=self.project_id)
+        with span("structure_fetch"):
+            return self.store.get(key, row.get("pdb_hash"))
+
+    def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
         Transforms the input dataframe by calculating the features of the PDB file.
         """
+        # a later stage calls the endpoints, they scale up while the features are calculated
+        if self.trigger_endpoints and len(dataframe):
+            endpoint_warmer.trigger_endpoints(self.trigger_endpoints)
+
         parser = PDBParser()
+        self.create_per_residue_columns(dataframe)
         for idx, row in dataframe.iterrows():
-            with tempfile.NamedTemporaryFile(delete=False) as tmp_fp:
-                tmp_fp.write(row["pdb_string"].encode())
-                tmp_fp.close()
-
-                structure = parser.get_structure("protein", tmp_fp.name)
-
-                dataframe.at[idx, "pdb_lro"] = calculate_long_range_order(
-                    structure)
-
-                dataframe.at[idx, "pdb_contacts_8A_ca"] = calculate_number_of_contacts(
-                    structure, cutoff=8, atom_type='CA')
-                dataframe.at[idx, "pdb_contacts_14A_ca"] = calculate_number_of_contacts(
-                    structure, cutoff=14, atom_type='CA')
-                # dataframe.at[idx, "pdb_buriedness"] = calculate_aligned_buriedness(
-                #     structure, row["msa_sequence"])
-                # dataframe.at[idx, "pdb_aa_distances_matrix"] = calculate_distance_matrix(
-                #     structure, row["msa_sequence"])
-
-            # interactions = calculate_interactions(structure)
-            # dataframe.at[idx, "pdb_avg_short_range"] = interactions[0]
-            # dataframe.at[idx, "pdb_avg_medium_range"] = interactions[1]
-            # dataframe.at[idx, "pdb_avg_long_range"] = interactions[2]
-
-            # dataframe.at[idx, "pdb_avg_hydrophobicity"] = calculate_hydrophobicity(
-            #     structure)
+            # the structure is parsed from memory, so concurrent partitions share no files
+            pdb_string = self.load_pdb_string(row)
+            with span("pdb_parse"):
+                structure = parser.get_structure("protein", io.StringIO(pdb_string))
+
+            dataframe.at[idx, "pdb_lro"] = calculate_long_range_order(
+                structure)
+
+            dataframe.at[idx, "pdb_contacts_8A_ca"] = calculate_number_of_contacts(
+                structure, cutoff=8, atom_type='CA')
+            dataframe.at[idx, "pdb_contacts_14A_ca"] = calculate_number_of_contacts(
+                structure, cutoff=14, atom_type='CA')
+            # dataframe.at[idx, "pdb_buriedness"] = calculate_aligned_buriedness(
+            #     structure, row["msa_sequence"])
+            # dataframe.at[idx, "pdb_aa_distances_matrix"] = calculate_distance_matrix(
+            #     structure, row["msa_sequence"])
+
+            # one neighbor query is shared by the hydrophobicity and interaction features
+            neighbors = find_residue_neighbors(structure, cutoff=8)
+
+            avg_hydrophobicity, residue_hydrophobicity = calculate_hydrophobicity(neighbors)
+            dataframe.at[idx, "pdb_avg_hydrophobicity"] = avg_hydrophobicity
+
+            interactions = calculate_interactions(neighbors)
+            dataframe.at[idx, "pdb_avg_short_range"] = interactions[0]
+            dataframe.at[idx, "pdb_avg_medium_range"] = interactions[1]
+            dataframe.at[idx, "pdb_avg_long_range"] = interactions[2]
+
+            if self.per_residue_features:
+                dataframe.at[idx, "pdb_residue_hydrophobicity"] = \
+                    residue_hydrophobicity.astype(np.float32).tolist()
+                dataframe.at[idx, "pdb_residue_short_range"] = interactions[3][:, 0].tolist()
+                dataframe.at[idx, "pdb_residue_medium_range"] = interactions[3][:, 1].tolist()
+                dataframe.at[idx, "pdb_residue_long_range"] = interactions[3][:, 2].tolist()
+
+            secondary_structure, fractions = calculate_secondary_structure(structure)
+            dataframe.at[idx, "pdb_secondary_structure"] = secondary_structure
+            dataframe.at[idx, "pdb_helix_fraction"] = fractions["helix"]
+            dataframe.at[idx, "pdb_strand_fraction"] = fractions["strand"]
+            dataframe.at[idx, "pdb_coil_fraction"] = fractions["coil"]
+
             # dataframe.at[idx, "pdb_hydrophobicity_accessible_area"] = \
             #     calculate_hydrophobicity_accessible_area(pdb_file_path)
         return dataframe
+
+    @staticmethod
+    def create_per_residue_columns(dataframe: pd.DataFrame) -> None:
+        """
+        Create the per-residue columns. They stay empty unless per_residue_features is set.
+        """
+        for column in ["pdb_residue_hydrophobicity", "pdb_residue_short_range",
+                    "pdb_residue_medium_range", "pdb_residue_long_range"]:
+            dataframe[column] = pd.Series([None] * len(dataframe),
+                                        index=dataframe.index, dtype=object)
@@ -1,42 +1,33 @@
 """
 This module calculates the hydrophobicity of a protein sequence.
 """
-from Bio.SeqUtils.ProtParamData import kd
+from typing import Tuple
 
+import numpy as np
+from Bio.SeqUtils.ProtParamData import kd
 
-def calculate_hydrophobicity(structure: str) -> float:
-    """
-    Calculate the hydrophobicity of a protein structure from a PDB file.
-    """
+from pdb_utils.residue_neighbors import ResidueNeighbors
 
-    hydrophobicity = {}
 
-    for model in structure:
-        for chain in model:
-            for residue in chain:
-                residue_id = residue.get_id()[1]
-                residue_aa = residue.get_resname()[0]
-                hydrophobicity[residue_id] = kd.get(residue_aa, 0.0)
+def calculate_hydrophobicity(neighbors: ResidueNeighbors) -> Tuple[float, np.ndarray]:
+    """
+    Calculate the local hydrophobicity of a protein structure from its residue neighbors.
 
-    for model in structure: #pylint: disable=too-many-nested-blocks
-        for chain in model:
-            for residue in chain:
-                residue_id = residue.get_id()[1]
+    The local hydrophobicity of a residue is its own Kyte-Doolittle value plus the values
+    of all residues whose CA atom lies within the neighbor cutoff (8 Å by default).
 
-                for other_residue in chain:
-                    if residue != other_residue:
-                        other_residue_aa = other_residue.get_resname()[0]
+    Returns the average over all residues and the per-residue values.
+    """
 
-                        try:
-                            distance = residue['CA'] - other_residue['CA']
-                        except KeyError:
-                            continue
+    kd_values = np.array([kd.get(code, 0.0) for code in neighbors.residue_codes],
+                        dtype=np.float64)
 
-                        if distance < 8:
-                            hydrophobicity[residue_id] += kd.get(
-                                other_residue_aa, 0.0)
+    if kd_values.size == 0:
+        return 0.0, kd_values
 
-    # get the average hydrophobicity
-    average_hydrophobicity = sum(hydrophobicity.values()) / len(hydrophobicity)
+    first, second = neighbors.pairs[:, 0], neighbors.pairs[:, 1]
+    hydrophobicity = kd_values \
+        + np.bincount(first, weights=kd_values[second], minlength=kd_values.size) \
+        + np.bincount(second, weights=kd_values[first], minlength=kd_values.size)
 
-    return average_hydrophobicity
+    return float(hydrophobicity.mean()), hydrophobicity
@@ -3,43 +3,42 @@ This module calculates the interactions between amino acid residues in the cryst
 """
 from typing import Tuple
 
+import numpy as np
 
-def calculate_interactions(structure: str) -> Tuple[str, str, str]:
+from pdb_utils.residue_neighbors import ResidueNeighbors
+
+
+def calculate_interactions(neighbors: ResidueNeighbors) -> Tuple[float, float, float, np.ndarray]:
     """
-    Calculate the interactions between amino acids in a protein structure from a PDB file.
+    Calculate the interactions between amino acids in a protein structure from its
+    residue neighbors, following the definition used in PDBparam.
 
-    Returns the average short range, medium range and long range interactions.
+    Every pair of residues within the neighbor cutoff is an interaction. It is short range
+    when the residues are at most 2 positions apart in the same chain, medium range when they
+    are 3 or 4 positions apart and long range otherwise (including pairs across chains).
+
+    Returns the average short range, medium range and long range interactions per residue
+    and the per-residue counts as an array of shape (n_residues, 3).
     """
 
-    # Get the model and chain
-    model = structure[0]
-    chain = model['A']
-
-    # Initialize total distances
-    total_short_range = 0
-    total_medium_range = 0
-    total_long_range = 0
-
-    # Loop over each residue in the chain
-    for target_residue in chain:
-        # Calculate interactions for the current residue
-        for residue in chain:
-            if residue != target_residue:
-                try:
-                    distance = target_residue["CA"] - residue["CA"]
-                except KeyError:
-                    continue
-
-                if distance <= 2:
-                    total_short_range += distance
-                elif 3 <= distance <= 4:
-                    total_medium_range += distance
-                else:
-                    total_long_range += distance
-
-    average_short_range = total_short_range/len(list(chain.get_residues()))
-    average_medium_range = total_medium_range / \
-        len(list(chain.get_residues()))
-    average_long_range = total_long_range/len(list(chain.get_residues()))
-
-    return average_short_range, average_medium_range, average_long_range
+    n_residues = len(neighbors.residue_codes)
+    if n_residues == 0:
+        return 0.0, 0.0, 0.0, np.zeros((0, 3), dtype=np.int64)
+
+    first, second = neighbors.pairs[:, 0], neighbors.pairs[:, 1]
+    separation = np.abs(neighbors.residue_number[first] - neighbors.residue_number[second])
+    same_chain = neighbors.chain_index[first] == neighbors.chain_index[second]
+
+    # 0: short range, 1: medium range, 2: long range
+    interaction_range = np.full(len(first), 2, dtype=np.int64)
+    interaction_range[same_chain & (separation <= 4)] = 1
+    interaction_range[same_chain & (separation <= 2)] = 0
+
+    counts = np.zeros((n_residues, 3), dtype=np.int64)
+    np.add.at(counts, (first, interaction_range), 1)
+    np.add.at(counts, (second, interaction_range), 1)
+
+    average_short_range, average_medium_range, average_long_range = counts.mean(axis=0)
+
+    return float(average_short_range), float(average_medium_range), \
+        float(average_long_range), counts
@@ -0,0 +1,224 @@
+"""
+This module assigns the secondary structure of a protein structure from its backbone
+coordinates, following the DSSP hydrogen bond model (Kabsch & Sander, 1983).
+
+The hydrogen bond energies, turns, helices and bridges are calculated with NumPy on the
+residue pairs of a CA neighbor query, so no external mkdssp binary is needed.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+from pdb_utils.residue_neighbors import find_neighbor_pairs
+
+# electrostatic coupling constant 0.42 * 0.20 * 332 (kcal/mol * Å)
+COUPLING_CONSTANT = -27.888
+HBOND_ENERGY_CUTOFF = -0.5
+MIN_HBOND_ENERGY = -9.9
+MIN_CA_DISTANCE = 9.0
+MAX_PEPTIDE_BOND_LENGTH = 2.5
+
+HELIX_CODES = "HGI"
+STRAND_CODES = "EB"
+
+
+def get_backbone(structure: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Collect the backbone atoms (N, CA, C, O) of every amino acid residue in the
+    first model of the structure.
+
+    Returns the coordinates as an array of shape (n_residues, 4, 3), the chain index
+    of every residue and whether the residue is a proline (which has no amide hydrogen).
+    """
+    backbone, chains, prolines = [], [], []
+
+    # use only the first model in the structure
+    model = structure[0]
+    for chain_idx, chain in enumerate(model):
+        for residue in chain:
+            if residue.id[0] != " " or not all(atom in residue for atom in "N CA C O".split()):
+                continue
+
+            backbone.append([residue[atom].coord for atom in ("N", "CA", "C", "O")])
+            chains.append(chain_idx)
+            prolines.append(residue.get_resname() == "PRO")
+
+    return np.asarray(backbone, dtype=np.float64).reshape(-1, 4, 3), \
+        np.asarray(chains, dtype=np.int64), np.asarray(prolines, dtype=bool)
+
+
+def calculate_hbonds(backbone: np.ndarray, chains: np.ndarray, prolines: np.ndarray,
+                    pairs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the backbone hydrogen bonds using the DSSP electrostatic energy.
+    Only the residue pairs with their CA atoms within 9 Å of each other are considered.
+
+    Returns the hydrogen bonds as sorted keys `acceptor * n_residues + donor`, where the
+    acceptor is the residue of the C=O group and the donor the residue of the N-H group,
+    and the segment index of every residue (residues of one segment are connected
+    by peptide bonds).
+    """
+    # pylint: disable=too-many-locals
+    n_residues = len(backbone)
+    nitrogen, carbon, oxygen = backbone[:, 0], backbone[:, 2], backbone[:, 3]
+
+    # a residue is connected to the previous one when the peptide bond is intact
+    connected = np.zeros(n_residues, dtype=bool)
+    connected[1:] = (chains[1:] == chains[:-1]) & (
+        np.linalg.norm(carbon[:-1] - nitrogen[1:], axis=1) < MAX_PEPTIDE_BOND_LENGTH)
+    segments = np.cumsum(~connected)
+
+    # place the amide hydrogen along the bisector of the previous C=O bond
+    hydrogen = np.full_like(nitrogen, np.nan)
+    carbonyl = carbon[:-1] - oxygen[:-1]
+    hydrogen[1:] = nitrogen[1:] + carbonyl / np.linalg.norm(carbonyl, axis=1, keepdims=True)
+    has_hydrogen = connected & ~prolines
+
+    acceptor = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    donor = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    # the N-H of a residue cannot bond to the C=O of the residue just before it
+    keep = has_hydrogen[donor] & (donor != acceptor + 1)
+    acceptor, donor = acceptor[keep], donor[keep]
+
+    def distance(first, second):
+        return np.maximum(np.linalg.norm(first - second, axis=1), 0.5)
+
+    energy = COUPLING_CONSTANT * (
+        1 / distance(hydrogen[donor], oxygen[acceptor])
+        - 1 / distance(hydrogen[donor], carbon[acceptor])
+        + 1 / distance(nitrogen[donor], carbon[acceptor])
+        - 1 / distance(nitrogen[donor], oxygen[acceptor]))
+    energy = np.maximum(np.round(energy * 1000) / 1000, MIN_HBOND_ENERGY)
+
+    bonded = energy < HBOND_ENERGY_CUTOFF
+    return np.sort(acceptor[bonded] * n_residues + donor[bonded]), segments
+
+
+class _HBondLookup:
+    """Vectorized lookup of hydrogen bonds between residue index arrays."""
+
+    def __init__(self, hbond_keys: np.ndarray, segments: np.ndarray):
+        self.hbond_keys = hbond_keys
+        self.segments = segments
+        self.n_residues = len(segments)
+
+    def valid(self, *indices: np.ndarray) -> np.ndarray:
+        """Whether all indices exist."""
+        mask = np.ones(np.shape(indices[0]), dtype=bool)
+        for index in indices:
+            mask &= (index >= 0) & (index < self.n_residues)
+        return mask
+
+    def same_segment(self, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """Whether both (existing) residues lie in the same connected segment."""
+        valid = self.valid(first, second)
+        result = np.zeros(np.shape(first), dtype=bool)
+        result[valid] = self.segments[first[valid]] == self.segments[second[valid]]
+        return result
+
+    def __call__(self, acceptor: np.ndarray, donor: np.ndarray) -> np.ndarray:
+        """Whether the C=O of the acceptor is hydrogen bonded to the N-H of the donor."""
+        valid = self.valid(acceptor, donor)
+        result = np.zeros(np.shape(acceptor), dtype=bool)
+        keys = acceptor[valid] * self.n_residues + donor[valid]
+        result[valid] = np.isin(keys, self.hbond_keys)
+        return result
+
+
+def find_turns(hbond: _HBondLookup) -> Dict[int, np.ndarray]:
+    """An n-turn at residue i is a hydrogen bond from the C=O of i to the N-H of i + n."""
+    index = np.arange(hbond.n_residues)
+    return {turn: hbond(index, index + turn) & hbond.same_segment(index, index + turn)
+            for turn in (3, 4, 5)}
+
+
+def helix_residues(turns: np.ndarray, turn: int) -> np.ndarray:
+    """Two consecutive n-turns at i - 1 and i make the residues i .. i + n - 1 helical."""
+    starts = np.flatnonzero(turns[1:] & turns[:-1]) + 1
+    return np.unique((starts[:, None] + np.arange(turn)).ravel())
+
+
+def assign_turns(turns: Dict[int, np.ndarray], codes: np.ndarray) -> None:
+    """Assign the turns (T) and the 3- and 5-helices (G, I)."""
+    for turn, turn_starts in turns.items():
+        turn_residues = (np.flatnonzero(turn_starts)[:, None] + np.arange(1, turn)).ravel()
+        codes[turn_residues] = "T"
+
+    for turn, code in ((3, "G"), (5, "I")):
+        residues = helix_residues(turns[turn], turn)
+        codes[residues[~np.isin(codes[residues], list(HELIX_CODES))]] = code
+
+
+def assign_bridges(hbond: _HBondLookup, pairs: np.ndarray, codes: np.ndarray) -> None:
+    """Assign the isolated bridges (B) and the ladders of the beta strands (E)."""
+    # pylint: disable=too-many-locals
+    first, second = pairs[:, 0], pairs[:, 1]
+    candidate = ((hbond.segments[first] != hbond.segments[second]) | (second - first > 2)) \
+        & hbond.same_segment(first - 1, first + 1) & hbond.same_segment(second - 1, second + 1)
+    first, second = first[candidate], second[candidate]
+
+    parallel = (hbond(first - 1, second) & hbond(second, first + 1)) \
+        | (hbond(second - 1, first) & hbond(first, second + 1))
+    antiparallel = (hbond(first, second) & hbond(second, first)) \
+        | (hbond(first - 1, second + 1) & hbond(second - 1, first + 1))
+
+    n_residues = hbond.n_residues
+    parallel_keys = np.sort(first[parallel] * n_residues + second[parallel])
+    antiparallel_keys = np.sort(first[antiparallel] * n_residues + second[antiparallel])
+
+    def in_ladder(bridge_first, bridge_second, keys, direction):
+        # a bridge is part of a ladder when the neighboring residues are also bridged
+        ladder = np.zeros(len(bridge_first), dtype=bool)
+        for step in (-1, 1):
+            ladder |= np.isin((bridge_first + step) * n_residues
+                              + bridge_second + direction * step, keys)
+        return ladder
+
+    for mask, keys, direction in ((parallel, parallel_keys, 1),
+                                  (antiparallel, antiparallel_keys, -1)):
+        bridge_first, bridge_second = first[mask], second[mask]
+        ladder = in_ladder(bridge_first, bridge_second, keys, direction)
+        residues = np.concatenate([bridge_first, bridge_second])
+        in_strand = np.concatenate([ladder, ladder])
+        codes[residues[in_strand]] = "E"
+        isolated = residues[~in_strand]
+        codes[isolated[codes[isolated] != "E"]] = "B"
+
+
+def assign_bends(hbond: _HBondLookup, c_alpha: np.ndarray, codes: np.ndarray) -> None:
+    """Assign the bends (S): CA(i-2) -> CA(i) -> CA(i+2) bends by more than 70 degrees."""
+    index = np.arange(2, hbond.n_residues - 2)
+    index = index[hbond.same_segment(index - 2, index + 2)]
+    before = c_alpha[index] - c_alpha[index - 2]
+    after = c_alpha[index + 2] - c_alpha[index]
+    cosine = np.einsum("ij,ij->i", before, after) / (
+        np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1))
+    codes[index[cosine < np.cos(np.radians(70))]] = "S"
+
+
+def calculate_secondary_structure(structure: str) -> Tuple[str, Dict[str, float]]:
+    """
+    Calculate the DSSP-style secondary structure of a protein structure.
+
+    Returns the per-residue codes as a string (H: alpha helix, G: 3-10 helix, I: pi helix,
+    E: strand, B: isolated bridge, T: turn, S: bend, -: coil) and the helix (H, G, I),
+    strand (E, B) and coil fractions.
+    """
+    backbone, chains, prolines = get_backbone(structure)
+    if len(backbone) == 0:
+        return "", {"helix": 0.0, "strand": 0.0, "coil": 0.0}
+
+    pairs = find_neighbor_pairs(backbone[:, 1], MIN_CA_DISTANCE)
+    hbond = _HBondLookup(*calculate_hbonds(backbone, chains, prolines, pairs))
+    turns = find_turns(hbond)
+    codes = np.full(len(backbone), "-", dtype="<U1")
+
+    # assign from the lowest to the highest priority: S < T < I < G < B, E < H
+    assign_bends(hbond, backbone[:, 1], codes)
+    assign_turns(turns, codes)
+    assign_bridges(hbond, pairs, codes)
+    codes[helix_residues(turns[4], 4)] = "H"
+
+    helix = float(np.isin(codes, list(HELIX_CODES)).mean())
+    strand = float(np.isin(codes, list(STRAND_CODES)).mean())
+    return "".join(codes), {"helix": helix, "strand": strand, "coil": 1.0 - helix - strand}
@@ -0,0 +1,66 @@
+"""
+This module provides a shared neighbor query over the CA atoms of a protein structure,
+so that the residue environment features can be calculated without a quadratic loop.
+"""
+from typing import NamedTuple
+
+import numpy as np
+from Bio.Data.PDBData import protein_letters_3to1_extended
+from scipy.spatial import cKDTree
+
+
+class ResidueNeighbors(NamedTuple):
+    """
+    The residues of the first model of a structure (all chains) together with
+    the pairs of residues whose CA atoms lie within the cutoff of each other.
+    """
+    residue_codes: np.ndarray
+    chain_index: np.ndarray
+    residue_number: np.ndarray
+    coords: np.ndarray
+    pairs: np.ndarray
+    distances: np.ndarray
+
+
+def find_neighbor_pairs(coords: np.ndarray, cutoff: float) -> np.ndarray:
+    """
+    Return all index pairs (i, j) with i < j whose coordinates are within the cutoff.
+    """
+    if len(coords) < 2:
+        return np.empty((0, 2), dtype=np.intp)
+
+    return cKDTree(coords).query_pairs(cutoff, output_type="ndarray")
+
+
+def find_residue_neighbors(structure: str, cutoff: float = 8.0) -> ResidueNeighbors:
+    """
+    Collect the CA atoms of every amino acid residue in the first model of the structure
+    and query all residue pairs within the cutoff distance.
+    """
+    codes, chains, numbers, coords = [], [], [], []
+
+    # use only the first model in the structure
+    model = structure[0]
+    for chain_idx, chain in enumerate(model):
+        for residue in chain:
+            # skip water and hetatoms, and residues without a CA atom
+            if residue.id[0] != " " or "CA" not in residue:
+                continue
+
+            codes.append(protein_letters_3to1_extended.get(residue.get_resname(), "X"))
+            chains.append(chain_idx)
+            numbers.append(residue.id[1])
+            coords.append(residue["CA"].coord)
+
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    pairs = find_neighbor_pairs(coords, cutoff)
+    distances = np.linalg.norm(coords[pairs[:, 0]] - coords[pairs[:, 1]], axis=1)
+
+    return ResidueNeighbors(
+        residue_codes=np.asarray(codes, dtype="<U1"),
+        chain_index=np.asarray(chains, dtype=np.int64),
+        residue_number=np.asarray(numbers, dtype=np.int64),
+        coords=coords,
+        pairs=pairs,
+        distances=distances,
+    )
@@ -0,0 +1,35 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from src.main import PDBFeaturesComponent
+from tests.pdb_utils_test import HELIX, STRAND, build_backbone_pdb
+
+SEQUENCES = ["MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ", "GSHMLEDPVAGKTLLV", "MAGLKPEVVIRSQQW"]
+
+
+def create_partitions():
+    return [pd.DataFrame({"pdb_string": [build_backbone_pdb(sequence[i:], phi_psi)
+                                         for sequence in SEQUENCES]})
+            for i, phi_psi in enumerate([HELIX, STRAND, HELIX, STRAND])]
+
+
+def transform(dataframe):
+    return PDBFeaturesComponent(per_residue_features=True).transform(dataframe)
+
+
+@pytest.mark.parametrize("executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_concurrent_partitions(executor):
+    expected = [transform(partition) for partition in create_partitions()]
+    scratch_before = set(os.listdir(tempfile.gettempdir()))
+
+    with executor(max_workers=4) as pool:
+        results = list(pool.map(transform, create_partitions() * 3))
+
+    for result, partition in zip(results, expected * 3):
+        pd.testing.assert_frame_equal(result, partition)
+    # no scratch files are left behind
+    assert set(os.listdir(tempfile.gettempdir())) <= scratch_before
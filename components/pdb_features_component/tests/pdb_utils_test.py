@@ -0,0 +1,177 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from Bio.Data.PDBData import protein_letters_1to3
+from Bio.PDB import PDBParser
+from Bio.SeqUtils.ProtParamData import kd
+
+import endpoint_warmer
+from pdb_utils.calculate_hydrophobicity import calculate_hydrophobicity
+from pdb_utils.calculate_interactions import calculate_interactions
+from pdb_utils.calculate_secondary_structure import calculate_secondary_structure
+from pdb_utils.residue_neighbors import find_residue_neighbors
+from src.main import PDBFeaturesComponent
+
+HELIX = (-57.0, -47.0)
+STRAND = (-139.0, 135.0)
+
+
+def place_atom(a, b, c, bond, angle, torsion):
+    """Place an atom from three previous atoms and its internal coordinates (NeRF)."""
+    angle, torsion = np.radians(angle), np.radians(torsion)
+    bc = (c - b) / np.linalg.norm(c - b)
+    n = np.cross(b - a, bc)
+    n /= np.linalg.norm(n)
+    d = np.array([-bond * np.cos(angle),
+                  bond * np.sin(angle) * np.cos(torsion),
+                  bond * np.sin(angle) * np.sin(torsion)])
+    return c + d[0] * bc + d[1] * np.cross(n, bc) + d[2] * n
+
+
+def build_backbone_pdb(sequence, phi_psi=HELIX, chain_id="A"):
+    """Build a PDB string with an ideal backbone for the sequence."""
+    phi, psi = phi_psi
+    n_atom = np.array([0.0, 1.458, 0.0])
+    ca_atom = np.array([0.0, 0.0, 0.0])
+    c_atom = place_atom(np.array([1.0, 1.458, 0.0]), n_atom, ca_atom, 1.525, 111.2, -60.0)
+    lines = []
+    for i, aa in enumerate(sequence):
+        o_atom = place_atom(n_atom, ca_atom, c_atom, 1.231, 120.5, psi + 180.0)
+        for name, coord in (("N", n_atom), ("CA", ca_atom), ("C", c_atom), ("O", o_atom)):
+            lines.append(
+                f"ATOM  {len(lines) + 1:5d}  {name:<3s} {protein_letters_1to3[aa].upper()} "
+                f"{chain_id}{i + 1:4d}    {coord[0]:8.3f}{coord[1]:8.3f}{coord[2]:8.3f}"
+                f"  1.00  0.00           {name[0]}")
+        next_n = place_atom(n_atom, ca_atom, c_atom, 1.329, 116.2, psi)
+        next_ca = place_atom(ca_atom, c_atom, next_n, 1.458, 121.7, 180.0)
+        next_c = place_atom(c_atom, next_n, next_ca, 1.525, 111.2, phi)
+        n_atom, ca_atom, c_atom = next_n, next_ca, next_c
+    lines.append("END")
+    return "\n".join(lines)
+
+
+def parse(pdb_string):
+    return PDBParser(QUIET=True).get_structure("protein", io.StringIO(pdb_string))
+
+
+@pytest.fixture
+def helix_structure():
+    return parse(build_backbone_pdb("MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ"))
+
+
+def brute_force_neighbors(coords, cutoff):
+    distances = np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=2)
+    i, j = np.nonzero(np.triu(distances <= cutoff, k=1))
+    return set(zip(i.tolist(), j.tolist()))
+
+
+def test_neighbor_pairs_match_brute_force(helix_structure):
+    neighbors = find_residue_neighbors(helix_structure, cutoff=8)
+
+    assert set(map(tuple, neighbors.pairs.tolist())) == \
+        brute_force_neighbors(neighbors.coords, 8)
+    assert "".join(neighbors.residue_codes) == "MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ"
+
+
+def test_hydrophobicity_uses_full_residue_names(helix_structure):
+    neighbors = find_residue_neighbors(helix_structure, cutoff=8)
+    average, per_residue = calculate_hydrophobicity(neighbors)
+
+    # a first-letter lookup of the residue name would score LYS as leucine
+    expected = kd["M"] + sum(kd[neighbors.residue_codes[j]]
+                             for i, j in neighbors.pairs.tolist() if i == 0)
+    assert per_residue[0] == pytest.approx(expected)
+    assert average == pytest.approx(per_residue.mean())
+
+
+def test_interactions_count_all_chains():
+    pdb_string = build_backbone_pdb("AAAAAAAAAA", chain_id="A").replace("END", "") \
+        + build_backbone_pdb("GGGGGGGGGG", chain_id="B")
+    neighbors = find_residue_neighbors(parse(pdb_string), cutoff=8)
+    short_range, medium_range, long_range, counts = calculate_interactions(neighbors)
+
+    assert len(neighbors.residue_codes) == 20
+    assert counts.shape == (20, 3)
+    # both chains are placed on top of each other, so every residue has long range contacts
+    assert (counts[:, 2] > 0).all()
+    assert short_range == pytest.approx(counts[:, 0].mean())
+    assert (medium_range, long_range) == pytest.approx(tuple(counts[:, 1:].mean(axis=0)))
+
+
+def test_component_per_residue_features():
+    dataframe = pd.DataFrame({
+        "sequence": ["MKTAYIAKQRQISFVKSHFSRQ"],
+        "pdb_string": [build_backbone_pdb("MKTAYIAKQRQISFVKSHFSRQ")],
+        "msa_sequence": ["MKTAYIAKQRQISFVKSHFSRQ"],
+    })
+    result = PDBFeaturesComponent(per_residue_features=True).transform(dataframe)
+
+    assert len(result.at[0, "pdb_residue_hydrophobicity"]) == 22
+    assert len(result.at[0, "pdb_secondary_structure"]) == 22
+    assert result.at[0, "pdb_avg_hydrophobicity"] == \
+        pytest.approx(np.mean(result.at[0, "pdb_residue_hydrophobicity"]), abs=1e-4)
+
+
+def test_component_triggers_the_endpoints_of_a_partition_with_rows(monkeypatch):
+    triggered = []
+    monkeypatch.setattr(endpoint_warmer, "trigger_endpoints", triggered.append)
+    dataframe = pd.DataFrame({
+        "sequence": ["MKTAYIAKQR"],
+        "pdb_string": [build_backbone_pdb("MKTAYIAKQR")],
+        "msa_sequence": ["MKTAYIAKQR"],
+    })
+    component = PDBFeaturesComponent(trigger_endpoints=["unikp"])
+
+    component.transform(dataframe.iloc[:0].copy())
+    assert not triggered
+    component.transform(dataframe)
+    assert triggered == [["unikp"]]
+
+
+def antiparallel_sheet_pdb(length=10):
+    """Two antiparallel strands related by a two-fold axis perpendicular to the sheet."""
+    lines = [line for line in build_backbone_pdb("V" * length, STRAND).splitlines()
+             if line.startswith("ATOM")]
+    coords = np.array([[float(line[30:38]), float(line[38:46]), float(line[46:54])]
+                       for line in lines])
+    c_alpha, carbon, oxygen = coords[1::4], coords[2::4], coords[3::4]
+
+    axis = (c_alpha[-1] - c_alpha[0]) / np.linalg.norm(c_alpha[-1] - c_alpha[0])
+    middle = length // 2
+    carbonyl = oxygen[middle] - carbon[middle]
+    carbonyl -= carbonyl.dot(axis) * axis
+    carbonyl /= np.linalg.norm(carbonyl)
+    normal = np.cross(axis, carbonyl)
+
+    center = c_alpha[middle] + 2.4 * carbonyl
+    rotated = (coords - center) @ (2 * np.outer(normal, normal) - np.eye(3)).T + center
+    partner = [line[:21] + "B" + line[22:30] + "".join(f"{x:8.3f}" for x in coord) + line[54:]
+               for line, coord in zip(lines, rotated)]
+    return "\n".join(lines + partner + ["END"])
+
+
+def test_secondary_structure_of_helix(helix_structure):
+    codes, fractions = calculate_secondary_structure(helix_structure)
+
+    assert len(codes) == 33
+    assert codes[1:-1] == "H" * 31
+    assert fractions["helix"] == pytest.approx(31 / 33)
+    assert fractions["strand"] == 0.0
+
+
+def test_secondary_structure_of_sheet():
+    codes, fractions = calculate_secondary_structure(parse(antiparallel_sheet_pdb()))
+
+    assert "H" not in codes
+    assert codes[2:9] == "EEEEEEE"
+    assert fractions["strand"] == pytest.approx(0.7)
+
+
+def test_secondary_structure_of_single_strand():
+    codes, fractions = calculate_secondary_structure(
+        parse(build_backbone_pdb("A" * 20, STRAND)))
+
+    assert codes == "-" * 20
+    assert fractions["coil"] == 1.0
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from src.main import PDBFeaturesComponent
+from structure_store import StructureStore
+from tests.pdb_utils_test import HELIX, build_backbone_pdb
+
+SEQUENCES = ["MKTAYIAKQRQISFVKSHFSRQLEERLGLIEVQ", "GSHMLEDPVAGKTLLV"]
+
+
+def test_structures_passed_by_reference_are_fetched_from_the_store(tmp_path):
+    pdb_strings = [build_backbone_pdb(sequence, HELIX) for sequence in SEQUENCES]
+    store = StructureStore("local", local_pdb_path=str(tmp_path))
+    references = [store.put(f"CRC-{i}", pdb_string) for i, pdb_string in enumerate(pdb_strings)]
+
+    by_value = pd.DataFrame({"pdb_string": pdb_strings})
+    by_reference = pd.DataFrame({"pdb_string": "",
+                                 "pdb_key": [key for key, _, _ in references],
+                                 "pdb_hash": [pdb_hash for _, _, pdb_hash in references]})
+
+    expected = PDBFeaturesComponent().transform(by_value)
+    result = PDBFeaturesComponent(method="local", local_pdb_path=str(tmp_path)).transform(
+        by_reference)
+
+    features = [column for column in expected.columns if column.startswith("pdb_")
+                and column != "pdb_string"]
+    pd.testing.assert_frame_equal(result[features], expected[features])
+    assert (result["pdb_string"] == "").all()
+
+
+def test_changed_structures_are_detected(tmp_path):
+    store = StructureStore("local", local_pdb_path=str(tmp_path))
+    key, _, _ = store.put("CRC-0", build_backbone_pdb(SEQUENCES[0], HELIX))
+    dataframe = pd.DataFrame({"pdb_string": [""], "pdb_key": [key], "pdb_hash": ["0" * 32]})
+
+    with pytest.raises(ValueError):
+        PDBFeaturesComponent(method="local", local_pdb_path=str(tmp_path)).transform(dataframe)
+    # without a structure store, the reference cannot be resolved
+    with pytest.raises(ValueError):
+        PDBFeaturesComponent().transform(dataframe)
+
+
+class FakeBucket:
+    """A bucket of which every blob lookup is counted, listing it is not allowed."""
+
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.lookups = []
+
+    def get_blob(self, name):
+        self.lookups.append(name)
+        return self.blobs.get(name)
+
+    def list_blobs(self):
+        raise AssertionError("the whole bucket is listed")
+
+
+def test_remote_references_only_look_up_the_checksums_of_the_partition():
+    blob = type("Blob", (), {"name": "CRC-0", "size": 12, "md5_hash": "AAECAw=="})()
+    other = type("Blob", (), {"name": "CRC-2", "size": 5, "md5_hash": None})()
+    store = StructureStore("local")
+    store.method, store.bucket = "remote", FakeBucket({"CRC-0": blob, "CRC-2": other})
+
+    references = store.references(["CRC-0", "CRC-1", "CRC-0", "CRC-2"])
+
+    assert references == {"CRC-0": ("CRC-0", 12, "00010203"), "CRC-2": ("CRC-2", 5, "")}
+    assert sorted(store.bucket.lookups) == ["CRC-0", "CRC-1", "CRC-2"]
@@ -3,17 +3,32 @@ The PeptideFeaturesComponent uses the peptides package to generate new
 features related to the amino acids in a protein sequence. These features
 include physicochemical properties of amino acids (hydrophobicity, aliphaticity, ...)
 and amino acid fractions and mass-to-charge ratio (m/z) of the peptide sequence.
+
+With a feature cache, the features are stored by sequence checksum per descriptor family,
+and only the families that are not in the cache are calculated.
 """
 import logging
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
-import peptides
+from Bio.SeqUtils.CheckSum import crc64
 from fondant.component import PandasTransformComponent
 
+from descriptor_engine import DEFAULT_DESCRIPTORS, PeptideDescriptorEngine
+from encoding import EncodedSequences
+from feature_cache import FeatureCache, arguments_hash, cached_features
+from instrumentation import instrumented
+
 
 logger = logging.getLogger(__name__)
 
+# the version of the calculated features, change it when a feature changes so the feature
+# cache does not return the features of the earlier version
+FEATURES_VERSION = "2"
+
 
+@instrumented
 class PeptideFeaturesComponent(PandasTransformComponent):
     """The PeptideFeaturesComponent uses the peptides package to generate new
     features related to the amino acids in a protein sequence. These features
@@ -21,45 +36,40 @@ class PeptideFeaturesComponent(PandasTransformComponent):
     and amino acid fractions and mass-to-charge ratio (m/z) of the peptide sequence.
     """
 
-    def __init__(self, *_):
+    def __init__(self, descriptors: Optional[List[str]] = None,
+                 feature_cache_path: Optional[str] = None):
         # pylint: disable=super-init-not-called
-        pass
+        self.engine = PeptideDescriptorEngine(descriptors or DEFAULT_DESCRIPTORS)
+        self.cache = None
+        if feature_cache_path:
+            self.cache = FeatureCache(feature_cache_path, "peptide_features", FEATURES_VERSION)
 
     def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """The transform method takes in a dataframe, generates new
         features, and returns the dataframe with the new features added."""
-
-        dataframe = self.calculate_aa_fractions(dataframe)
-        dataframe["mz"] = dataframe["sequence"].apply(
-            lambda sequence: peptides.Peptide(sequence).mz())
-
-        z_scales = [peptides.Peptide(sequence).z_scales() for sequence in dataframe["sequence"]]
-
-        for i in range(5):
-            dataframe[f"z_scale_{i+1}"] = [z[i] for z in z_scales]
-
-        return dataframe
-
-
-    def calculate_aa_fractions(self, dataframe: pd.DataFrame) -> pd.DataFrame:  # pylint: disable=no-self-use
-        """
-        Calculate the fractions of different categories of amino acids in the sequence.
-        """
-
-        aa_categories = {
-            "aliphatic": "AVLIG",
-            "uncharged_polar": "STCNQ",
-            "charged_polar": "STCNQHKR",
-            "hydrophobic": "AILMFWVG",
-            "positively_charged": "HKR",
-            "negatively_charged": "DE",
-            "sulfur_containing": "CM",
-            "amide_containing": "NQ"
-        }
-
-        for category, amino_acids in aa_categories.items():
-            column_name = f"{category}_aa_fraction"
-            dataframe[column_name] = dataframe["sequence"].apply(
-                lambda x: sum(x.count(aa) for aa in amino_acids) / len(x))
-
-        return dataframe
+        sequences = dataframe["sequence"].tolist()
+
+        def compute(families: List[str],
+                    positions: List[int]) -> Dict[str, Dict[str, np.ndarray]]:
+            engine = self.engine if families == self.engine.descriptors else \
+                PeptideDescriptorEngine(families)
+            columns = engine.calculate(
+                EncodedSequences([sequences[position] for position in positions]))
+            return {family: {name: columns[name] for name in engine.family_columns(family)}
+                    for family in families}
+
+        checksums = [crc64(sequence) for sequence in sequences] if self.cache else \
+            [None] * len(sequences)
+        columns = cached_features(self.cache, checksums,
+                                  {family: arguments_hash({})
+                                   for family in self.engine.descriptors}, compute)
+        if self.cache is not None:
+            logger.info("Feature cache: %s", self.cache.stats())
+
+        # default columns that were not selected are declared in the component spec
+        for family in DEFAULT_DESCRIPTORS:
+            if family not in self.engine.descriptors:
+                for name in self.engine.family_columns(family):
+                    columns[name] = np.full(len(dataframe), np.nan)
+
+        return dataframe.assign(**columns)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import peptides
+import pytest
+
+from descriptor_engine import AA_CATEGORIES, DESCRIPTOR_TABLES, PeptideDescriptorEngine
+from encoding import EncodedSequences
+from src.main import PeptideFeaturesComponent
+
+
+@pytest.fixture
+def sequences():
+    rng = np.random.default_rng(0)
+    alphabet = list("ACDEFGHIKLMNPQRSTVWY")
+    random_sequences = ["".join(rng.choice(alphabet, size=length))
+                        for length in rng.integers(5, 300, size=20)]
+    return random_sequences + ["MKXUOBZ", "EGVNDNECEGFFSAR"]
+
+
+def test_engine_matches_peptides(sequences):
+    engine = PeptideDescriptorEngine(["aa_fractions", "mz", *DESCRIPTOR_TABLES])
+    columns = engine.calculate(EncodedSequences(sequences))
+
+    for i, sequence in enumerate(sequences):
+        peptide = peptides.Peptide(sequence)
+        assert columns["mz"][i] == pytest.approx(peptide.mz())
+        for category, amino_acids in AA_CATEGORIES.items():
+            expected = sum(sequence.count(aa) for aa in amino_acids) / len(sequence)
+            assert columns[f"{category}_aa_fraction"][i] == pytest.approx(expected)
+        for family in DESCRIPTOR_TABLES:
+            expected = getattr(peptide, family)()
+            names = engine.family_columns(family)
+            assert [columns[name][i] for name in names] == pytest.approx(list(expected))
+
+
+@pytest.mark.parametrize("sequence", ["mkvlaagivgllla", "MkVlaAgivGLLla", "egvNDNecegffsar"])
+def test_engine_matches_peptides_for_lowercase_residues(sequence):
+    engine = PeptideDescriptorEngine(["mz", *DESCRIPTOR_TABLES])
+    columns = engine.calculate(EncodedSequences([sequence]))
+
+    peptide = peptides.Peptide(sequence)
+    assert columns["mz"][0] == pytest.approx(peptide.mz())
+    for family in DESCRIPTOR_TABLES:
+        names = engine.family_columns(family)
+        assert [columns[name][0] for name in names] == pytest.approx(
+            list(getattr(peptide, family)()))
+
+    # the descriptor tables do not depend on the case of the residues
+    uppercase = engine.calculate(EncodedSequences([sequence.upper()]))
+    for name in engine.column_names()[1:]:
+        assert columns[name] == pytest.approx(uppercase[name])
+
+
+def test_component_default_columns(sequences):
+    dataframe = pd.DataFrame({"sequence": sequences})
+    result = PeptideFeaturesComponent().transform(dataframe)
+
+    assert "z_scale_5" in result.columns
+    assert "vhse_scale_1" not in result.columns
+    assert result["hydrophobic_aa_fraction"].between(0, 1).all()
+
+
+def test_component_opt_in_families(sequences):
+    dataframe = pd.DataFrame({"sequence": sequences})
+    result = PeptideFeaturesComponent(descriptors=["mz", "vhse_scales"]).transform(dataframe)
+
+    assert "vhse_scale_8" in result.columns
+    assert result["z_scale_1"].isna().all()
+    assert result["aliphatic_aa_fraction"].isna().all()
+
+
+def test_unknown_descriptor_family():
+    with pytest.raises(ValueError):
+        PeptideDescriptorEngine(["not_a_descriptor"])
@@ -0,0 +1,235 @@
+"""
+The EndpointWarmer wakes up a scale-to-zero inference endpoint on Hugging Face and waits until
+it answers within a latency SLO, so the first batch of a stage does not pay the cold start.
+
+The stage before the one that calls an endpoint triggers it (`trigger_endpoints`), so the
+endpoint scales up while that stage runs, and the component that calls the endpoint waits
+until it is warm before it sends its first batch. `--trigger` does the same by hand. A short
+rolling history of the warm-ups (cold start, latency, number of probes) is kept per endpoint,
+and the expected cold start of the history sets the poll interval.
+
+Run this file to warm the endpoints configured in the environment (or the `.env` file):
+
+    ESMFOLD_ENDPOINT_URL, UNIKP_ENDPOINT_URL, HF_API_KEY
+    ENDPOINT_LATENCY_SLO (seconds, default 10), ENDPOINT_WARMUP_TIMEOUT (seconds, default 900)
+    ENDPOINT_HISTORY_PATH (a json file, the history is not kept when not set)
+
+This file is the same in the `src` folder of every component that uses it, every image only
+gets its own folder. Change it in `utils/endpoint_warmer.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# the endpoints that this process triggered, a stage triggers every endpoint once
+_triggered = set()
+
+WARMUP_SEQUENCE = "MAGLKPEVPLHDGINKFGKSDFAGQEGPKIVTTTD"
+# the environment variable with the URL and the request that warms it up, per endpoint
+ENDPOINTS = {
+    "esmfold": ("ESMFOLD_ENDPOINT_URL", {"inputs": WARMUP_SEQUENCE}),
+    "unikp": ("UNIKP_ENDPOINT_URL", {"inputs": {"sequence": WARMUP_SEQUENCE,
+                                                "smiles": "CC(=O)O"}}),
+}
+
+
+class EndpointWarmer:
+    """
+    Probes an endpoint with a small request until it answers with a 200 within the latency
+    SLO. The poll interval grows from `min_poll_interval` to `max_poll_interval`, and is at
+    most a quarter of the expected cold start of the history.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, name: str, url: str, api_key: str, payload: Dict[str, Any],
+                 latency_slo: float = 10, timeout: float = 900, request_timeout: float = 60,
+                 min_poll_interval: float = 2, max_poll_interval: float = 30,
+                 history_path: Optional[str] = None, history_size: int = 20):
+        # pylint: disable=too-many-arguments
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.payload = json.dumps(payload).encode()
+        self.latency_slo = latency_slo
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.history_path = history_path
+        self.history_size = history_size
+        self._history = []
+
+    def probe(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send the warm-up request once. The status is 0 when the endpoint did not answer."""
+        request = urllib.request.Request(
+            self.url, data=self.payload, method="POST",
+            headers={"Authorization": f"Bearer {self.api_key}",
+                     "Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.request_timeout) \
+                    as response:  # nosec
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+        except (urllib.error.URLError, OSError):
+            status = 0
+        return {"status": status, "latency": time.perf_counter() - start}
+
+    def trigger(self, daemon: bool = True) -> threading.Thread:
+        """
+        Send one request in a thread to start the scale-up, without waiting for the answer.
+        Returns the thread, join it to wait until the request is sent. A process waits for a
+        thread that is not a daemon before it exits.
+        """
+        def send():
+            probe = self.probe(timeout=5)
+            logger.info("Triggered endpoint %s: status %s", self.name, probe["status"])
+
+        thread = threading.Thread(target=send, name=f"trigger-{self.name}", daemon=daemon)
+        thread.start()
+        return thread
+
+    def wait_until_warm(self) -> bool:
+        """
+        Poll the endpoint until it answers within the latency SLO. Returns False when it is
+        still not warm after the timeout, the first batch then pays the rest of the cold start.
+        """
+        start = time.monotonic()
+        expected = self.expected_cold_start()
+        max_interval = self.max_poll_interval if expected is None else \
+            max(self.min_poll_interval, min(self.max_poll_interval, expected / 4))
+        interval = self.min_poll_interval
+        probes = []
+        while True:
+            probe = self.probe()
+            probes.append(probe)
+            warm = probe["status"] == 200 and probe["latency"] <= self.latency_slo
+            elapsed = time.monotonic() - start
+            if warm or elapsed + interval > self.timeout:
+                break
+
+            logger.info("Endpoint %s is not warm yet (status %s, %.1fs), expected cold start: %s",
+                        self.name, probe["status"], probe["latency"],
+                        f"{expected:.0f}s" if expected is not None else "unknown")
+            time.sleep(interval)
+            interval = min(interval * 1.5, max_interval)
+
+        self.record({"time": time.time(), "warm": warm, "cold_start": elapsed,
+                     "latency": probe["latency"], "probes": len(probes)})
+        if warm:
+            logger.info("Endpoint %s is warm after %.1fs and %s probes, latency %.2fs",
+                        self.name, elapsed, len(probes), probe["latency"])
+        else:
+            logger.warning("Endpoint %s is not warm after %.0fs (status %s, latency %.1fs)",
+                           self.name, elapsed, probe["status"], probe["latency"])
+        return warm
+
+    def history(self) -> List[Dict[str, Any]]:
+        """The last warm-ups of the endpoint, oldest first."""
+        if self.history_path and os.path.exists(self.history_path):
+            with open(self.history_path, "r") as file:
+                return json.load(file).get(self.name, [])
+        return list(self._history)
+
+    def expected_cold_start(self) -> Optional[float]:
+        """The median cold start of the warm-ups that needed more than one probe."""
+        cold_starts = [entry["cold_start"] for entry in self.history()
+                       if entry["warm"] and entry["probes"] > 1]
+        return statistics.median(cold_starts) if cold_starts else None
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Add a warm-up to the history, only the last `history_size` are kept."""
+        self._history = (self.history() + [entry])[-self.history_size:]
+        if not self.history_path:
+            return
+
+        histories = {}
+        if os.path.exists(self.history_path):
+            with open(self.history_path, "r") as file:
+                histories = json.load(file)
+        histories[self.name] = self._history
+        # the file is replaced at once, other pipelines may read it at the same time
+        directory = os.path.dirname(os.path.abspath(self.history_path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            json.dump(histories, file, indent=2)
+        os.replace(file.name, self.history_path)
+
+
+def endpoints_from_env(names: Optional[List[str]] = None) -> List[EndpointWarmer]:
+    """
+    The warmers of the endpoints of which the URL is set in the environment, the `.env` file
+    of the working directory is read when python-dotenv is installed.
+    """
+    try:
+        from dotenv import load_dotenv  # pylint: disable=import-outside-toplevel
+        load_dotenv(".env")
+    except ImportError:
+        pass
+
+    warmers = []
+    for name, (url_variable, payload) in ENDPOINTS.items():
+        url = os.getenv(url_variable)
+        if (names and name not in names) or not url:
+            continue
+        warmers.append(EndpointWarmer(
+            name, url, os.getenv("HF_API_KEY", ""), payload,
+            latency_slo=float(os.getenv("ENDPOINT_LATENCY_SLO", "10")),
+            timeout=float(os.getenv("ENDPOINT_WARMUP_TIMEOUT", "900")),
+            history_path=os.getenv("ENDPOINT_HISTORY_PATH")))
+    return warmers
+
+
+def trigger_endpoints(names: Optional[List[str]] = None) -> List[threading.Thread]:
+    """
+    Start the scale-up of the endpoints configured in the environment that this process did
+    not trigger before, without waiting for the answers. The process still sends the requests
+    before it exits. Returns the threads that send them.
+    """
+    warmers = [warmer for warmer in endpoints_from_env(names) if warmer.name not in _triggered]
+    _triggered.update(warmer.name for warmer in warmers)
+    return [warmer.trigger(daemon=False) for warmer in warmers]
+
+
+def main():
+    """Warm up, or only trigger, the endpoints of the arguments."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(description="Warm up the endpoints of the pipeline.")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS),
+                        help="The endpoints to warm up (default: all configured endpoints)")
+    parser.add_argument("--trigger", action="store_true",
+                        help="Only start the scale-up, do not wait until they are warm")
+    args = parser.parse_args()
+
+    warmers = endpoints_from_env(args.endpoints)
+    if not warmers:
+        raise SystemExit("No endpoint URL is set, see the docstring of this file.")
+    if args.trigger:
+        # the requests are sent at the same time, the process waits until they are sent
+        for thread in [warmer.trigger() for warmer in warmers]:
+            thread.join()
+        return
+
+    for warmer in warmers:
+        if not warmer.wait_until_warm():
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,17 @@ The component returns the dataframe with the predicted tertiary structures.
 """
 import logging
 import os
+from typing import Optional
 
 import pandas as pd
 import requests
 from dotenv import load_dotenv
 from fondant.component import PandasTransformComponent
 
+from endpoint_warmer import ENDPOINTS, EndpointWarmer
+from instrumentation import instrumented, span
+from replay_transport import ReplayTransport
+
 # Load the environment variables
 load_dotenv()
 
@@ -19,6 +24,7 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+@instrumented
 class PredictProtein3DStructureComponent(PandasTransformComponent):
     """
     The PredictProtein3DStructureComponent is a component that takes
@@ -27,19 +33,40 @@ class PredictProtein3DStructureComponent(PandasTransformComponent):
     The component returns the dataframe with the predicted tertiary structures.
     """
 
-    def __init__(self):
+    def __init__(self, warmup_timeout: float = 900, warmup_latency_slo: float = 10,
+                 warmup_history_path: Optional[str] = None, transport_mode: str = "live",
+                 transport_store_path: Optional[str] = None,
+                 replay_latency: Optional[float] = None):
         # pylint: disable=super-init-not-called
+        # pylint: disable=too-many-arguments
         self.hf_api_key = os.getenv("HF_API_KEY")
-        self.hf_endpoint_url = os.getenv("HF_ENDPOINT_URL")
+        self.hf_endpoint_url = os.getenv(ENDPOINTS["esmfold"][0])
+        # the responses of the endpoint can be recorded, and replayed offline
+        self.transport = ReplayTransport(transport_mode, transport_store_path, "esmfold",
+                                         replay_latency)
 
-        if not self.hf_api_key or not self.hf_endpoint_url:
+        if (not self.hf_api_key or not self.hf_endpoint_url) and transport_mode != "replay":
             raise Exception("environment variables not set.")
 
+        # the endpoint scales to zero, it is only woken up when a partition has rows to predict
+        self.warmer = None
+        if warmup_timeout > 0 and transport_mode != "replay":
+            self.warmer = EndpointWarmer(
+                "esmfold", self.hf_endpoint_url, self.hf_api_key, ENDPOINTS["esmfold"][1],
+                latency_slo=warmup_latency_slo, timeout=warmup_timeout,
+                history_path=warmup_history_path)
+
     def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """Perform the transformation on the dataframe."""
 
-        # Ge the indices to predict
-        indices_to_predict = dataframe[dataframe["pdb_string"] == ""].index
+        # Get the indices to predict, the structures passed by reference are in the store
+        indices_to_predict = dataframe[(dataframe["pdb_string"] == "") &
+                                       (dataframe["pdb_key"].fillna("") == "")].index
+
+        # the first batch is only sent once the endpoint is warm
+        if len(indices_to_predict) and self.warmer is not None:
+            self.warmer.wait_until_warm()
+            self.warmer = None
 
         # Predict the tertiary structures
         dataframe.loc[indices_to_predict, "pdb_string"] = \
@@ -50,8 +77,16 @@ class PredictProtein3DStructureComponent(PandasTransformComponent):
 
     def predict_tertiary_structure(self, sequence: str) -> str:
         """Predict the tertiary structure of the protein sequence using
-        HuggingFace ESMFold Endpoint.
+        HuggingFace ESMFold Endpoint, or replay the recorded structure.
         """
+        data = {
+            "inputs": sequence
+        }
+        with span("esmfold_request"):
+            return self.transport.call(data, lambda: self.send_request(data))
+
+    def send_request(self, data: dict) -> str:
+        """Send the request to the HuggingFace ESMFold Endpoint."""
 
         # Set the headers
         headers = {
@@ -59,11 +94,6 @@ class PredictProtein3DStructureComponent(PandasTransformComponent):
             "Content-Type": "application/json"
         }
 
-        # Set the data
-        data = {
-            "inputs": sequence
-        }
-
         # Send the request
         response = requests.post(self.hf_endpoint_url,
                                 headers=headers, json=data)
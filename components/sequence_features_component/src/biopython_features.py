@@ -0,0 +1,217 @@
+"""
+The features of the Biopython component, derived from the shared encoding of a partition.
+
+Most of the `ProteinAnalysis` features are sums over the residues or the dipeptides of a
+sequence, so they follow from one count matrix with a matrix product. The flexibility is
+a weighted window over the residues and the isoelectric point is a bisection, both are
+calculated for all sequences at once. Sequences that `ProteinAnalysis` handles differently
+(non-standard residues, sequences that are too short for a flexibility window) are still
+passed to `ProteinAnalysis` one by one.
+"""
+from typing import Dict, List
+
+import numpy as np
+from Bio.Data import IUPACData
+from Bio.SeqUtils import IsoelectricPoint, ProtParamData
+from Bio.SeqUtils.ProtParam import ProteinAnalysis
+
+from encoding import STANDARD_AMINO_ACIDS, EncodedSequences, lookup_table
+
+# code of the residues that are not one of the 20 standard amino acids
+OTHER = len(STANDARD_AMINO_ACIDS)
+N_CODES = OTHER + 1
+
+# used by Bio.SeqUtils.molecular_weight for the average masses
+WATER_MASS = 18.0153
+
+# the flexibility window of ProteinAnalysis.flexibility(), it skips the central residue
+# and counts the residue after it twice
+FLEXIBILITY_WINDOW = np.array([0.25, 0.4375, 0.625, 0.8125, 0.0,
+                               1.8125, 0.625, 0.4375, 0.25]) / 5.25
+
+PH_VALUES = {"charge_at_ph3": 3.0, "charge_at_ph5": 5.0, "charge_at_ph7": 7.0,
+             "charge_at_ph9": 9.0}
+POSITIVE_RESIDUES = [aa for aa in IsoelectricPoint.positive_pKs if aa != "Nterm"]
+NEGATIVE_RESIDUES = [aa for aa in IsoelectricPoint.negative_pKs if aa != "Cterm"]
+
+
+def _residue_vector(values: Dict[str, float]) -> np.ndarray:
+    return np.array([values.get(aa, 0.0) for aa in STANDARD_AMINO_ACIDS] + [0.0])
+
+
+def _membership(feature) -> np.ndarray:
+    """
+    The value of a per-residue fraction for a sequence of one residue, so the residue
+    sets are the ones of the installed Biopython version.
+    """
+    return np.array([feature(ProteinAnalysis(aa)) for aa in STANDARD_AMINO_ACIDS] +
+                    [np.zeros_like(feature(ProteinAnalysis("A")))])
+
+
+def protein_analysis_features(sequence: str) -> Dict[str, float]:
+    """The features of one sequence, calculated with ProteinAnalysis like the Biopython
+    component does."""
+    analysis = ProteinAnalysis(sequence)
+    flexibility = analysis.flexibility()
+    helix, turn, sheet = analysis.secondary_structure_fraction()
+    extinction_coefficient = analysis.molar_extinction_coefficient()
+    return {
+        "sequence_length": analysis.length,
+        "molecular_weight": analysis.molecular_weight(),
+        "aromaticity": analysis.aromaticity(),
+        "isoelectric_point": analysis.isoelectric_point(),
+        "instability_index": analysis.instability_index(),
+        "flexibility_max": max(flexibility),
+        "flexibility_min": min(flexibility),
+        "flexibility_mean": sum(flexibility) / len(flexibility),
+        "gravy": analysis.gravy(),
+        "helix": helix,
+        "turn": turn,
+        "sheet": sheet,
+        "molar_extinction_coefficient_oxidized": extinction_coefficient[0],
+        "molar_extinction_coefficient_reduced": extinction_coefficient[1],
+        **{name: analysis.charge_at_pH(ph) for name, ph in PH_VALUES.items()},
+    }
+
+
+class BiopythonFeatures:
+    """
+    Calculates the features of the Biopython component for a whole partition at once.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self):
+        # ProteinAnalysis works on the uppercase sequence
+        self.table = lookup_table(STANDARD_AMINO_ACIDS, OTHER, uppercase=True)
+
+        self.weights = _residue_vector(IUPACData.protein_weights)
+        self.hydropathy = _residue_vector(ProtParamData.kd)
+        self.flexibility = _residue_vector(ProtParamData.Flex)
+        self.aromatic = _membership(lambda analysis: analysis.aromaticity())
+        self.secondary_structure = _membership(
+            lambda analysis: np.array(analysis.secondary_structure_fraction()))
+
+        self.dipeptide_index = np.zeros((N_CODES, N_CODES))
+        for i, first in enumerate(STANDARD_AMINO_ACIDS):
+            for j, second in enumerate(STANDARD_AMINO_ACIDS):
+                self.dipeptide_index[i, j] = ProtParamData.DIWV[first][second]
+        self.dipeptide_index = self.dipeptide_index.reshape(-1)
+
+        self.nterm_pks = _residue_vector(IsoelectricPoint.pKnterminal)
+        self.nterm_pks[self.nterm_pks == 0] = IsoelectricPoint.positive_pKs["Nterm"]
+        self.cterm_pks = _residue_vector(IsoelectricPoint.pKcterminal)
+        self.cterm_pks[self.cterm_pks == 0] = IsoelectricPoint.negative_pKs["Cterm"]
+
+    @staticmethod
+    def supported(encoded: EncodedSequences, counts: np.ndarray) -> np.ndarray:
+        """The sequences whose features are calculated from the encoding."""
+        return encoded.ascii & (counts[:, OTHER] == 0) & \
+            (encoded.lengths > len(FLEXIBILITY_WINDOW))
+
+    def calculate(self, encoded: EncodedSequences, sequences: List[str]) -> Dict[str, np.ndarray]:
+        """Calculate the features of all sequences."""
+        # pylint: disable=too-many-locals
+        codes = encoded.codes(self.table)
+        counts = encoded.counts(self.table, N_CODES, codes)
+        lengths = encoded.lengths.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fractions = counts / lengths[:, None]
+            secondary_structure = fractions @ self.secondary_structure
+            flexibility_max, flexibility_min, flexibility_mean = self._flexibility(
+                encoded, codes)
+
+            columns = {
+                "sequence_length": encoded.lengths.copy(),
+                "molecular_weight": counts @ self.weights - (lengths - 1) * WATER_MASS,
+                "aromaticity": fractions @ self.aromatic,
+                "isoelectric_point": self._isoelectric_point(encoded, codes, counts),
+                "instability_index": encoded.pair_counts(self.table, N_CODES) @
+                self.dipeptide_index * 10.0 / lengths,
+                "flexibility_max": flexibility_max,
+                "flexibility_min": flexibility_min,
+                "flexibility_mean": flexibility_mean,
+                "gravy": counts @ self.hydropathy / lengths,
+                "helix": secondary_structure[:, 0],
+                "turn": secondary_structure[:, 1],
+                "sheet": secondary_structure[:, 2],
+            }
+
+        tryptophan, tyrosine, cysteine = (counts[:, STANDARD_AMINO_ACIDS.index(aa)]
+                                          for aa in "WYC")
+        # the same columns as the Biopython component: the coefficient without and with cystines
+        extinction_coefficient = tryptophan * 5500 + tyrosine * 1490
+        columns["molar_extinction_coefficient_oxidized"] = extinction_coefficient
+        columns["molar_extinction_coefficient_reduced"] = \
+            extinction_coefficient + (cysteine // 2) * 125
+
+        nterm_pks, cterm_pks = self._terminal_pks(encoded, codes)
+        for name, ph in PH_VALUES.items():
+            columns[name] = self._charge(np.full(encoded.size, ph), counts, nterm_pks, cterm_pks)
+
+        for row in np.flatnonzero(~self.supported(encoded, counts)):
+            for name, value in protein_analysis_features(sequences[row]).items():
+                columns[name][row] = value
+        return columns
+
+    def _flexibility(self, encoded: EncodedSequences, codes: np.ndarray):
+        """The maximum, minimum and mean flexibility of the windows of every sequence."""
+        window = len(FLEXIBILITY_WINDOW)
+        maximum, minimum, mean = (np.full(encoded.size, np.nan) for _ in range(3))
+        if len(codes) < window:
+            return maximum, minimum, mean
+
+        scores = np.correlate(self.flexibility[codes], FLEXIBILITY_WINDOW, mode="valid")
+        # ProteinAnalysis skips the last window of every sequence
+        n_windows = np.clip(encoded.lengths - window, 0, None)
+        position = np.arange(len(scores)) - encoded.starts[encoded.rows[:len(scores)]]
+        scores = scores[position < n_windows[encoded.rows[:len(scores)]]]
+
+        has_windows = n_windows > 0
+        offsets = np.concatenate([[0], np.cumsum(n_windows[has_windows])[:-1]])
+        if len(scores):
+            maximum[has_windows] = np.maximum.reduceat(scores, offsets)
+            minimum[has_windows] = np.minimum.reduceat(scores, offsets)
+            mean[has_windows] = np.add.reduceat(scores, offsets) / n_windows[has_windows]
+        return maximum, minimum, mean
+
+    def _terminal_pks(self, encoded: EncodedSequences, codes: np.ndarray):
+        """The pK of the N- and C-terminus of every sequence, they depend on the residue."""
+        nterm_pks = np.full(encoded.size, IsoelectricPoint.positive_pKs["Nterm"])
+        cterm_pks = np.full(encoded.size, IsoelectricPoint.negative_pKs["Cterm"])
+        not_empty = encoded.lengths > 0
+        nterm_pks[not_empty] = self.nterm_pks[codes[encoded.starts[not_empty]]]
+        cterm_pks[not_empty] = self.cterm_pks[
+            codes[encoded.starts[not_empty] + encoded.lengths[not_empty] - 1]]
+        return nterm_pks, cterm_pks
+
+    @staticmethod
+    def _charge(ph: np.ndarray, counts: np.ndarray, nterm_pks: np.ndarray,
+                cterm_pks: np.ndarray) -> np.ndarray:
+        """The charge of every sequence at its pH, in the order of IsoelectricPoint."""
+        positive = 1.0 / (10 ** (ph - nterm_pks) + 1.0)
+        for aa in POSITIVE_RESIDUES:
+            positive = positive + counts[:, STANDARD_AMINO_ACIDS.index(aa)] / \
+                (10 ** (ph - IsoelectricPoint.positive_pKs[aa]) + 1.0)
+
+        negative = 1.0 / (10 ** (cterm_pks - ph) + 1.0)
+        for aa in NEGATIVE_RESIDUES:
+            negative = negative + counts[:, STANDARD_AMINO_ACIDS.index(aa)] / \
+                (10 ** (IsoelectricPoint.negative_pKs[aa] - ph) + 1.0)
+        return positive - negative
+
+    def _isoelectric_point(self, encoded: EncodedSequences, codes: np.ndarray,
+                           counts: np.ndarray) -> np.ndarray:
+        """The bisection of IsoelectricPoint.pi(), for all sequences at once."""
+        nterm_pks, cterm_pks = self._terminal_pks(encoded, codes)
+        ph = np.full(encoded.size, 7.775)
+        low, high = np.full(encoded.size, 4.05), np.full(encoded.size, 12.0)
+
+        active = np.flatnonzero(high - low > 0.0001)
+        while len(active):
+            positive = self._charge(ph[active], counts[active], nterm_pks[active],
+                                    cterm_pks[active]) > 0.0
+            low[active] = np.where(positive, ph[active], low[active])
+            high[active] = np.where(positive, high[active], ph[active])
+            ph[active] = (low[active] + high[active]) / 2
+            active = active[high[active] - low[active] > 0.0001]
+        return ph
@@ -0,0 +1,132 @@
+"""
+The PeptideDescriptorEngine calculates the peptides descriptors for a whole partition at once.
+The residues are counted from the shared encoding of the partition (`encoding.py`), after
+which all descriptors are derived from one amino acid count matrix with matrix products.
+
+This file is the same in the `src` folder of every component that uses it, every image only
+gets its own folder. Change it in `utils/descriptor_engine.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+import re
+from typing import Dict, List
+
+import numpy as np
+import peptides
+
+from encoding import EncodedSequences, lookup_table
+
+# same order as the encoding used by the peptides package, unknown residues map to "X"
+ALPHABET = "ARNDCQEGHILKMFPSTWYVOUBZJX"
+# peptides works on the uppercase sequence, but only blocks the uppercase cysteines in the
+# m/z, so a lowercase cysteine gets a code of its own
+CODES = ALPHABET + "c"
+
+AA_CATEGORIES = {
+    "aliphatic": "AVLIG",
+    "uncharged_polar": "STCNQ",
+    "charged_polar": "STCNQHKR",
+    "hydrophobic": "AILMFWVG",
+    "positively_charged": "HKR",
+    "negatively_charged": "DE",
+    "sulfur_containing": "CM",
+    "amide_containing": "NQ"
+}
+
+# descriptor family -> (column prefix, peptides table), averaged over the residues
+DESCRIPTOR_TABLES = {
+    "z_scales": ("z_scale", peptides.tables.Z_SCALES),
+    "vhse_scales": ("vhse_scale", peptides.tables.VHSE),
+    "blosum_indices": ("blosum_index", peptides.tables.BLOSUM),
+    "t_scales": ("t_scale", peptides.tables.T_SCALES),
+    "st_scales": ("st_scale", peptides.tables.ST_SCALES),
+    "kidera_factors": ("kidera_factor", peptides.tables.KIDERA),
+    "fasgai_vectors": ("fasgai_vector", peptides.tables.FASGAI),
+    "protfp_descriptors": ("protfp_descriptor", peptides.tables.PROTFP),
+}
+
+DESCRIPTOR_FAMILIES = ["aa_fractions", "mz", *DESCRIPTOR_TABLES]
+DEFAULT_DESCRIPTORS = ["aa_fractions", "mz", "z_scales"]
+
+# constants used by peptides.Peptide.mz() with its default arguments
+MZ_CHARGE = 2
+PROTON_MASS = 1.007276
+BLOCKED_CYSTEIN_MASS = 57.021464
+
+
+def _sorted_table_keys(table: Dict[str, Dict[str, float]]) -> List[str]:
+    """Sort the keys of a peptides table on their number (Z1, Z2, ..., Z10)."""
+    return sorted(table, key=lambda key: int(re.search(r"\d+$", key).group()))
+
+
+class PeptideDescriptorEngine:
+    """
+    The PeptideDescriptorEngine calculates the peptides descriptors for a whole partition at once.
+    All descriptors are derived from one amino acid count matrix with matrix products.
+    """
+
+    def __init__(self, descriptors: List[str]):
+        unknown = set(descriptors) - set(DESCRIPTOR_FAMILIES)
+        if unknown:
+            raise ValueError(
+                f"Unknown descriptors {sorted(unknown)}. Choose from {DESCRIPTOR_FAMILIES}.")
+        self.descriptors = [family for family in DESCRIPTOR_FAMILIES if family in descriptors]
+
+        # byte value -> integer code of the residue, lowercase residues are the same residue
+        self.table = lookup_table(ALPHABET, CODES.index("X"), uppercase=True)
+        self.table[ord("c")] = CODES.index("c")
+        residues = CODES.upper()
+
+        # membership of every residue in every category
+        self.category_matrix = np.array(
+            [[aa in amino_acids for amino_acids in AA_CATEGORIES.values()] for aa in residues],
+            dtype=np.float64)
+
+        # value of every residue for every component of a descriptor table
+        self.table_matrices = {}
+        for family, (_, table) in DESCRIPTOR_TABLES.items():
+            self.table_matrices[family] = np.array(
+                [[table[key].get(aa, 0.0) for key in _sorted_table_keys(table)]
+                 for aa in residues], dtype=np.float64)
+
+        masses = peptides.tables.MOLECULAR_WEIGHT["monoisotopic"]
+        self.water_mass = masses["H2O"]
+        self.residue_masses = np.array([masses.get(aa, 0.0) for aa in residues])
+        self.residue_masses[CODES.index("C")] += BLOCKED_CYSTEIN_MASS
+
+    def column_names(self) -> List[str]:
+        """The names of the columns produced for the selected descriptor families."""
+        return [name for family in self.descriptors for name in self.family_columns(family)]
+
+    @staticmethod
+    def family_columns(family: str) -> List[str]:
+        """The names of the columns produced by a descriptor family."""
+        if family == "aa_fractions":
+            return [f"{category}_aa_fraction" for category in AA_CATEGORIES]
+        if family == "mz":
+            return ["mz"]
+
+        prefix, table = DESCRIPTOR_TABLES[family]
+        return [f"{prefix}_{i + 1}" for i in range(len(table))]
+
+    def calculate(self, encoded: EncodedSequences) -> Dict[str, np.ndarray]:
+        """Calculate the selected descriptor families for all sequences."""
+        counts = encoded.counts(self.table, len(CODES)).astype(np.float64)
+        lengths = counts.sum(axis=1, keepdims=True)
+        # empty sequences get NaN instead of a division by zero
+        inverse_lengths = np.divide(1.0, lengths, out=np.full_like(lengths, np.nan),
+                                    where=lengths > 0)
+
+        columns = {}
+        for family in self.descriptors:
+            if family == "aa_fractions":
+                values = counts @ self.category_matrix * inverse_lengths
+            elif family == "mz":
+                mass = counts @ self.residue_masses + self.water_mass
+                values = ((mass + MZ_CHARGE * PROTON_MASS) / MZ_CHARGE)[:, None]
+            else:
+                values = counts @ self.table_matrices[family] * inverse_lengths
+
+            for i, name in enumerate(self.family_columns(family)):
+                columns[name] = values[:, i]
+
+        return columns
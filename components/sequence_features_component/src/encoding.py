@@ -0,0 +1,125 @@
+"""
+The shared encoding of a partition of sequences. All sequences are concatenated into one byte
+buffer a single time, the feature families map the bytes to their own integer codes with a
+lookup table and count them per sequence with one `np.bincount`.
+
+This file is the same in the `src` folder of every component that uses it, every image only
+gets its own folder. Change it in `utils/encoding.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+STANDARD_AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def lookup_table(alphabet: str, default: int, uppercase: bool = False) -> np.ndarray:
+    """
+    A table that maps a byte to the position of the character in the alphabet,
+    bytes that are not in the alphabet map to `default`.
+    """
+    table = np.full(256, default, dtype=np.int64)
+    for code, character in enumerate(alphabet):
+        table[ord(character)] = code
+        if uppercase:
+            table[ord(character.lower())] = code
+    return table
+
+
+class EncodedSequences:
+    """
+    The sequences of a partition concatenated into one byte buffer, with the start and the
+    length of every sequence.
+    """
+
+    def __init__(self, sequences: List[str]):
+        self.size = len(sequences)
+        self.lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=self.size)
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        # non-ascii characters are replaced by a single byte, so the lengths still match
+        self.buffer = np.frombuffer("".join(sequences).encode("ascii", errors="replace"),
+                                    dtype=np.uint8)
+        self.rows = np.repeat(np.arange(self.size), self.lengths)
+        self.ascii = np.fromiter((sequence.isascii() for sequence in sequences),
+                                 dtype=bool, count=self.size)
+
+    def codes(self, table: np.ndarray) -> np.ndarray:
+        """The integer codes of all residues, given the lookup table of a feature family."""
+        return table[self.buffer]
+
+    def counts(self, table: np.ndarray, n_codes: int,
+               codes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Count the codes of every sequence. Returns a matrix of shape (size, n_codes)."""
+        codes = self.codes(table) if codes is None else codes
+        counts = np.bincount(self.rows * n_codes + codes, minlength=self.size * n_codes)
+        return counts.reshape(self.size, n_codes)
+
+    def pair_counts(self, table: np.ndarray, n_codes: int,
+                    drop: Optional[int] = None) -> np.ndarray:
+        """
+        Count the pairs of consecutive codes (dipeptides) of every sequence, after removing
+        the residues with code `drop`. Returns a matrix of shape (size, n_codes * n_codes),
+        the pair (a, b) has index a * n_codes + b.
+        """
+        codes, rows = self.codes(table), self.rows
+        if drop is not None:
+            keep = codes != drop
+            codes, rows = codes[keep], rows[keep]
+
+        # a pair never spans two sequences
+        same_sequence = rows[:-1] == rows[1:]
+        pairs = codes[:-1][same_sequence] * n_codes + codes[1:][same_sequence]
+        n_pairs = n_codes * n_codes
+        counts = np.bincount(rows[:-1][same_sequence] * n_pairs + pairs,
+                             minlength=self.size * n_pairs)
+        return counts.reshape(self.size, n_pairs)
+
+
+def _crc64_table() -> np.ndarray:
+    """The table of the high 32 bits, the same as `Bio.SeqUtils.CheckSum`."""
+    table = []
+    for i in range(256):
+        part_l, part_h = i, 0
+        for _ in range(8):
+            rflag = part_l & 1
+            part_l >>= 1
+            if part_h & 1:
+                part_l |= 1 << 31
+            part_h >>= 1
+            if rflag:
+                part_h ^= 0xD8000000
+        table.append(part_h)
+    return np.array(table, dtype=np.uint64)
+
+
+CRC64_TABLE = _crc64_table()
+
+
+def crc64(encoded: EncodedSequences) -> List[str]:
+    """
+    The CRC64 checksum of every sequence, identical to `Bio.SeqUtils.CheckSum.crc64`.
+    All sequences are processed together, one residue position at a time. Only ascii
+    sequences are supported, the checksum of other sequences is None.
+    """
+    # longest first, so the sequences still running at a position are a prefix
+    order = np.argsort(-encoded.lengths, kind="stable")
+    lengths, starts = encoded.lengths[order], encoded.starts[order]
+    crcl = np.zeros(encoded.size, dtype=np.uint64)
+    crch = np.zeros(encoded.size, dtype=np.uint64)
+    buffer = encoded.buffer.astype(np.uint64)
+
+    # the number of sequences longer than every position
+    running = np.searchsorted(-lengths, -np.arange(lengths[0] if encoded.size else 0),
+                              side="left")
+    for position, n_running in enumerate(running):
+        low, high = crcl[:n_running], crch[:n_running]
+        index = (low ^ buffer[starts[:n_running] + position]) & np.uint64(0xFF)
+        crcl[:n_running] = (low >> np.uint64(8)) | ((high & np.uint64(0xFF)) << np.uint64(24))
+        crch[:n_running] = (high >> np.uint64(8)) ^ CRC64_TABLE[index]
+
+    checksums = [None] * encoded.size
+    for row, high, low in zip(order.tolist(), crch.tolist(), crcl.tolist()):
+        if encoded.ascii[row]:
+            checksums[row] = f"CRC-{high:08X}{low:08X}"
+    return checksums
@@ -0,0 +1,219 @@
+"""
+The FeatureCache stores the features that only depend on the sequence in a local SQLite
+database, so a run only calculates the features of the sequences it has not seen before.
+
+The features are stored per column group (e.g. one iFeatureOmega descriptor), keyed by
+sequence checksum, component, component version, column group and the hash of the
+arguments of the group. Adding a descriptor to a component only calculates the new
+descriptor, and a new version of a component never returns the features of an older one.
+
+This file is the same in the `src` folder of every component that uses it, every image only
+gets its own folder. Change it in `utils/feature_cache.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of parameters in one statement
+LOOKUP_CHUNK_SIZE = 500
+
+# the features of the missing groups at the given rows: group -> column -> values
+ComputeFunction = Callable[[List[str], List[int]], Dict[str, Dict[str, Sequence[Any]]]]
+
+
+def arguments_hash(arguments: Any) -> str:
+    """The hash of the arguments of a column group, independent of the order of their keys."""
+    body = json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()[:16]
+
+
+def _json_value(value: Any) -> Any:
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} can not be stored in the feature cache")
+
+
+class FeatureCache:
+    """
+    The FeatureCache stores the features of one component version in a local SQLite
+    database, one entry per sequence checksum and column group with the values of the
+    columns of the group. The number of hits and misses of (checksum, group) pairs is
+    counted over the lifetime of the cache.
+    """
+
+    def __init__(self, path: str, component: str, version: str):
+        self.path = path
+        self.component = component
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        with self._connection:
+            # WAL lets the workers of other processes read while one of them writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            # the names of the columns are stored once per group, the features only hold
+            # the values in the same order
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS column_groups (
+                    component TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    column_group TEXT NOT NULL,
+                    arguments_hash TEXT NOT NULL,
+                    columns TEXT NOT NULL,
+                    PRIMARY KEY (component, version, column_group, arguments_hash)
+                ) WITHOUT ROWID""")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS features (
+                    component TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    column_group TEXT NOT NULL,
+                    arguments_hash TEXT NOT NULL,
+                    sequence_checksum TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (component, version, column_group, arguments_hash,
+                                 sequence_checksum)
+                ) WITHOUT ROWID""")
+
+    def columns(self, group: str, group_hash: str) -> Optional[List[str]]:
+        """The names of the columns of a column group, None when it was never stored."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT columns FROM column_groups WHERE component = ? AND version = ? "
+                "AND column_group = ? AND arguments_hash = ?",
+                [self.component, self.version, group, group_hash]).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, group: str, group_hash: str,
+                 checksums: Iterable[str]) -> Dict[str, List[Any]]:
+        """
+        Look up the features of a column group for many sequence checksums at once. Returns
+        the values of the checksums that are in the cache, the others count as misses.
+        """
+        checksums = sorted(set(checksums))
+        rows = []
+        with self._lock:
+            for i in range(0, len(checksums), LOOKUP_CHUNK_SIZE):
+                chunk = checksums[i:i + LOOKUP_CHUNK_SIZE]
+                rows += self._connection.execute(
+                    "SELECT sequence_checksum, features FROM features WHERE component = ? "
+                    "AND version = ? AND column_group = ? AND arguments_hash = ? "  # nosec
+                    f"AND sequence_checksum IN ({','.join('?' * len(chunk))})",
+                    [self.component, self.version, group, group_hash, *chunk]).fetchall()
+
+            self.hits += len(rows)
+            self.misses += len(checksums) - len(rows)
+        if not rows:
+            return {}
+        found, features = zip(*rows)
+        # one json document for all rows is decoded much faster than a document per row
+        return dict(zip(found, json.loads(f"[{','.join(features)}]")))
+
+    def put_many(self, group: str, group_hash: str, columns: List[str],
+                 features: Dict[str, List[Any]]) -> None:
+        """Store the values of the columns of a column group, by sequence checksum."""
+        now = time.time()
+        rows = [(self.component, self.version, group, group_hash, checksum,
+                 json.dumps(values, default=_json_value), now)
+                for checksum, values in features.items()]
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO column_groups VALUES (?, ?, ?, ?, ?)",
+                [self.component, self.version, group, group_hash, json.dumps(columns)])
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def invalidate(self, versions: Optional[List[str]] = None) -> int:
+        """
+        Remove the entries of the given versions of the component, or of every version other
+        than the current one. Returns the number of removed entries.
+        """
+        condition = "component = ? AND version != ?" if versions is None else \
+            "component = ? AND version = ?"
+        parameters = [[self.component, self.version]] if versions is None else \
+            [[self.component, version] for version in versions]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"DELETE FROM column_groups WHERE {condition}", parameters)  # nosec
+            cursor = self._connection.executemany(
+                f"DELETE FROM features WHERE {condition}", parameters)  # nosec
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, float]:
+        """The number of hits and misses and the hit rate."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
+
+
+def cached_features(cache: Optional[FeatureCache], checksums: Sequence[str],
+                    groups: Dict[str, str], compute: ComputeFunction) -> Dict[str, Sequence[Any]]:
+    """
+    The columns of the column groups (group -> arguments hash) for every row. The groups of
+    all rows are looked up in the cache, and every group is only calculated for the first row
+    of the sequences that miss it. `compute(groups, row positions)` is called once per set of
+    missing rows, for all groups that miss the same rows. Without a cache, all groups are
+    calculated for all rows.
+    """
+    # pylint: disable=too-many-locals
+    if cache is None or not checksums:
+        computed = compute(list(groups), list(range(len(checksums))))
+        return {column: values for group in groups
+                for column, values in computed[group].items()}
+
+    first_position: Dict[str, int] = {}
+    for position, checksum in enumerate(checksums):
+        first_position.setdefault(checksum, position)
+
+    found = {group: cache.get_many(group, group_hash, first_position)
+             for group, group_hash in groups.items()}
+    names = {group: cache.columns(group, group_hash) for group, group_hash in groups.items()}
+
+    for positions, missing_groups in _missing_rows(first_position, found).items():
+        computed = compute(missing_groups, list(positions))
+        for group in missing_groups:
+            names[group] = list(computed[group])
+            rows = zip(*[_json_list(values) for values in computed[group].values()])
+            new = {checksums[position]: list(row) for position, row in zip(positions, rows)}
+            cache.put_many(group, groups[group], names[group], new)
+            found[group].update(new)
+
+    result = {}
+    for group in groups:
+        values = zip(*[found[group][checksum] for checksum in checksums])
+        result.update(zip(names[group], values))
+    return result
+
+
+def _missing_rows(first_position: Dict[str, int],
+                  found: Dict[str, Dict[str, List[Any]]]) -> Dict[Tuple[int, ...], List[str]]:
+    """
+    The groups per set of rows that miss them, e.g. a new sequence misses all groups and an
+    added group misses all rows.
+    """
+    missing_rows: Dict[Tuple[int, ...], List[str]] = {}
+    for group, features in found.items():
+        positions = tuple(position for checksum, position in first_position.items()
+                          if checksum not in features)
+        if positions:
+            missing_rows.setdefault(positions, []).append(group)
+    return missing_rows
+
+
+def _json_list(values: Sequence[Any]) -> List[Any]:
+    # numpy arrays become lists of python values at once
+    return values.tolist() if hasattr(values, "tolist") else list(values)
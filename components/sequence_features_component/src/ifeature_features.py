@@ -0,0 +1,141 @@
+"""
+The AAC, CTDC and CTDT descriptors of iFeatureOmega, derived from the shared encoding of a
+partition. The column names and the values are the ones of the iFeatureOmega component.
+
+iFeatureOmega removes the residues that are not one of the 20 standard amino acids before
+it calculates a descriptor, so these residues are dropped here as well. The other descriptors
+are calculated with iFeatureOmega itself, one sequence at a time like the iFeatureOmega
+component.
+"""
+import os
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+from encoding import STANDARD_AMINO_ACIDS, EncodedSequences, lookup_table
+
+OTHER = len(STANDARD_AMINO_ACIDS)
+N_CODES = OTHER + 1
+
+IFEATURE_DESCRIPTORS = ["AAC", "CTDC", "CTDT"]
+
+# the three groups of amino acids of every property of the CTD descriptors, in the order
+# of iFeatureOmega
+CTD_GROUPS = {
+    "hydrophobicity_PRAM900101": ("RKEDQN", "GASTPHY", "CLVIMFW"),
+    "hydrophobicity_ARGP820101": ("QSTNGDE", "RAHCKMV", "LYPFIW"),
+    "hydrophobicity_ZIMJ680101": ("QNGSWTDERA", "HMCKV", "LPFYI"),
+    "hydrophobicity_PONP930101": ("KPDESNQT", "GRHA", "YMFWLCVI"),
+    "hydrophobicity_CASG920101": ("KDEQPSRNTG", "AHYMLV", "FIWC"),
+    "hydrophobicity_ENGD860101": ("RDKENQHYP", "SGTAW", "CVLIMF"),
+    "hydrophobicity_FASG890101": ("KERSQD", "NTPG", "AYHWVMFLIC"),
+    "normwaalsvolume": ("GASTPDC", "NVEQIL", "MHKFRYW"),
+    "polarity": ("LIFWCMVY", "PATGS", "HQRKNED"),
+    "polarizability": ("GASDT", "CPNVEQIL", "KMHFRYW"),
+    "charge": ("KR", "ANCQGHILMFPSTWYV", "DE"),
+    "secondarystruct": ("EALMQKRH", "VIYCWFT", "GNPSD"),
+    "solventaccess": ("ALFCGIVW", "RKQEND", "MSPTHY"),
+}
+# the pairs of groups of a transition, in both directions
+CTDT_TRANSITIONS = {"Tr1221": (0, 1), "Tr1331": (0, 2), "Tr2332": (1, 2)}
+
+
+def descriptor_columns(descriptor: str) -> List[str]:
+    """The names of the columns produced by an iFeatureOmega descriptor."""
+    if descriptor == "AAC":
+        return [f"AAC_{aa}" for aa in STANDARD_AMINO_ACIDS]
+    if descriptor == "CTDC":
+        return [f"CTDC_{prop}.G{group}" for prop in CTD_GROUPS for group in (1, 2, 3)]
+    return [f"CTDT_{prop}.{transition}" for prop in CTD_GROUPS for transition in CTDT_TRANSITIONS]
+
+
+class IFeatureDescriptors:
+    """
+    Calculates the AAC, CTDC and CTDT descriptors of iFeatureOmega for a whole partition
+    at once, from one count matrix and one dipeptide count matrix.
+    """
+
+    def __init__(self, descriptors: List[str]):
+        unknown = set(descriptors) - set(IFEATURE_DESCRIPTORS)
+        if unknown:
+            raise ValueError(
+                f"Unknown descriptors {sorted(unknown)}. Choose from {IFEATURE_DESCRIPTORS}.")
+        self.descriptors = [name for name in IFEATURE_DESCRIPTORS if name in descriptors]
+        # iFeatureOmega works on the uppercase sequence
+        self.table = lookup_table(STANDARD_AMINO_ACIDS, OTHER, uppercase=True)
+
+        # the membership of every residue in the first two groups of every property,
+        # iFeatureOmega derives the third group from them
+        self.composition_matrix = np.zeros((N_CODES, 2 * len(CTD_GROUPS)))
+        # the transitions that every dipeptide counts for
+        self.transition_matrix = np.zeros((N_CODES, N_CODES, len(CTDT_TRANSITIONS) *
+                                           len(CTD_GROUPS)))
+        for i, groups in enumerate(CTD_GROUPS.values()):
+            group_of = {aa: group for group, members in enumerate(groups) for aa in members}
+            for aa, group in group_of.items():
+                if group < 2:
+                    self.composition_matrix[STANDARD_AMINO_ACIDS.index(aa), 2 * i + group] = 1
+
+            for j, pair in enumerate(CTDT_TRANSITIONS.values()):
+                for first in STANDARD_AMINO_ACIDS:
+                    for second in STANDARD_AMINO_ACIDS:
+                        if {group_of.get(first), group_of.get(second)} == set(pair):
+                            self.transition_matrix[STANDARD_AMINO_ACIDS.index(first),
+                                                   STANDARD_AMINO_ACIDS.index(second),
+                                                   len(CTDT_TRANSITIONS) * i + j] = 1
+        self.transition_matrix = self.transition_matrix.reshape(N_CODES * N_CODES, -1)
+
+    def calculate(self, encoded: EncodedSequences) -> Dict[str, np.ndarray]:
+        """Calculate the selected descriptors for all sequences."""
+        counts = encoded.counts(self.table, N_CODES)[:, :OTHER].astype(np.float64)
+        lengths = counts.sum(axis=1, keepdims=True)
+        n_properties = len(CTD_GROUPS)
+
+        columns = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for descriptor in self.descriptors:
+                if descriptor == "AAC":
+                    values = counts / lengths
+                elif descriptor == "CTDC":
+                    first_two = (counts @ self.composition_matrix[:OTHER] / lengths).reshape(
+                        encoded.size, n_properties, 2)
+                    third = 1 - first_two[:, :, 0] - first_two[:, :, 1]
+                    values = np.concatenate([first_two, third[:, :, None]], axis=2).reshape(
+                        encoded.size, 3 * n_properties)
+                else:
+                    pairs = encoded.pair_counts(self.table, N_CODES, drop=OTHER)
+                    values = pairs @ self.transition_matrix / (lengths - 1)
+
+                for name, value in zip(descriptor_columns(descriptor), values.T):
+                    columns[name] = value
+        return columns
+
+
+def ifeature_omega_columns(descriptors: List[str],
+                           sequences: List[str]) -> Dict[str, Dict[str, list]]:
+    """
+    Calculate descriptors with iFeatureOmega, per descriptor and column, the same as the
+    iFeatureOmega component. Without sequences, a reference sequence is used to find the
+    columns, so an empty partition still gets all the columns.
+    """
+    # the CLI module imports all descriptor modules of iFeatureOmega, it is only imported
+    # when a descriptor is not derived from the encoding
+    # pylint: disable=import-outside-toplevel,import-error
+    import iFeatureOmega_CLI.iFeatureOmegaCLI as iFO
+
+    features: Dict[str, Dict[str, list]] = {descriptor: {} for descriptor in descriptors}
+    with tempfile.TemporaryDirectory(prefix="ifeatureomega-") as scratch_dir:
+        for number, sequence in enumerate(sequences or [STANDARD_AMINO_ACIDS]):
+            file_path = os.path.join(scratch_dir, f"sequence{number}.txt")
+            with open(file_path, "w", encoding="utf-8") as file:
+                file.write(f">sequence{number}\n{sequence}")
+
+            protein = iFO.iProtein(file_path)
+            for descriptor in descriptors:
+                protein.get_descriptor(descriptor)
+                for column, value in zip(protein.encodings.columns, protein.encodings.values[0]):
+                    values = features[descriptor].setdefault(column, [])
+                    if sequences:
+                        values.append(value)
+    return features
@@ -0,0 +1,131 @@
+"""
+The SequenceFeaturesComponent calculates the features of the Biopython, checksum, peptide
+features and iFeatureOmega components in one process. Every partition is encoded a single
+time and all feature families are derived from that encoding, so the dataset is not written
+to and read back from Parquet between the four components.
+
+The iFeatureOmega descriptors other than AAC, CTDC and CTDT are calculated with iFeatureOmega
+itself, which is slower but gives every descriptor of the iFeatureOmega component.
+
+With a feature cache, the features are stored by sequence checksum per column group: the
+Biopython features, every peptide descriptor family and every iFeatureOmega descriptor. Only
+the groups that are not in the cache are calculated, for the sequences that miss them.
+"""
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from Bio.SeqUtils.CheckSum import crc64 as bio_crc64
+from fondant.component import PandasTransformComponent
+
+from biopython_features import BiopythonFeatures
+from descriptor_engine import DEFAULT_DESCRIPTORS, PeptideDescriptorEngine
+from encoding import EncodedSequences, crc64
+from feature_cache import FeatureCache, arguments_hash, cached_features
+from ifeature_features import (IFEATURE_DESCRIPTORS, IFeatureDescriptors, descriptor_columns,
+                               ifeature_omega_columns)
+from instrumentation import instrumented
+
+
+logger = logging.getLogger(__name__)
+
+# the version of the calculated features, change it when a feature changes so the feature
+# cache does not return the features of the earlier version
+FEATURES_VERSION = "2"
+
+
+@instrumented
+class SequenceFeaturesComponent(PandasTransformComponent):
+    """
+    The SequenceFeaturesComponent calculates the features of the Biopython, checksum, peptide
+    features and iFeatureOmega components in one process, from one encoding per partition.
+    """
+
+    def __init__(self, peptide_descriptors: Optional[List[str]] = None,
+                 ifeature_descriptors: Optional[List[str]] = None,
+                 feature_cache_path: Optional[str] = None):
+        # pylint: disable=super-init-not-called
+        self.biopython = BiopythonFeatures()
+        self.peptides = PeptideDescriptorEngine(peptide_descriptors or DEFAULT_DESCRIPTORS)
+        ifeature_descriptors = ifeature_descriptors or IFEATURE_DESCRIPTORS
+        self.ifeature = IFeatureDescriptors([descriptor for descriptor in ifeature_descriptors
+                                             if descriptor in IFEATURE_DESCRIPTORS])
+        # the descriptors that are calculated with iFeatureOmega itself
+        self.ifeature_omega = [descriptor for descriptor in ifeature_descriptors
+                               if descriptor not in IFEATURE_DESCRIPTORS]
+
+        self.cache = None
+        if feature_cache_path:
+            self.cache = FeatureCache(feature_cache_path, "sequence_features", FEATURES_VERSION)
+        # the column groups, none of them has arguments
+        groups = ["biopython"] + [f"peptides:{family}" for family in self.peptides.descriptors] \
+            + [f"ifeature:{descriptor}" for descriptor in self.ifeature.descriptors] \
+            + [f"ifeature:{descriptor}" for descriptor in self.ifeature_omega]
+        self.groups = {group: arguments_hash({}) for group in groups}
+
+    def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """The transform method takes in a dataframe, generates the features of all four
+        components and returns the dataframe with the new features added."""
+        sequences = dataframe["sequence"].tolist()
+        encoded = EncodedSequences(sequences)
+        checksums = [checksum if checksum is not None else bio_crc64(sequence)
+                     for checksum, sequence in zip(crc64(encoded), sequences)]
+
+        def compute(groups: List[str], positions: List[int]) -> Dict[str, Dict[str, np.ndarray]]:
+            subset = sequences if len(positions) == len(sequences) else \
+                [sequences[position] for position in positions]
+            return self.calculate(groups, subset, encoded if subset is sequences else None)
+
+        columns = cached_features(self.cache, checksums, self.groups, compute)
+        columns["sequence_checksum"] = checksums
+        if self.cache is not None:
+            logger.info("Feature cache: %s", self.cache.stats())
+
+        # the columns that were not selected are declared in the component spec
+        for family in DEFAULT_DESCRIPTORS:
+            if family not in self.peptides.descriptors:
+                for name in self.peptides.family_columns(family):
+                    columns[name] = np.full(len(dataframe), np.nan)
+        for descriptor in IFEATURE_DESCRIPTORS:
+            if descriptor not in self.ifeature.descriptors:
+                for name in descriptor_columns(descriptor):
+                    columns[name] = np.full(len(dataframe), np.nan)
+
+        # all columns are added at once, adding them one by one fragments the dataframe
+        features = pd.DataFrame(columns, index=dataframe.index)
+        return pd.concat([dataframe.drop(columns=features.columns, errors="ignore"), features],
+                         axis=1)
+
+    def calculate(self, groups: List[str], sequences: List[str],
+                  encoded: Optional[EncodedSequences] = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """Calculate the columns of the column groups, from one encoding of the sequences."""
+        encoded = encoded or EncodedSequences(sequences)
+        families = [group.split(":")[1] for group in groups if group.startswith("peptides:")]
+        ifeature = [group.split(":")[1] for group in groups if group.startswith("ifeature:")]
+        descriptors = [descriptor for descriptor in ifeature if descriptor in IFEATURE_DESCRIPTORS]
+        other_descriptors = [descriptor for descriptor in ifeature
+                             if descriptor not in IFEATURE_DESCRIPTORS]
+
+        computed = {}
+        if "biopython" in groups:
+            computed["biopython"] = self.biopython.calculate(encoded, sequences)
+        if families:
+            engine = self.peptides if families == self.peptides.descriptors else \
+                PeptideDescriptorEngine(families)
+            columns = engine.calculate(encoded)
+            for family in families:
+                computed[f"peptides:{family}"] = {
+                    name: columns[name] for name in engine.family_columns(family)}
+        if descriptors:
+            engine = self.ifeature if descriptors == self.ifeature.descriptors else \
+                IFeatureDescriptors(descriptors)
+            columns = engine.calculate(encoded)
+            for descriptor in descriptors:
+                computed[f"ifeature:{descriptor}"] = {
+                    name: columns[name] for name in descriptor_columns(descriptor)}
+        if other_descriptors:
+            for descriptor, columns in ifeature_omega_columns(other_descriptors,
+                                                              sequences).items():
+                computed[f"ifeature:{descriptor}"] = columns
+        return computed
@@ -0,0 +1,177 @@
+import os
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import peptides
+import pytest
+import yaml
+from Bio.SeqUtils.CheckSum import crc64 as bio_crc64
+
+from biopython_features import protein_analysis_features
+from encoding import EncodedSequences, crc64
+from ifeature_features import CTD_GROUPS, IFeatureDescriptors
+from src.main import SequenceFeaturesComponent
+
+SPEC_PATH = os.path.join(os.path.dirname(__file__), "..", "fondant_component.yaml")
+
+
+@pytest.fixture
+def sequences():
+    rng = np.random.default_rng(0)
+    alphabet = list("ACDEFGHIKLMNPQRSTVWY")
+    random_sequences = ["".join(rng.choice(alphabet, size=length))
+                        for length in rng.integers(10, 400, size=30)]
+    return random_sequences + ["mkvlaagivgllla", "EGVNDNECEGFFSAR", "MKTAYIAKQRQISFVKSHFSRQ"]
+
+
+def ifeature_reference(sequence):
+    """The AAC, CTDC and CTDT calculation of iFeatureOmega for one sequence."""
+    sequence = re.sub("[^ACDEFGHIKLMNPQRSTVWY]", "", sequence.upper())
+    counts = Counter(sequence)
+    features = {f"AAC_{aa}": counts[aa] / len(sequence) for aa in "ACDEFGHIKLMNPQRSTVWY"}
+    pairs = [sequence[j:j + 2] for j in range(len(sequence) - 1)]
+    for prop, (group1, group2, group3) in CTD_GROUPS.items():
+        c1 = sum(sequence.count(aa) for aa in group1) / len(sequence)
+        c2 = sum(sequence.count(aa) for aa in group2) / len(sequence)
+        features.update({f"CTDC_{prop}.G1": c1, f"CTDC_{prop}.G2": c2,
+                         f"CTDC_{prop}.G3": 1 - c1 - c2})
+        for name, (first, second) in {"Tr1221": (group1, group2), "Tr1331": (group1, group3),
+                                      "Tr2332": (group2, group3)}.items():
+            transitions = sum((a in first and b in second) or (a in second and b in first)
+                              for a, b in pairs)
+            features[f"CTDT_{prop}.{name}"] = transitions / len(pairs)
+    return features
+
+
+def test_biopython_features_match_protein_analysis(sequences):
+    result = SequenceFeaturesComponent().transform(pd.DataFrame({"sequence": sequences}))
+    expected = pd.DataFrame([protein_analysis_features(sequence) for sequence in sequences])
+
+    for column in expected.columns:
+        np.testing.assert_allclose(result[column].to_numpy(float),
+                                   expected[column].to_numpy(float), rtol=1e-9, err_msg=column)
+
+
+def test_checksum_matches_biopython(sequences):
+    sequences = sequences + ["", "MKVéL"]
+    checksums = crc64(EncodedSequences(sequences))
+    assert checksums[:-1] == [bio_crc64(sequence) for sequence in sequences[:-1]]
+    # non-ascii sequences are left to biopython by the component
+    assert checksums[-1] is None
+
+
+def test_ifeature_descriptors_match_reference(sequences):
+    sequences = sequences + ["MKXXVLAB"]
+    columns = IFeatureDescriptors(["AAC", "CTDC", "CTDT"]).calculate(EncodedSequences(sequences))
+
+    for i, sequence in enumerate(sequences):
+        for name, value in ifeature_reference(sequence).items():
+            assert columns[name][i] == pytest.approx(value), name
+
+
+def test_ifeature_descriptors_match_ifeatureomega(sequences, tmp_path):
+    ifo = pytest.importorskip("iFeatureOmega_CLI.iFeatureOmegaCLI")
+    fasta = tmp_path / "sequences.txt"
+    fasta.write_text("".join(f">seq{i}\n{sequence}\n" for i, sequence in enumerate(sequences)))
+    protein = ifo.iProtein(str(fasta))
+    columns = IFeatureDescriptors(["AAC", "CTDC", "CTDT"]).calculate(EncodedSequences(sequences))
+
+    for descriptor in ["AAC", "CTDC", "CTDT"]:
+        protein.get_descriptor(descriptor)
+        for name in protein.encodings.columns:
+            np.testing.assert_allclose(columns[name], protein.encodings[name].to_numpy(float))
+
+
+def test_other_ifeature_descriptors_use_ifeatureomega(sequences, tmp_path):
+    ifo = pytest.importorskip("iFeatureOmega_CLI.iFeatureOmegaCLI")
+    sequences = sequences[:3]
+    result = SequenceFeaturesComponent(ifeature_descriptors=["AAC", "GAAC"]).transform(
+        pd.DataFrame({"sequence": sequences}))
+
+    for i, sequence in enumerate(sequences):
+        fasta = tmp_path / f"sequence{i}.txt"
+        fasta.write_text(f">sequence{i}\n{sequence}")
+        protein = ifo.iProtein(str(fasta))
+        protein.get_descriptor("GAAC")
+        for name in protein.encodings.columns:
+            assert result[name][i] == pytest.approx(protein.encodings[name].iloc[0]), name
+    assert result["AAC_A"].notna().all()
+
+
+def test_peptide_features_match_peptides(sequences):
+    # peptides only blocks the uppercase cysteines in the m/z
+    sequences = sequences + ["MkVlaAgivGLLla", "egvNDNecegffsar"]
+    result = SequenceFeaturesComponent().transform(pd.DataFrame({"sequence": sequences}))
+
+    for i, sequence in enumerate(sequences):
+        peptide = peptides.Peptide(sequence)
+        assert result["mz"][i] == pytest.approx(peptide.mz())
+        assert [result[f"z_scale_{j}"][i] for j in range(1, 6)] == \
+            pytest.approx(list(peptide.z_scales()))
+
+
+def test_component_produces_the_columns_of_the_spec(sequences):
+    with open(SPEC_PATH) as f:
+        produces = yaml.safe_load(f)["produces"]
+    dataframe = pd.DataFrame({"sequence": sequences},
+                             index=[f"id{i}" for i in range(len(sequences))])
+
+    result = SequenceFeaturesComponent(ifeature_descriptors=["AAC"]).transform(dataframe)
+
+    assert set(produces) - {"additionalProperties"} == set(result.columns)
+    assert result.index.equals(dataframe.index)
+    assert result["CTDT_charge.Tr1221"].isna().all()
+    assert result["sequence_checksum"].iloc[0] == bio_crc64(sequences[0])
+
+
+def test_unknown_ifeature_descriptor():
+    with pytest.raises(ValueError):
+        IFeatureDescriptors(["DPC"])
+
+
+def test_feature_cache_only_calculates_the_missing_groups(sequences, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "features.sqlite")
+    dataframe = pd.DataFrame({"sequence": sequences + sequences[:3]})
+    expected = SequenceFeaturesComponent().transform(dataframe.copy())
+
+    first = SequenceFeaturesComponent(ifeature_descriptors=["AAC"], feature_cache_path=cache_path)
+    first.transform(dataframe.copy())
+
+    component = SequenceFeaturesComponent(feature_cache_path=cache_path)
+    calculated = []
+    calculate = component.calculate
+    monkeypatch.setattr(component, "calculate", lambda groups, subset, encoded=None: (
+        calculated.append((groups, len(subset))) or calculate(groups, subset, encoded)))
+    result = component.transform(dataframe.copy())
+
+    # the duplicates are calculated once, the cached groups are not calculated again
+    assert calculated == [(["ifeature:CTDC", "ifeature:CTDT"], len(sequences))]
+    assert component.cache.stats()["hits"] == 5 * len(sequences)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+
+
+def test_feature_cache_calculates_a_group_only_for_the_rows_that_miss_it(sequences, tmp_path,
+                                                                         monkeypatch):
+    cache_path = str(tmp_path / "features.sqlite")
+    dataframe = pd.DataFrame({"sequence": sequences})
+    expected = SequenceFeaturesComponent().transform(dataframe.copy())
+
+    first = SequenceFeaturesComponent(ifeature_descriptors=["AAC"], feature_cache_path=cache_path)
+    first.transform(dataframe.iloc[:-1].copy())
+
+    # a new sequence and a new descriptor in the same partition
+    component = SequenceFeaturesComponent(feature_cache_path=cache_path)
+    calculated = []
+    calculate = component.calculate
+    monkeypatch.setattr(component, "calculate", lambda groups, subset, encoded=None: (
+        calculated.append((groups, len(subset))) or calculate(groups, subset, encoded)))
+    result = component.transform(dataframe.copy())
+
+    assert calculated == [
+        (["biopython", "peptides:aa_fractions", "peptides:mz", "peptides:z_scales",
+          "ifeature:AAC"], 1),
+        (["ifeature:CTDC", "ifeature:CTDT"], len(sequences)),
+    ]
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
@@ -7,14 +7,17 @@ The 'remote' method will use the GCP storage bucket to store the PDB file.
 import logging
 import os
 
-from google.cloud import storage
 import pandas as pd
 from fondant.component import PandasTransformComponent
 
+from instrumentation import instrumented
+from structure_store import REFERENCE_COLUMNS, StructureStore
+
 
 logger = logging.getLogger(__name__)
 
 
+@instrumented
 class StorePDBComponent(PandasTransformComponent):
     """
     The StorePDBComponent stores the PDB file given a method.
@@ -24,13 +27,15 @@ class StorePDBComponent(PandasTransformComponent):
     """
 
     def __init__(self, method: str, local_pdb_path: str, bucket_name: str,
-              project_id: str, google_cloud_credentials_path: str):
+              project_id: str, google_cloud_credentials_path: str,
+              pass_by_reference: bool = False):
         # pylint: disable=super-init-not-called
         # pylint: disable=too-many-arguments
 
         if method not in ["local", "remote"]:
             raise ValueError("method must be either 'local' or 'remote'")
         self.method = method
+        self.pass_by_reference = pass_by_reference
 
         if method == "local":
             self.local_pdb_files_path = local_pdb_path
@@ -62,32 +67,30 @@ class StorePDBComponent(PandasTransformComponent):
         """Perform the transformation on the dataframe."""
 
         if self.method == "local":
-            dataframe = self.store_local_pdb_files(dataframe)
-
+            store = StructureStore("local", local_pdb_path=self.local_pdb_files_path)
         else:
-            storage_client = storage.Client(self.project_id)
-            bucket = storage_client.get_bucket(self.bucket_name)
-            dataframe = self.store_remote_pdb_files(dataframe, bucket)
-
-        return dataframe
-
-    def store_remote_pdb_files(
-        self,
-        dataframe: pd.DataFrame,
-        bucket: storage.Bucket) -> pd.DataFrame:
-        """Save the remote PDB files and filter out the ones that already exist."""
-        # pylint: disable=no-self-use
-
-        dataframe.apply(lambda row: bucket.blob(
-            row.sequence_checksum).upload_from_string(row.pdb_string), axis=1)
-
-        return dataframe
-
-    def store_local_pdb_files(self, dataframe: pd.DataFrame) -> pd.DataFrame:
-        """Store the local PDB files and filter out the ones that already exist."""
-
-        for row in dataframe.itertuples():
-            with open(self.local_pdb_files_path + row.sequence_checksum + ".pdb", "w+") as f:
-                f.write(row.pdb_string)
+            store = StructureStore("remote", bucket_name=self.bucket_name,
+                                   project_id=self.project_id)
+
+        return self.store_pdb_files(dataframe, store)
+
+    def store_pdb_files(self, dataframe: pd.DataFrame, store: StructureStore) -> pd.DataFrame:
+        """
+        Store the PDB files that are not in the store yet and fill their reference columns.
+        When the structures are passed by reference, pdb_string is emptied afterwards.
+        """
+        for column, default in zip(REFERENCE_COLUMNS, ["", 0, ""]):
+            dataframe[column] = dataframe[column].fillna(default) \
+                if column in dataframe else default
+
+        new = (dataframe["pdb_string"].fillna("") != "") & (dataframe["pdb_key"] == "")
+        if new.any():
+            dataframe.loc[new, REFERENCE_COLUMNS] = [
+                store.put(checksum, pdb_string) for checksum, pdb_string in
+                zip(dataframe.loc[new, "sequence_checksum"], dataframe.loc[new, "pdb_string"])]
+        dataframe["pdb_size"] = dataframe["pdb_size"].astype("int64")
+
+        if self.pass_by_reference:
+            dataframe["pdb_string"] = ""
 
         return dataframe
@@ -0,0 +1,210 @@
+"""
+The HfCaller sends the (protein sequence, SMILES) pairs to the UniKP endpoint on Hugging Face.
+All requests share one keep-alive session that runs on a background event loop, so
+the pairs of a partition are predicted concurrently instead of one request at a time.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+from endpoint_warmer import EndpointWarmer
+from instrumentation import span
+from replay_transport import ReplayTransport
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class BatchRejectedError(Exception):
+    """The endpoint rejected a batched request with a status code that is not retried."""
+
+
+class HfCaller():
+    """
+    A class representing an API caller for predicting kinetic properties.
+    Attributes:
+        hf_api_key (str): The API key for accessing the API.
+        hf_endpoint_url (str): The endpoint URL for making API calls.
+        max_concurrency (int): The maximum number of requests in flight at the same time.
+        max_retries (int): The number of retries for a request that fails with 429/5xx.
+        batch_size (int): The number of pairs sent in one request, if the endpoint accepts it.
+        transport (ReplayTransport): Records or replays the responses of the endpoint.
+        warmer (EndpointWarmer): When set, the first request waits until the endpoint is warm.
+    Methods:
+        get_headers(): Returns the headers for the API call.
+        predict_pairs(pairs): Predicts kinetic properties for many pairs concurrently.
+        predict_kinetic_properties(protein_sequence, target_smile): Predicts kinetic properties
+        of a single pair.
+        close(): Closes the session and stops the event loop.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, hf_endpoint_url: Optional[str] = None, hf_api_key: Optional[str] = None,
+                max_concurrency: int = 8, max_retries: int = 3, batch_size: int = 1,
+                timeout: float = 30, backoff: float = 0.5,
+                transport: Optional[ReplayTransport] = None) -> None:
+        # pylint: disable=too-many-arguments
+        """
+        Initializes the class instance. The endpoint URL and API key default to the
+        environment variables `UNIKP_ENDPOINT_URL` and `HF_API_KEY`.
+        Raises:
+            ValueError: If the endpoint URL or API key is not set, and the responses are
+            not replayed.
+        """
+        self.hf_api_key = hf_api_key or os.getenv("HF_API_KEY")
+        self.hf_endpoint_url = hf_endpoint_url or os.getenv("UNIKP_ENDPOINT_URL")
+        self.transport = transport or ReplayTransport()
+        self.warmer: Optional[EndpointWarmer] = None
+
+        if (not self.hf_api_key or not self.hf_endpoint_url) and self.transport.mode != "replay":
+            raise ValueError("environment variables not set.")
+
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.backoff = backoff
+        # switched off when the endpoint rejects a batched request
+        self.batching_supported = batch_size > 1
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._session = None
+        self._semaphore = None
+
+    def get_headers(self):
+        """Get headers for the API call."""
+        return {
+            "Authorization": f"Bearer {self.hf_api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def predict_kinetic_properties(
+        self,
+        protein_sequence: str,
+        target_smile: str) -> Optional[dict]:
+        """
+        Predicts kinetic properties for a given protein sequence and target SMILES.
+
+        Args:
+            protein_sequence (str): The protein sequence.
+            target_smile (str): The target SMILES.
+
+        Returns:
+            dict: A dictionary containing the predicted kinetic properties,
+            or None if the request failed.
+        """
+        return self.predict_pairs([(protein_sequence, target_smile)])[0]
+
+    def predict_pairs(self, pairs: Sequence[Tuple[str, str]]) -> List[Optional[dict]]:
+        """
+        Predicts kinetic properties for all (protein sequence, SMILES) pairs concurrently.
+
+        Returns the predictions in the order of the pairs, with None for failed requests.
+        """
+        if not pairs:
+            return []
+        # the endpoint scales to zero, the first batch is only sent once it is warm
+        if self.warmer is not None:
+            self.warmer.wait_until_warm()
+            self.warmer = None
+        future = asyncio.run_coroutine_threadsafe(self._predict_pairs(list(pairs)), self._loop)
+        return future.result()
+
+    def close(self) -> None:
+        """Close the session and stop the background event loop."""
+        if self._loop.is_closed():
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Create the shared keep-alive session on the event loop when first needed."""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.get_headers(),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def _predict_pairs(self, pairs: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        await self._get_session()
+        size = self.batch_size if self.batching_supported else 1
+        batches = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        results = await asyncio.gather(*(self._predict_batch(batch) for batch in batches))
+        return [prediction for batch in results for prediction in batch]
+
+    async def _predict_batch(self, batch: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        if len(batch) == 1:
+            data = {"inputs": {"sequence": batch[0][0], "smiles": batch[0][1]}}
+            return [await self._post(data)]
+
+        data = {"inputs": [{"sequence": sequence, "smiles": smiles}
+                           for sequence, smiles in batch]}
+        try:
+            response = await self._post(data, batched=True)
+        except BatchRejectedError as e:
+            response = e
+        if response is None:
+            # the retries are exhausted, the endpoint would not do better with single pairs
+            return [None] * len(batch)
+        if isinstance(response, list) and len(response) == len(batch):
+            return response
+
+        if self.batching_supported:
+            logger.warning("Endpoint does not accept batched requests (%s), sending single "
+                           "pairs.", response if isinstance(response, BatchRejectedError)
+                           else "unexpected response")
+            self.batching_supported = False
+        results = await asyncio.gather(*(self._predict_batch([pair]) for pair in batch))
+        return [prediction for single in results for prediction in single]
+
+    async def _post(self, data: Dict[str, Any], batched: bool = False) -> Any:
+        """Post the data, or replay the recorded response of the same data."""
+        with span("unikp_request"):
+            return await self.transport.acall(data, lambda: self._send(data, batched))
+
+    async def _send(self, data: Dict[str, Any], batched: bool = False) -> Any:
+        """Post the data, retrying with exponential backoff and jitter on 429/5xx."""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    async with self._session.post(self.hf_endpoint_url, json=data) as response:
+                        if response.status < 400:
+                            return await response.json(content_type=None)
+                        if response.status not in RETRY_STATUS_CODES:
+                            # a rejected batch is retried as single pairs by the caller
+                            if batched:
+                                raise BatchRejectedError(
+                                    f"status code {response.status}")
+                            logger.error("Request failed with status code %s: %s",
+                                         response.status, await response.text())
+                            return None
+                        retry_after = response.headers.get("Retry-After")
+                        error = f"status code {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+
+            if attempt == self.max_retries:
+                logger.error("Request failed after %s attempts: %s", attempt + 1, error)
+                return None
+
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)  # nosec
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.warning("Request failed with %s, retrying in %.2fs", error, delay)
+            await asyncio.sleep(delay)
+
+        return None
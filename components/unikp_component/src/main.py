@@ -1,45 +1,82 @@
 """
 The UniKP component uses the UniKP framework to predict
 kinetic properties (Km, Kcat and Vmax) of a protein sequence and a ligand SMILES string.
-The results will be presented as a JSON, but in a string format
-for easy storage and retrieval in the dataframe.
+The results are stored as a typed list with one struct of float values per target molecule,
+so they can be read and filtered without parsing JSON.
 """
 import logging
+import math
 import os
 import json
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
-import requests
-from requests.exceptions import RequestException
 from dotenv import load_dotenv
 from fondant.component import PandasTransformComponent
 
+from endpoint_warmer import ENDPOINTS, EndpointWarmer
+from hf_caller import HfCaller
+from instrumentation import instrumented
+from prediction_cache import KineticPredictionCache, canonicalize_smiles
+from replay_transport import ReplayTransport
+
 # Load the environment variables
 load_dotenv()
 
+# field of the output struct -> key in the response of the endpoint (lowercase)
+KINETIC_FIELDS = {"km": "km", "kcat": "kcat", "kcat_km": "kcat/km", "vmax": "vmax"}
+
 
 logger = logging.getLogger(__name__)
 
 
+@instrumented
 class PredictEnyzmCharacteristicsComponent(PandasTransformComponent):
     """
     The UniKP component uses the UniKP framework to predict
     kinetic properties (Km, Kcat and Vmax) of a protein sequence and a ligand SMILES string.
-    The results will be presented as a JSON, but in a string format
-    for easy storage and retrieval in the dataframe.
+    The results are stored as a typed list with one struct of float values per target molecule,
+    so they can be read and filtered without parsing JSON.
     """
 
-    def __init__(self, target_molecule_smiles: str):
+    def __init__(self, target_molecule_smiles: str, max_concurrency: int = 8,
+                batch_size: int = 1, max_retries: int = 3, cache_path: Optional[str] = None,
+                cache_ttl_days: Optional[float] = 30, model_version: Optional[str] = None,
+                warmup_timeout: float = 900, warmup_latency_slo: float = 10,
+                warmup_history_path: Optional[str] = None, transport_mode: str = "live",
+                transport_store_path: Optional[str] = None,
+                replay_latency: Optional[float] = None):
         # pylint: disable=super-init-not-called
+        # pylint: disable=too-many-arguments,too-many-locals
 
-        self.caller = HfCaller()
+        # the responses of the endpoint can be recorded, and replayed offline
+        transport = ReplayTransport(transport_mode, transport_store_path, "unikp",
+                                    replay_latency)
+        self.caller = HfCaller(max_concurrency=max_concurrency,
+                            batch_size=batch_size,
+                            max_retries=max_retries,
+                            transport=transport)
 
         self.target_molecule_smiles = target_molecule_smiles
 
         self.check_existence_of_files()
 
+        # the target molecules are read once and reused for every partition
+        self.molecules = read_json_file(self.target_molecule_smiles)
 
+        # the endpoint scales to zero, it is only woken up when a partition has pairs to send
+        if warmup_timeout > 0 and transport_mode != "replay":
+            self.caller.warmer = EndpointWarmer(
+                "unikp", self.caller.hf_endpoint_url, self.caller.hf_api_key,
+                ENDPOINTS["unikp"][1], latency_slo=warmup_latency_slo, timeout=warmup_timeout,
+                history_path=warmup_history_path)
 
+        # the predictions are cached per endpoint unless a model version is given
+        self.cache = None
+        if cache_path:
+            self.cache = KineticPredictionCache(
+                cache_path, model_version or self.caller.hf_endpoint_url or "replay",
+                cache_ttl_days)
 
     def check_existence_of_files(self) -> None:
         """Check if the required files exist in the local_pdb_files_path directory."""
@@ -54,80 +91,20 @@ class PredictEnyzmCharacteristicsComponent(PandasTransformComponent):
 
     def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """Perform the transformation on the dataframe."""
-        molecules = read_json_file(self.target_molecule_smiles)
 
-        dataframe['unikp_kinetic_prediction'] = dataframe.apply(
-            lambda x: predict_over_dataframe(
-                self.caller,
-                x["sequence"],
-                molecules), axis=1)
+        predictions = predict_over_dataframe(
+            self.caller,
+            dataframe["sequence"].tolist(),
+            self.molecules,
+            cache=self.cache,
+            checksums=dataframe["sequence_checksum"].tolist())
+        dataframe['unikp_kinetic_prediction'] = [
+            create_kinetic_records(prediction, self.molecules) for prediction in predictions]
 
-        return dataframe
+        if self.cache is not None:
+            logger.info("Prediction cache: %s", self.cache.stats())
 
-class HfCaller():
-    """
-    A class representing an API caller for predicting kinetic properties.
-    Attributes:
-        hf_api_key (str): The API key for accessing the API.
-        hf_endpoint_url (str): The endpoint URL for making API calls.
-    Methods:
-        __init__(): Initializes the HfCaller object.
-        get_headers(): Returns the headers for the API call.
-        predict_kinetic_properties(protein_sequence, target_smile): Predicts kinetic properties
-        using the API.
-    """
-    def __init__(self) -> None:
-        """
-        Initializes the class instance.
-        Raises:
-            ValueError: If the environment variables `HF_API_KEY` or `HF_ENDPOINT_URL` are not set.
-        """
-        self.hf_api_key = os.getenv("HF_API_KEY")
-        self.hf_endpoint_url = os.getenv("HF_ENDPOINT_URL")
-
-        if not self.hf_api_key or not self.hf_endpoint_url:
-            raise ValueError("environment variables not set.")
-
-    def get_headers(self):
-        """Get headers for the API call."""
-        return {
-            "Authorization": f"Bearer {self.hf_api_key}",
-            "Content-Type": "application/json"
-        }
-
-    def predict_kinetic_properties(
-        self,
-        protein_sequence: str,
-        target_smile: str) -> dict:
-        """
-        Predicts kinetic properties for a given protein sequence and target SMILES.
-
-        Args:
-            protein_sequence (str): The protein sequence.
-            target_smile (str): The target SMILES.
-
-        Returns:
-            dict: A dictionary containing the predicted kinetic properties.
-
-        Raises:
-            RequestException: If the request to the endpoint fails.
-        """
-
-        data = {
-                    "inputs": {
-                        "sequence": protein_sequence,
-                        "smiles": target_smile
-                    }
-                }
-        try:
-            response = requests.post(
-                self.hf_endpoint_url, json=data, headers=self.get_headers(), timeout=30)
-            response.raise_for_status()
-        except RequestException as e:
-            logger.error("Request failed: %s", e)
-            return None
-
-        return response.json()
+        return dataframe
 
 def read_json_file(path):
     """
@@ -141,19 +118,82 @@ def read_json_file(path):
         data = json.load(f)
     return data
 
-def predict_over_dataframe(huggingface, sequence, f):
+def predict_over_dataframe(huggingface: HfCaller, sequences: List[str], f: Dict[str, str],
+                        cache: Optional[KineticPredictionCache] = None,
+                        checksums: Optional[List[str]] = None) -> List[dict]:
     """
-    Predicts kinetic properties over a dataframe of SMILES strings.
+    Predicts kinetic properties of every sequence for every SMILES string.
+    All (sequence, SMILES) pairs are sent concurrently, duplicate sequences only once.
+    When a cache is given, only the pairs that are not in the cache are sent.
     Args:
-        huggingface (object): The HuggingFace model used for prediction.
-        sequence (str): The sequence used for prediction.
+        huggingface (HfCaller): The caller of the UniKP endpoint.
+        sequences (list): The sequences used for prediction.
         f (dict): A dictionary containing the names and SMILES strings.
+        cache (KineticPredictionCache): The cache of earlier predictions.
+        checksums (list): The checksums of the sequences, needed for the cache.
     Returns:
-        dict: A dictionary containing the predicted results for each name.
+        list: A dictionary per sequence containing the predicted results for each name.
     """
+    # pylint: disable=too-many-locals
+    unique_sequences = list(dict.fromkeys(sequences))
+    pairs = [(sequence, smiles) for sequence in unique_sequences for smiles in f.values()]
+
+    if cache is None:
+        results = huggingface.predict_pairs(pairs)
+    else:
+        checksum_of = dict(zip(sequences, checksums))
+        canonical = {smiles: canonicalize_smiles(smiles) for smiles in f.values()}
+        keys = [(checksum_of[sequence], canonical[smiles]) for sequence, smiles in pairs]
+
+        cached = cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        predictions = huggingface.predict_pairs([pairs[i] for i in missing])
+
+        # failed predictions are not cached, they are retried in the next run
+        cache.put_many({keys[i]: prediction for i, prediction in zip(missing, predictions)
+                        if prediction is not None})
+        results = [cached.get(key) for key in keys]
+        for i, prediction in zip(missing, predictions):
+            results[i] = prediction
+
     out = {}
-    for name, smiles in f.items():
-        print(name, smiles)
-        result = huggingface.predict_kinetic_properties(sequence, smiles)
-        out[name] = result
-    return out
+    for i, sequence in enumerate(unique_sequences):
+        out[sequence] = dict(zip(f, results[i * len(f):(i + 1) * len(f)]))
+    return [out[sequence] for sequence in sequences]
+
+
+def to_float(value: Any) -> Optional[float]:
+    """Convert a value of the endpoint response to a float, or None if it is not a number."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def parse_kinetic_prediction(prediction: Optional[dict]) -> Dict[str, Optional[float]]:
+    """
+    Parse the response of the endpoint for a single pair to the float fields
+    km, kcat, kcat_km and vmax. Missing values and failed requests give None.
+    kcat/Km is derived from Kcat and Km when the endpoint does not return it.
+    """
+    values = {key.lower(): value for key, value in (prediction or {}).items()}
+    record = {field: to_float(values.get(key)) for field, key in KINETIC_FIELDS.items()}
+
+    if record["kcat_km"] is None and record["kcat"] is not None and record["km"]:
+        record["kcat_km"] = record["kcat"] / record["km"]
+    return record
+
+
+def create_kinetic_records(predictions: Dict[str, Optional[dict]],
+                        f: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Create the typed records of a sequence, one per target molecule in the order of the file.
+    Args:
+        predictions (dict): The response of the endpoint per molecule name.
+        f (dict): A dictionary containing the names and SMILES strings.
+    Returns:
+        list: A record with the molecule, SMILES and kinetic values per molecule.
+    """
+    return [{"molecule": name, "smiles": smiles, **parse_kinetic_prediction(predictions.get(name))}
+            for name, smiles in f.items()]
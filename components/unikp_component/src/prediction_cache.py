@@ -0,0 +1,144 @@
+"""
+The KineticPredictionCache stores the UniKP predictions in a local SQLite database,
+keyed by sequence checksum, canonical SMILES and model version, so that only the
+(sequence, SMILES) pairs that were never predicted before are sent to the endpoint.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from rdkit import Chem  # pylint: disable=import-error
+    from rdkit import RDLogger  # pylint: disable=import-error
+    RDLogger.DisableLog("rdApp.*")
+except ImportError:  # pragma: no cover - rdkit is installed in the image
+    Chem = None
+
+# SQLite limits the number of parameters in one statement
+LOOKUP_CHUNK_SIZE = 500
+
+
+def canonicalize_smiles(smiles: str) -> str:
+    """
+    Return the canonical SMILES, so that different notations of the same molecule share their
+    cache entries. SMILES that RDKit cannot parse, or all SMILES when RDKit is not installed
+    (e.g. in the local tests), are only stripped.
+    """
+    smiles = smiles.strip()
+    if Chem is None:
+        return smiles
+
+    molecule = Chem.MolFromSmiles(smiles)
+    return Chem.MolToSmiles(molecule) if molecule is not None else smiles
+
+
+class KineticPredictionCache:
+    """
+    The KineticPredictionCache stores the UniKP predictions in a local SQLite database,
+    keyed by sequence checksum, canonical SMILES and model version.
+
+    Entries older than `ttl_days` are ignored and removed when the cache is opened.
+    Entries of other model versions are never returned, they can be removed with `invalidate`.
+    The number of cache hits and misses is counted over the lifetime of the cache.
+    """
+
+    def __init__(self, path: str, model_version: str, ttl_days: Optional[float] = None):
+        self.path = path
+        self.model_version = model_version
+        self.ttl_seconds = ttl_days * 24 * 3600 if ttl_days else None
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        with self._connection:
+            # WAL lets the workers of other processes read while one of them writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS predictions (
+                    sequence_checksum TEXT NOT NULL,
+                    smiles TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    prediction TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (sequence_checksum, smiles, model_version)
+                ) WITHOUT ROWID""")
+        self.purge_expired()
+
+    def _oldest_valid_timestamp(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else 0.0
+
+    def get_many(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], dict]:
+        """
+        Look up the predictions of many (sequence checksum, canonical SMILES) pairs at once.
+        Returns the pairs that are in the cache, the others count as misses.
+        """
+        keys = set(keys)
+        checksums = sorted({checksum for checksum, _ in keys})
+        found = {}
+
+        with self._lock:
+            for i in range(0, len(checksums), LOOKUP_CHUNK_SIZE):
+                chunk = checksums[i:i + LOOKUP_CHUNK_SIZE]
+                rows = self._connection.execute(
+                    "SELECT sequence_checksum, smiles, prediction FROM predictions "
+                    "WHERE model_version = ? AND created_at >= ? "  # nosec
+                    f"AND sequence_checksum IN ({','.join('?' * len(chunk))})",
+                    [self.model_version, self._oldest_valid_timestamp(), *chunk])
+                for checksum, smiles, prediction in rows:
+                    if (checksum, smiles) in keys:
+                        found[(checksum, smiles)] = json.loads(prediction)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, predictions: Dict[Tuple[str, str], dict]) -> None:
+        """Store the predictions of many (sequence checksum, canonical SMILES) pairs."""
+        now = time.time()
+        rows = [(checksum, smiles, self.model_version, json.dumps(prediction), now)
+                for (checksum, smiles), prediction in predictions.items()]
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)", rows)
+
+    def purge_expired(self) -> int:
+        """Remove the entries that are older than the TTL. Returns the number of entries."""
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM predictions WHERE created_at < ?", [self._oldest_valid_timestamp()])
+        if cursor.rowcount:
+            logger.info("Removed %s expired predictions from the cache", cursor.rowcount)
+        return cursor.rowcount
+
+    def invalidate(self, model_versions: Optional[List[str]] = None) -> int:
+        """
+        Remove the entries of the given model versions, or of every model version
+        other than the current one. Returns the number of removed entries.
+        """
+        with self._lock, self._connection:
+            if model_versions is None:
+                cursor = self._connection.execute(
+                    "DELETE FROM predictions WHERE model_version != ?", [self.model_version])
+            else:
+                cursor = self._connection.executemany(
+                    "DELETE FROM predictions WHERE model_version = ?",
+                    [[version] for version in model_versions])
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, float]:
+        """The number of hits and misses and the hit rate."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
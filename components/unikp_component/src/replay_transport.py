@@ -0,0 +1,120 @@
+"""
+The ReplayTransport records the responses of an HTTP endpoint in a local SQLite database and
+replays them, so the components that call an endpoint can run offline and deterministically,
+e.g. to benchmark the throughput of the rest of the pipeline.
+
+- `live`: every request is sent to the endpoint.
+- `record`: every request is sent to the endpoint, the successful responses are stored.
+- `replay`: no request is sent, the stored response of the same request body is returned
+  after a synthetic latency. A request that was never recorded raises a LookupError.
+
+The responses are keyed by the namespace (the endpoint) and the SHA-256 hash of the request
+body, so a recording does not depend on the URL or the API key of the endpoint.
+
+This file is the same in the `src` folder of every component that uses it, every image only
+gets its own folder. Change it in `utils/replay_transport.py` and copy it to the components with
+`utils/sync_shared_modules.py`.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+TRANSPORT_MODES = ["live", "record", "replay"]
+
+
+def request_hash(payload: Any) -> str:
+    """The hash of a request body, independent of the order of its keys."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class ReplayTransport:
+    """
+    Wraps the calls to an endpoint with a record or replay of their responses. The latency of
+    a replayed response is the recorded latency, or `replay_latency` seconds when it is set.
+    """
+
+    def __init__(self, mode: str = "live", store_path: Optional[str] = None,
+                 namespace: str = "", replay_latency: Optional[float] = None):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"mode must be one of {TRANSPORT_MODES}")
+        if mode != "live" and not store_path:
+            raise ValueError(f"A store path is needed to {mode} the responses.")
+        self.mode = mode
+        self.namespace = namespace
+        self.replay_latency = replay_latency
+        self.recorded = 0
+        self.replayed = 0
+
+        self._lock = threading.Lock()
+        self._connection = None
+        if mode != "live":
+            self._connection = sqlite3.connect(store_path, check_same_thread=False, timeout=60)
+            with self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute(
+                    """CREATE TABLE IF NOT EXISTS responses (
+                        namespace TEXT NOT NULL,
+                        request_hash TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        latency REAL NOT NULL,
+                        recorded_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, request_hash)
+                    ) WITHOUT ROWID""")
+
+    def call(self, payload: Any, send: Callable[[], Any]) -> Any:
+        """Return the response of `send()` for the request body, or its recording."""
+        if self.mode == "replay":
+            response, latency = self._lookup(payload)
+            time.sleep(latency)
+            return response
+
+        start = time.perf_counter()
+        response = send()
+        self._store(payload, response, time.perf_counter() - start)
+        return response
+
+    async def acall(self, payload: Any, send: Callable[[], Awaitable[Any]]) -> Any:
+        """Like `call`, for a coroutine that sends the request."""
+        if self.mode == "replay":
+            response, latency = self._lookup(payload)
+            await asyncio.sleep(latency)
+            return response
+
+        start = time.perf_counter()
+        response = await send()
+        self._store(payload, response, time.perf_counter() - start)
+        return response
+
+    def _lookup(self, payload: Any) -> Tuple[Any, float]:
+        key = request_hash(payload)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, latency FROM responses WHERE namespace = ? "
+                "AND request_hash = ?", (self.namespace, key)).fetchone()
+            if row is not None:
+                self.replayed += 1
+        if row is None:
+            raise LookupError(f"No recorded {self.namespace} response for request {key}.")
+        latency = row[1] if self.replay_latency is None else self.replay_latency
+        return json.loads(row[0]), latency
+
+    def _store(self, payload: Any, response: Any, latency: float) -> None:
+        # failed requests (None) are not recorded, they are sent again in the next recording
+        if self.mode != "record" or response is None:
+            return
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, request_hash(payload), json.dumps(response), latency,
+                 time.time()))
+            self.recorded += 1
+
+    def close(self) -> None:
+        """Close the database of the recorded responses."""
+        if self._connection is not None:
+            self._connection.close()
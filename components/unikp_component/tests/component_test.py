@@ -0,0 +1,208 @@
+import json
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+import yaml
+from fondant.core.schema import Type
+
+from endpoint_warmer import WARMUP_SEQUENCE
+from hf_caller import HfCaller
+from prediction_cache import KineticPredictionCache
+from src.main import PredictEnyzmCharacteristicsComponent, parse_kinetic_prediction
+from tests.stub_server import StubUniKPServer, predict
+
+MOLECULES = {"acetic_acid": "CC(=O)O", "ethanol": "CCO"}
+
+
+@pytest.fixture
+def smiles_file(tmp_path):
+    path = tmp_path / "protein_smiles.json"
+    path.write_text(json.dumps(MOLECULES))
+    return str(path)
+
+
+def expected_records(sequence):
+    return [{"molecule": name, "smiles": smiles,
+             **parse_kinetic_prediction(predict({"sequence": sequence, "smiles": smiles}))}
+            for name, smiles in MOLECULES.items()]
+
+
+def create_component(monkeypatch, url, smiles_file, **kwargs):
+    monkeypatch.setenv("HF_API_KEY", "test")
+    monkeypatch.setenv("UNIKP_ENDPOINT_URL", url)
+    # the warm-up of the endpoint is tested in endpoint_warmer_test.py
+    kwargs.setdefault("warmup_timeout", 0)
+    return PredictEnyzmCharacteristicsComponent(smiles_file, **kwargs)
+
+
+def test_predicts_every_pair_once(monkeypatch, smiles_file):
+    dataframe = pd.DataFrame({"sequence": ["MKT", "MKTAY", "MKT"],
+                              "sequence_checksum": ["CRC1", "CRC2", "CRC1"]})
+
+    with StubUniKPServer() as server:
+        component = create_component(monkeypatch, server.url, smiles_file)
+        result = component.transform(dataframe)
+        component.caller.close()
+
+    # the duplicate sequence is only sent once
+    assert len(server.requests) == 4
+    assert result.at[1, "unikp_kinetic_prediction"] == expected_records("MKTAY")
+    assert result.at[0, "unikp_kinetic_prediction"] == result.at[2, "unikp_kinetic_prediction"]
+
+
+def test_retries_on_server_errors():
+    with StubUniKPServer(failures=2) as server:
+        caller = HfCaller(server.url, "test", max_retries=3, backoff=0.01)
+        assert caller.predict_kinetic_properties("MKT", "CCO") == \
+            predict({"sequence": "MKT", "smiles": "CCO"})
+        caller.close()
+
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_max_retries():
+    with StubUniKPServer(failures=10) as server:
+        caller = HfCaller(server.url, "test", max_retries=1, backoff=0.01)
+        assert caller.predict_kinetic_properties("MKT", "CCO") is None
+        caller.close()
+
+    assert len(server.requests) == 2
+
+
+def test_batches_pairs_when_accepted():
+    pairs = [("MKT" * i, "CCO") for i in range(1, 8)]
+
+    with StubUniKPServer(accept_batches=True) as server:
+        caller = HfCaller(server.url, "test", batch_size=3)
+        results = caller.predict_pairs(pairs)
+        caller.close()
+
+    assert len(server.requests) == 3
+    assert results == [predict({"sequence": s, "smiles": m}) for s, m in pairs]
+
+
+def test_falls_back_to_single_pairs():
+    pairs = [("MKT" * i, "CCO") for i in range(1, 8)]
+
+    with StubUniKPServer(accept_batches=False) as server:
+        caller = HfCaller(server.url, "test", batch_size=4, max_concurrency=1)
+        results = caller.predict_pairs(pairs)
+        assert not caller.batching_supported
+        # later calls do not try batches anymore
+        caller.predict_pairs(pairs[:2])
+        caller.close()
+
+    assert results == [predict({"sequence": s, "smiles": m}) for s, m in pairs]
+    assert sum(isinstance(r["inputs"], list) for r in server.requests) <= 2
+
+
+def test_keeps_batching_when_a_batch_exhausts_its_retries():
+    pairs = [("MKT" * i, "CCO") for i in range(1, 5)]
+
+    with StubUniKPServer(failures=2, accept_batches=True) as server:
+        caller = HfCaller(server.url, "test", batch_size=4, max_retries=1, backoff=0.01)
+        assert caller.predict_pairs(pairs) == [None] * 4
+        assert caller.batching_supported
+        results = caller.predict_pairs(pairs)
+        caller.close()
+
+    # no single pairs are sent to the failing endpoint
+    assert all(isinstance(r["inputs"], list) for r in server.requests)
+    assert len(server.requests) == 3
+    assert results == [predict({"sequence": s, "smiles": m}) for s, m in pairs]
+
+
+def test_cache_only_sends_misses(monkeypatch, smiles_file, tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite")
+    first = pd.DataFrame({"sequence": ["MKT", "MKTAY"], "sequence_checksum": ["CRC1", "CRC2"]})
+    second = pd.DataFrame({"sequence": ["MKTAY", "MKTAYIAK"],
+                           "sequence_checksum": ["CRC2", "CRC3"]})
+
+    with StubUniKPServer() as server:
+        component = create_component(monkeypatch, server.url, smiles_file, cache_path=cache_path)
+        component.transform(first)
+        component.caller.close()
+        component.cache.close()
+        assert len(server.requests) == 4
+
+        # a new run (new component) only predicts the new sequence
+        component = create_component(monkeypatch, server.url, smiles_file, cache_path=cache_path)
+        result = component.transform(second)
+        component.caller.close()
+
+    assert len(server.requests) == 6
+    assert component.cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+    assert result.at[0, "unikp_kinetic_prediction"] == expected_records("MKTAY")
+
+
+def test_cache_ttl_and_model_version(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = KineticPredictionCache(path, "v1", ttl_days=1)
+    cache.put_many({("CRC1", "CCO"): {"Km": 1.0}})
+    assert cache.get_many([("CRC1", "CCO"), ("CRC1", "CO")]) == {("CRC1", "CCO"): {"Km": 1.0}}
+
+    # another model version does not see the entry, until it is invalidated
+    other_version = KineticPredictionCache(path, "v2", ttl_days=1)
+    assert other_version.get_many([("CRC1", "CCO")]) == {}
+    assert other_version.invalidate() == 1
+    assert cache.get_many([("CRC1", "CCO")]) == {}
+
+    # expired entries are ignored
+    cache.put_many({("CRC1", "CCO"): {"Km": 1.0}})
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.get_many([("CRC1", "CCO")]) == {}
+    assert cache.purge_expired() == 1
+
+
+def test_parse_kinetic_prediction():
+    assert parse_kinetic_prediction({"Km": 2, "Kcat": "5", "Vmax": 1.0}) == {
+        "km": 2.0, "kcat": 5.0, "kcat_km": 2.5, "vmax": 1.0}
+    assert parse_kinetic_prediction({"km": 2, "kcat": 5, "kcat/Km": 3}) == {
+        "km": 2.0, "kcat": 5.0, "kcat_km": 3.0, "vmax": None}
+    assert parse_kinetic_prediction({"Km": "n/a", "Kcat": float("nan")}) == {
+        "km": None, "kcat": None, "kcat_km": None, "vmax": None}
+
+
+def test_failed_predictions_are_null_and_match_the_spec(monkeypatch, smiles_file):
+    dataframe = pd.DataFrame({"sequence": ["MKT"], "sequence_checksum": ["CRC1"]})
+
+    with StubUniKPServer(failures=100) as server:
+        component = create_component(monkeypatch, server.url, smiles_file, max_retries=0)
+        result = component.transform(dataframe)
+        component.caller.close()
+
+    records = result.at[0, "unikp_kinetic_prediction"]
+    assert [record["molecule"] for record in records] == list(MOLECULES)
+    assert all(record["km"] is None and record["kcat_km"] is None for record in records)
+
+    with open("fondant_component.yaml") as f:
+        spec = yaml.safe_load(f)["produces"]["unikp_kinetic_prediction"]
+    column = pa.array(result["unikp_kinetic_prediction"], type=Type.from_dict(spec).value)
+    assert column.null_count == 0
+    assert column.flatten().field("km").null_count == len(MOLECULES)
+
+
+def test_component_waits_for_the_endpoint_when_it_has_pairs_to_send(monkeypatch, smiles_file,
+                                                                    tmp_path):
+    def partition(sequence):
+        return pd.DataFrame({"sequence": [sequence], "sequence_checksum": [f"CRC-{sequence}"]})
+
+    with StubUniKPServer(failures=2) as server:
+        component = create_component(monkeypatch, server.url, smiles_file, warmup_timeout=10,
+                                     cache_path=str(tmp_path / "cache.sqlite"))
+        assert not server.requests
+
+        # the warm-up probes the endpoint until it answers, before the first batch is sent
+        component.transform(partition("MKT"))
+        assert len(server.requests) == 3 + len(MOLECULES)
+        assert server.requests[0]["inputs"]["sequence"] == WARMUP_SEQUENCE
+
+        # a partition of cache hits sends nothing, a later partition does not wait again
+        component.transform(partition("MKT"))
+        component.transform(partition("MKTAY"))
+        component.caller.close()
+
+    assert len(server.requests) == 3 + 2 * len(MOLECULES)
@@ -0,0 +1,71 @@
+import json
+import time
+
+import endpoint_warmer
+from endpoint_warmer import ENDPOINTS, EndpointWarmer, trigger_endpoints
+from tests.stub_server import StubUniKPServer
+
+
+def create_warmer(url, **kwargs):
+    return EndpointWarmer("unikp", url, "test", ENDPOINTS["unikp"][1],
+                          min_poll_interval=0.01, **kwargs)
+
+
+def test_polls_until_the_endpoint_is_warm(tmp_path):
+    history_path = str(tmp_path / "history.json")
+
+    # a cold endpoint answers with a 503 while it scales up
+    with StubUniKPServer(failures=3) as server:
+        assert create_warmer(server.url, history_path=history_path).wait_until_warm()
+
+    assert len(server.requests) == 4
+    with open(history_path) as file:
+        [entry] = json.load(file)["unikp"]
+    assert entry["warm"] and entry["probes"] == 4
+
+
+def test_gives_up_after_the_timeout():
+    with StubUniKPServer(failures=1000) as server:
+        warmer = create_warmer(server.url, timeout=0.1, max_poll_interval=0.02)
+        assert not warmer.wait_until_warm()
+
+    assert warmer.history()[-1]["warm"] is False
+
+
+def test_latency_slo_and_rolling_history(tmp_path):
+    history_path = str(tmp_path / "history.json")
+
+    with StubUniKPServer() as server:
+        # a warm endpoint that answers slower than the SLO is not warm yet
+        slow = create_warmer(server.url, latency_slo=0, timeout=0.05, history_path=history_path)
+        assert not slow.wait_until_warm()
+
+        warmer = create_warmer(server.url, history_path=history_path, history_size=3)
+        for _ in range(5):
+            assert warmer.wait_until_warm()
+
+    assert len(warmer.history()) == 3
+    assert all(entry["warm"] for entry in warmer.history())
+
+
+
+def test_trigger_does_not_wait_for_the_answer():
+    with StubUniKPServer(delay=1) as server:
+        start = time.perf_counter()
+        thread = create_warmer(server.url).trigger()
+        assert time.perf_counter() - start < 0.5
+
+        thread.join()
+    assert len(server.requests) == 1
+
+
+def test_a_process_triggers_an_endpoint_once(monkeypatch):
+    monkeypatch.setattr(endpoint_warmer, "_triggered", set())
+    monkeypatch.delenv("ESMFOLD_ENDPOINT_URL", raising=False)
+    with StubUniKPServer() as server:
+        monkeypatch.setenv("UNIKP_ENDPOINT_URL", server.url)
+        threads = trigger_endpoints(["unikp"]) + trigger_endpoints(["unikp"])
+        assert len(threads) == 1 and not threads[0].daemon
+
+        threads[0].join()
+    assert len(server.requests) == 1
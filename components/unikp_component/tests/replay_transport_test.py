@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from hf_caller import HfCaller
+from replay_transport import ReplayTransport, request_hash
+from tests.stub_server import StubUniKPServer, predict
+
+PAIRS = [("MKT", "CCO"), ("MKTAY", "CCO"), ("MKTAY", "CC(=O)O")]
+
+
+def test_replays_the_recorded_responses_offline(tmp_path):
+    store_path = str(tmp_path / "responses.sqlite")
+
+    with StubUniKPServer() as server:
+        recorder = ReplayTransport("record", store_path, "unikp")
+        caller = HfCaller(server.url, "test", transport=recorder)
+        recorded = caller.predict_pairs(PAIRS)
+        caller.close()
+    assert recorder.recorded == len(PAIRS)
+
+    # no endpoint and no API key are needed to replay
+    replayer = ReplayTransport("replay", store_path, "unikp", replay_latency=0)
+    caller = HfCaller(transport=replayer)
+    assert caller.predict_pairs(PAIRS) == recorded == [predict({"sequence": s, "smiles": m})
+                                                       for s, m in PAIRS]
+    caller.close()
+    assert replayer.replayed == len(PAIRS)
+
+
+def test_unrecorded_requests_fail_in_replay(tmp_path):
+    transport = ReplayTransport("replay", str(tmp_path / "responses.sqlite"), "unikp")
+    with pytest.raises(LookupError):
+        transport.call({"inputs": "MKT"}, lambda: pytest.fail("no request is sent in replay"))
+
+
+def test_replay_latency_and_failed_responses(tmp_path):
+    store_path = str(tmp_path / "responses.sqlite")
+    recorder = ReplayTransport("record", store_path, "esmfold")
+    recorder.call({"inputs": "MKT"}, lambda: "PDB")
+    # failed requests are not recorded
+    recorder.call({"inputs": "MKTAY"}, lambda: None)
+
+    replayer = ReplayTransport("replay", store_path, "esmfold", replay_latency=0.05)
+    start = time.perf_counter()
+    assert replayer.call({"inputs": "MKT"}, lambda: None) == "PDB"
+    assert time.perf_counter() - start >= 0.05
+    with pytest.raises(LookupError):
+        replayer.call({"inputs": "MKTAY"}, lambda: None)
+    # the recordings of other endpoints are not replayed
+    with pytest.raises(LookupError):
+        ReplayTransport("replay", store_path, "unikp").call({"inputs": "MKT"}, lambda: None)
+
+
+def test_request_hash_ignores_the_order_of_keys():
+    assert request_hash({"inputs": {"sequence": "MKT", "smiles": "CCO"}}) == \
+        request_hash({"inputs": {"smiles": "CCO", "sequence": "MKT"}})
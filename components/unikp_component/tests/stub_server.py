@@ -0,0 +1,68 @@
+"""A local stub of the UniKP endpoint for the tests."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def predict(inputs):
+    return {"Km": len(inputs["sequence"]), "Kcat": len(inputs["smiles"]), "Vmax": 1.0}
+
+
+class StubUniKPServer:
+    """
+    Serves deterministic predictions. The first `failures` requests answer with a 503,
+    a list of inputs is only accepted when `accept_batches` is set, and every answer takes
+    at least `delay` seconds.
+    """
+
+    def __init__(self, failures=0, accept_batches=False, delay=0):
+        self.failures = failures
+        self.accept_batches = accept_batches
+        self.delay = delay
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, answer = server.answer(body)
+                payload = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *_):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def answer(self, body):
+        time.sleep(self.delay)
+        with self.lock:
+            self.requests.append(body)
+            if self.failures > 0:
+                self.failures -= 1
+                return 503, {"error": "model is loading"}
+
+        inputs = body["inputs"]
+        if isinstance(inputs, list):
+            if not self.accept_batches:
+                return 400, {"error": "inputs must be an object"}
+            return 200, [predict(pair) for pair in inputs]
+        return 200, predict(inputs)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.httpd.shutdown()
+        self.httpd.server_close()
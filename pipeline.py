@@ -22,30 +22,42 @@ dataset = pipeline.read(
 
 
 _ = dataset.apply(
-    "./components/biopython_component"
-).apply(
-    "./components/generate_protein_sequence_checksum_component"
+    # the features of the biopython, checksum, iFeatureOmega and peptide features components
+    # in one process, see the readme of the component
+    "./components/sequence_features_component",
+    arguments={
+        "ifeature_descriptors": ["AAC", "CTDC", "CTDT"]
+    }
 ).apply(
-    "./components/iFeatureOmega_component",
-    # currently forcing the number of rows to 5, but there needs to be a better way to do this, see readme for more info
-    input_partition_rows=5,
+    # partitions of similar cost instead of a fixed number of rows, see readme for more info
+    "./components/partition_by_length_component",
     arguments={
-        "descriptors": ["AAC", "CTDC", "CTDT"]
+        "max_residues_per_partition": 20000,
+        "isolate_length": 2000,
     }
 ).apply(
     "./components/filter_pdb_component",
     arguments={
+        # only pass a reference to the structures in the store, see readme for more info
+        "pass_by_reference": True,
         "method": "local",
         "local_pdb_path": "/data/pdb_files",
         "bucket_name": "elated-chassis-400207_dbtl_pipeline_outputs",
         "project_id": "elated-chassis-400207",
-        "google_cloud_credentials_path": "/data/google_cloud_credentials.json"
+        "google_cloud_credentials_path": "/data/google_cloud_credentials.json",
+        # ESMFold scales up while the structures are looked up, see readme for more info
+        "trigger_endpoints": ["esmfold"],
     }
 ).apply(
     "./components/predict_protein_3D_structure_component",
+    arguments={
+        # waits until the endpoint is warm before the first batch it sends, see readme
+        "warmup_history_path": "/data/endpoint_history.json",
+    }
 ).apply(
     "./components/store_pdb_component",
     arguments={
+        "pass_by_reference": True,
         "method": "local",
         "local_pdb_path": "/data/pdb_files/",
         "bucket_name": "elated-chassis-400207_dbtl_pipeline_outputs",
@@ -55,16 +67,37 @@ _ = dataset.apply(
 ).apply(
     "./components/msa_component",
 ).apply(
+    # the structures are much larger than the sequences, cap their size per partition
+    "./components/partition_by_length_component",
+    consumes={
+        "sequence": pa.string(),
+        "pdb_size": pa.int64(),
+    },
+    arguments={
+        "max_residues_per_partition": 20000,
+        "bytes_column": "pdb_size",
+        "max_bytes_per_partition": 64 * 1024 ** 2,
+    }
+).apply(
+    # fetches the structures passed by reference from the structure store
     "./components/pdb_features_component",
-    # currently forcing the number of rows to 5, but there needs to be a better way to do this, see readme for more info
-    input_partition_rows=5,
+    arguments={
+        "method": "local",
+        "local_pdb_path": "/data/pdb_files/",
+        # UniKP scales up while the structure features are calculated
+        "trigger_endpoints": ["unikp"],
+    }
 ).apply(
     "./components/unikp_component",
     arguments={
-        "protein_smiles_path": "/data/protein_smiles.json",
+        "target_molecule_smiles": "/data/protein_smiles.json",
+        "cache_path": "/data/unikp_cache.sqlite",
+        "warmup_history_path": "/data/endpoint_history.json",
     },
 ).apply(
-    "./components/peptide_features_component"
-).apply(
-    "./components/deepTMpred_component"
+    "./components/DeepTMpred_component",
+    arguments={
+        # only the sequences that were not predicted before run the model
+        "feature_cache_path": "/data/feature_cache.sqlite",
+    },
 )
@@ -0,0 +1,276 @@
+"""
+Benchmarks the `transform` of the components on synthetic partitions of increasing size, and
+flags the regressions against stored baselines.
+
+Every case (component, rows, sequence length) runs in a fresh process from the `src` folder
+of the component, like a worker of its Docker image. The component is created once, then
+its transform runs on one partition of all rows and on single rows to measure:
+
+- rows/s and residues/s of the whole partition
+- the per-row latency percentiles (p50, p95, p99) of single-row partitions
+- the peak RSS of the process, and its growth during the transforms, measured after the
+  synthetic partitions are built
+
+The consumed columns of a partition follow the `fondant_component.yaml` of the component:
+random sequences (see `generate_mock_data.py`), their checksums, and helix or coil structures
+for `pdb_string`. A case that
+times out skips the larger partitions of the same sequence length.
+
+Usage:
+    python utils/benchmark_components.py --components biopython_component --rows 10 1000
+    python utils/benchmark_components.py --save-baseline
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess  # nosec
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from generate_mock_data import SequenceGenerator, synthetic_pdb
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "benchmark_baselines.json")
+
+DEFAULT_COMPONENTS = ["biopython_component", "iFeatureOmega_component",
+                      "pdb_features_component", "DeepTMpred_component",
+                      "sequence_features_component"]
+DEFAULT_ROWS = [10, 100, 1000, 10000, 100000]
+DEFAULT_LENGTHS = [50, 250, 1000, 2500]
+# the metrics compared with the baseline, and whether higher is better. The peak RSS also
+# holds the synthetic partitions, the growth of the RSS during the transforms is compared
+METRICS = {"rows_per_s": True, "residues_per_s": True, "latency_p95_ms": False,
+           "transform_rss_growth_mb": False}
+# the lowest baseline a metric is compared with, a smaller growth of the RSS is noise of the
+# allocator and often 0
+METRIC_FLOORS = {"transform_rss_growth_mb": 16}
+
+
+def synthetic_partition(columns: Dict[str, Any], rows: int, length: int,
+                        seed: int = 0) -> pd.DataFrame:
+    """
+    A partition with the consumed columns of a component: sequences of about `length`
+    residues, their checksums and structures. Other columns are empty.
+    """
+    generator = SequenceGenerator(rows, min_length=max(1, int(length * 0.8)),
+                                  max_length=int(length * 1.2), length_distribution="uniform",
+                                  seed=seed)
+    sequences = next(generator.batches(rows))["sequence"].tolist()
+
+    data = {}
+    for name, field in columns.items():
+        if name in ("sequence", "msa_sequence"):
+            data[name] = sequences
+        elif name == "sequence_checksum":
+            data[name] = [hashlib.sha1(sequence.encode(), usedforsecurity=False)
+                          .hexdigest()[:16].upper() for sequence in sequences]
+        elif name == "pdb_string":
+            data[name] = [synthetic_pdb(sequence) for sequence in sequences]
+        else:
+            data[name] = ["" if pa.types.is_string(field.type.value) else 0] * rows
+    # the columns have the types of the columns read by Fondant
+    return pd.DataFrame(data, index=pd.Index([f"id_{i}" for i in range(rows)], name="id")) \
+        .astype({name: pd.ArrowDtype(field.type.value) for name, field in columns.items()})
+
+
+def rss_mb() -> float:
+    """The peak RSS of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if platform.system() == "Darwin" else peak / 1024
+
+
+def run_case(component: str, rows: int, length: int, latency_samples: int,
+             arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one case in this process, called from the `src` folder of the component."""
+    from run_local import LocalStage  # pylint: disable=import-outside-toplevel
+
+    stage = LocalStage(os.path.join("components", component), None, None, arguments)
+    start = time.perf_counter()
+    instance = stage.load_component()
+    setup_s = time.perf_counter() - start
+
+    consumes = stage.operation_spec.operation_consumes
+    partition = synthetic_partition(consumes, rows, length)
+    samples = synthetic_partition(consumes, min(latency_samples, rows), length, seed=1)
+    residues = int(partition["sequence"].str.len().sum())
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    instance.transform(partition.copy())
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for i in range(len(samples)):
+        start = time.perf_counter()
+        instance.transform(samples.iloc[i:i + 1].copy())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {"component": component, "rows": rows, "length": length,
+            "residues": residues, "setup_s": setup_s, "transform_s": elapsed,
+            "rows_per_s": rows / elapsed, "residues_per_s": residues / elapsed,
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p95_ms": float(np.percentile(latencies, 95)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+            "peak_rss_mb": rss_mb(), "transform_rss_growth_mb": rss_mb() - rss_before}
+
+
+def benchmark(component: str, rows: int, length: int, latency_samples: int,
+              arguments: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Run one case in a fresh process. Returns the result, or the error of the case."""
+    case = {"component": component, "rows": rows, "length": length}
+    command = [sys.executable, os.path.abspath(__file__), "--case", json.dumps(
+        {**case, "latency_samples": latency_samples, "arguments": arguments})]
+    try:
+        process = subprocess.run(command, cwd=os.path.join(ROOT_PATH, "components", component,
+                                                           "src"),
+                                 capture_output=True, text=True, timeout=timeout, check=False)
+    except subprocess.TimeoutExpired:
+        return {**case, "error": f"timeout after {timeout:.0f}s"}
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        return {**case, "error": error[-1] if error else f"exit code {process.returncode}"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def case_key(result: Dict[str, Any]) -> str:
+    return f"{result['rows']}x{result['length']}"
+
+
+def compare(results: List[Dict[str, Any]], baselines: Dict[str, Any],
+            threshold: float) -> List[str]:
+    """
+    The metrics that are more than `threshold` (a fraction) worse than the baseline. Cases and
+    metrics without a baseline are not compared, and neither are metrics with a baseline of 0
+    that have no floor in `METRIC_FLOORS`.
+    """
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result["component"], {}).get(case_key(result))
+        if baseline is None or "error" in result:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if baseline.get(metric) is None:
+                continue
+            reference = max(baseline[metric], METRIC_FLOORS.get(metric, 0))
+            if not reference:
+                continue
+            ratio = result[metric] / reference
+            if (ratio < 1 - threshold) if higher_is_better else (ratio > 1 + threshold):
+                regressions.append(f"{result['component']} {case_key(result)}: {metric} "
+                                   f"{result[metric]:.4g} vs baseline {baseline[metric]:.4g}")
+    return regressions
+
+
+def save_baselines(results: List[Dict[str, Any]], path: str) -> None:
+    """Store the metrics of the cases that ran, next to the baselines of the other cases."""
+    baselines = {}
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            baselines = json.load(file)
+    for result in results:
+        if "error" not in result:
+            baselines.setdefault(result["component"], {})[case_key(result)] = {
+                metric: result[metric] for metric in METRICS}
+    baselines["machine"] = {"platform": platform.platform(), "processor": platform.processor(),
+                            "cpu_count": os.cpu_count()}
+    with open(path, "w") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'component':<32}{'rows':>8}{'length':>8}{'rows/s':>12}{'residues/s':>13}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'+RSS MB':>9}")
+    for result in results:
+        prefix = f"{result['component']:<32}{result['rows']:>8}{result['length']:>8}"
+        if "error" in result:
+            print(f"{prefix}  {result['error']}")
+            continue
+        print(f"{prefix}{result['rows_per_s']:>12.1f}{result['residues_per_s']:>13.0f}"
+              f"{result['latency_p50_ms']:>9.2f}{result['latency_p95_ms']:>9.2f}"
+              f"{result['latency_p99_ms']:>9.2f}{result['peak_rss_mb']:>9.0f}"
+              f"{result['transform_rss_growth_mb']:>9.0f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", nargs="+", default=DEFAULT_COMPONENTS)
+    parser.add_argument("--rows", nargs="+", type=int, default=DEFAULT_ROWS,
+                        help="The numbers of rows of the partitions")
+    parser.add_argument("--lengths", nargs="+", type=int, default=DEFAULT_LENGTHS,
+                        help="The mean sequence lengths of the partitions")
+    parser.add_argument("--latency-samples", type=int, default=20,
+                        help="The number of single-row partitions to measure the latency")
+    parser.add_argument("--arguments", type=json.loads, default={},
+                        help="The arguments per component, e.g. "
+                             "'{\"DeepTMpred_component\": {\"max_tokens\": 4096}}'")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="The number of seconds per case")
+    parser.add_argument("--output", help="A json lines file to append the results to")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as the baseline instead of comparing them")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="The fraction a metric may be worse than the baseline")
+    parser.add_argument("--case", type=json.loads, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.case:
+        # a single case, in the process started by `benchmark`
+        print(json.dumps(run_case(**args.case)))
+        return
+
+    results = []
+    for component in args.components:
+        for length in sorted(args.lengths):
+            for rows in sorted(args.rows):
+                result = benchmark(component, rows, length, args.latency_samples,
+                                   args.arguments.get(component, {}), args.timeout)
+                results.append(result)
+                logging.info("%s %s: %s", component, case_key(result),
+                             result.get("error") or f"{result['rows_per_s']:.1f} rows/s")
+                if "error" in result:
+                    # the larger partitions of this length will fail as well
+                    break
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "a") as file:
+            for result in results:
+                file.write(json.dumps({**result, "time": time.time()}) + "\n")
+
+    if args.save_baseline:
+        save_baselines(results, args.baseline)
+        return
+    baselines: Optional[Dict[str, Any]] = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as file:
+            baselines = json.load(file)
+    regressions = compare(results, baselines or {}, args.threshold)
+    for regression in regressions:
+        logging.error("Regression: %s", regression)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
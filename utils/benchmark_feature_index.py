@@ -0,0 +1,194 @@
+"""
+Benchmarks the lookups of the feature index (see `feature_index.py`) on synthetic pipeline
+outputs of increasing size, against a filtered scan of the Parquet output.
+
+For every size, a Parquet folder with the Fondant index, random checksums and sequences and
+`--feature-columns` float features is written in batches, and the index is built from it.
+Then the latencies of these lookups are measured on random rows of the output:
+
+- point: `get` of one checksum with all columns, and with `--projection` columns
+- batch: `get` of `--batch-size` checksums with `--projection` columns
+- name: `get_by_name` of one name with all columns
+- scan: a filtered scan of the Parquet output for one checksum, the lookup without the index
+
+The output and the index are read from the page cache of the OS once they are written. The
+open time is the time of a new `FeatureIndex` that preloads its shards, and its first lookup.
+
+Usage:
+    python utils/benchmark_feature_index.py --rows 100000 1000000 10000000
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from feature_index import (DEFAULT_ROW_GROUP_SIZE, DEFAULT_SHARD_ROWS, FeatureIndex,
+                           build_index, load_output)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+AMINO_ACIDS = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)
+
+
+def write_output(path: str, rows: int, feature_columns: int, sequence_length: int,
+                 batch_size: int, samples: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Write a synthetic pipeline output of `rows` rows to a Parquet folder, one file per batch.
+    Returns the checksums and names of `samples` random rows.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    sampled = []
+    for number, start in enumerate(range(0, rows, batch_size)):
+        size = min(batch_size, rows - start)
+        residues = AMINO_ACIDS[rng.integers(0, len(AMINO_ACIDS), (size, sequence_length))]
+        data = {
+            "id": [f"id_{i}" for i in range(start, start + size)],
+            "sequence_checksum": [f"CRC-{value:016X}" for value in
+                                  rng.integers(0, 2 ** 63, size, dtype=np.int64)],
+            "sequence": residues.view(f"S{sequence_length}").ravel().astype(str),
+        }
+        data.update({f"feature_{i}": rng.random(size) for i in range(feature_columns)})
+        batch = pd.DataFrame(data).set_index("id")
+        pq.write_table(pa.Table.from_pandas(batch), os.path.join(path, f"part.{number}.parquet"))
+        sampled.append(batch.reset_index()[["id", "sequence_checksum"]].sample(
+            max(1, samples * size // rows), random_state=number))
+    return pd.concat(sampled).sample(frac=1, random_state=seed).head(samples)
+
+
+def latencies(function: Callable[[Any], Any], arguments: List[Any]) -> Dict[str, float]:
+    """The p50, p95 and p99 latency in ms of the calls of the function."""
+    times = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        times.append((time.perf_counter() - start) * 1000)
+    return {f"p{q}": float(np.percentile(times, q)) for q in (50, 95, 99)}
+
+
+def folder_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names) / 1024 ** 2
+
+
+def run(rows: int, args: argparse.Namespace, work_dir: str) -> Dict[str, Any]:
+    """Write the output of one size, build its index and measure the lookups."""
+    output_path = os.path.join(work_dir, f"output-{rows}")
+    index_path = os.path.join(work_dir, f"index-{rows}")
+
+    start = time.perf_counter()
+    sample = write_output(output_path, rows, args.feature_columns, args.sequence_length,
+                          args.write_batch_size, args.lookups)
+    write_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_index(load_output(input_path=output_path), index_path, rows,
+                shard_rows=args.shard_rows, row_group_size=args.row_group_size)
+    build_s = time.perf_counter() - start
+
+    checksums = sample["sequence_checksum"].tolist()
+    names = sample["id"].tolist()
+    projection = [f"feature_{i}" for i in range(min(args.projection, args.feature_columns))]
+
+    start = time.perf_counter()
+    index = FeatureIndex(index_path, preload=True)
+    assert len(index.get(checksums[:1])) >= 1
+    open_ms = (time.perf_counter() - start) * 1000
+
+    batches = [checksums[i:i + args.batch_size]
+               for i in range(0, len(checksums), args.batch_size)]
+    result = {
+        "rows": rows, "write_s": write_s, "build_s": build_s,
+        "output_mb": folder_mb(output_path), "index_mb": folder_mb(index_path),
+        "open_ms": open_ms,
+        "point": latencies(lambda checksum: index.get([checksum]), checksums),
+        "point_projected": latencies(lambda checksum: index.get([checksum], projection),
+                                     checksums),
+        "batch": latencies(lambda batch: index.get(batch, projection), batches),
+        "name": latencies(lambda name: index.get_by_name([name]), names),
+    }
+
+    dataset = ds.dataset(output_path, format="parquet")
+    result["scan"] = latencies(
+        lambda checksum: dataset.to_table(filter=ds.field("sequence_checksum") == checksum),
+        checksums[:args.scan_samples])
+
+    if not args.keep:
+        shutil.rmtree(output_path)
+        shutil.rmtree(index_path)
+    return result
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'rows':>10}{'build s':>9}{'index MB':>10}{'open ms':>9}"
+          f"{'point p50/p99 ms':>18}{'projected':>14}{'batch':>16}{'name':>14}{'scan p50 ms':>13}")
+    for result in results:
+        print(f"{result['rows']:>10}{result['build_s']:>9.1f}{result['index_mb']:>10.0f}"
+              f"{result['open_ms']:>9.1f}"
+              + "".join(f"{result[name]['p50']:>9.2f}/{result[name]['p99']:<.2f}".rjust(width)
+                        for name, width in [("point", 18), ("point_projected", 14),
+                                            ("batch", 16), ("name", 14)])
+              + f"{result['scan']['p50']:>13.0f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", type=int, default=[100000, 1000000, 10000000],
+                        help="The numbers of rows of the outputs")
+    parser.add_argument("--feature-columns", type=int, default=100)
+    parser.add_argument("--sequence-length", type=int, default=350)
+    parser.add_argument("--lookups", type=int, default=1000,
+                        help="The number of random rows that are looked up")
+    parser.add_argument("--projection", type=int, default=5,
+                        help="The number of feature columns of a projected lookup")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="The number of checksums of a batched lookup")
+    parser.add_argument("--scan-samples", type=int, default=3,
+                        help="The number of lookups with a scan of the output")
+    parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS)
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    parser.add_argument("--write-batch-size", type=int, default=250_000,
+                        help="The number of rows per file of the output")
+    parser.add_argument("--work-dir", help="The folder of the outputs and indexes, a "
+                                           "temporary folder by default")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the outputs and indexes after the benchmark")
+    parser.add_argument("--output", help="A json lines file to append the results to")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="feature-index-benchmark-")
+    results = []
+    for rows in sorted(args.rows):
+        result = run(rows, args, work_dir)
+        results.append(result)
+        logging.info("%s rows: built in %.1fs, point lookup p50 %.2f ms", rows,
+                     result["build_s"], result["point"]["p50"])
+        if args.output:
+            with open(args.output, "a") as file:
+                file.write(json.dumps({**result, "time": time.time()}) + "\n")
+
+    print_results(results)
+    if not args.work_dir and not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
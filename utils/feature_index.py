@@ -0,0 +1,357 @@
+"""
+The feature index answers "all features of protein X" in milliseconds, without scanning the
+Parquet output of the pipeline. It is built once after a run:
+
+    python utils/feature_index.py build --manifest <manifest.json of the last component> \\
+        --output /data/feature_index
+
+and read with `FeatureIndex`:
+
+    index = FeatureIndex("/data/feature_index")
+    index.get(["CRC-..."], columns=["tmh_num_helices", "isoelectric_point"])
+    index.get_by_name(["id_1"])
+
+The rows are stored in Parquet shards, sorted by a 64-bit hash of the `sequence_checksum`.
+The first bits of the hash select the shard, and the min/max statistics of the hash column
+select the row groups of a shard, so a lookup only reads the row groups (and the columns)
+that hold the requested rows. The names (the Fondant `id` by default) are in a compact hash
+index next to the shards: the sorted hashes of the names and the hash of the checksum of
+their row, 16 bytes per row, memory-mapped.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+METADATA_FILE = "index.json"
+HASH_COLUMN = "_key_hash"
+DEFAULT_INDEX_NAME = "id"
+# the row groups are the unit of a read, small row groups keep a point lookup cheap
+DEFAULT_ROW_GROUP_SIZE = 1024
+DEFAULT_SHARD_ROWS = 1_000_000
+
+
+def key_hashes(values: Iterable[Any]) -> np.ndarray:
+    """The 64-bit hashes of the keys, the same in every process and version of Python."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+         for value in values), dtype=np.uint64)
+
+
+def shards_of(hashes: np.ndarray, shard_bits: int) -> np.ndarray:
+    """The shard of every hash: its first `shard_bits` bits."""
+    if shard_bits == 0:
+        return np.zeros(len(hashes), dtype=np.uint64)
+    return hashes >> np.uint64(64 - shard_bits)
+
+
+def shard_path(path: str, shard: int) -> str:
+    return os.path.join(path, f"shard-{shard:05d}.parquet")
+
+
+def load_output(manifest_path: Optional[str] = None, input_path: Optional[str] = None):
+    """
+    The output of a pipeline as a Dask dataframe with the Fondant index, from the manifest of
+    a component (the fields are merged from the locations where they were written, like
+    Fondant loads them) or from a Parquet file or folder.
+    """
+    # pylint: disable=import-outside-toplevel
+    import dask.dataframe as dd
+
+    if input_path is not None:
+        return dd.read_parquet(input_path, dtype_backend="pyarrow")
+
+    from fondant.core.manifest import Manifest
+    manifest = Manifest.from_file(manifest_path)
+    locations: Dict[str, List[str]] = {manifest.get_field_location(DEFAULT_INDEX_NAME): []}
+    for name in manifest.fields:
+        if name != DEFAULT_INDEX_NAME:
+            locations.setdefault(manifest.get_field_location(name), []).append(name)
+
+    dataframe = None
+    for location, fields in locations.items():
+        partial = dd.read_parquet(location, columns=fields, index=DEFAULT_INDEX_NAME,
+                                  calculate_divisions=True, dtype_backend="pyarrow")
+        dataframe = partial if dataframe is None else dataframe.merge(
+            partial, how="left", left_index=True, right_index=True)
+    return dataframe
+
+
+def count_rows(manifest_path: Optional[str] = None, input_path: Optional[str] = None) -> int:
+    """The number of rows of the output, from the Parquet metadata of the index."""
+    # pylint: disable=import-outside-toplevel
+    import pyarrow.dataset as ds
+
+    if input_path is None:
+        from fondant.core.manifest import Manifest
+        input_path = Manifest.from_file(manifest_path).get_field_location(DEFAULT_INDEX_NAME)
+    return ds.dataset(input_path, format="parquet").count_rows()
+
+
+def build_index(dataframe, output: str, rows: int, key_column: str = "sequence_checksum",
+                name_column: Optional[str] = DEFAULT_INDEX_NAME,
+                shard_rows: int = DEFAULT_SHARD_ROWS,
+                row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict[str, Any]:
+    """
+    Write the index of a Dask dataframe to the output folder, one partition in memory at a
+    time: the partitions are first split by shard, then every shard is sorted and written.
+    Returns the metadata of the index.
+    """
+    shard_bits = max(0, math.ceil(math.log2(max(1, math.ceil(rows / shard_rows)))))
+    os.makedirs(output, exist_ok=True)
+    if os.path.exists(os.path.join(output, METADATA_FILE)):
+        os.remove(os.path.join(output, METADATA_FILE))
+    scratch_dir = tempfile.mkdtemp(prefix="feature-index-", dir=output)
+
+    schema = None
+    name_hashes, name_keys = [], []
+    try:
+        for number in range(dataframe.npartitions):
+            partition = dataframe.get_partition(number).compute()
+            if partition.index.name is not None:
+                partition = partition.reset_index()
+            table = pa.Table.from_pandas(partition, preserve_index=False)
+            # every partition gets the types of the first one, e.g. for columns without values
+            schema = schema or table.schema
+            table = table.cast(schema)
+
+            hashes = key_hashes(partition[key_column])
+            table = table.append_column(HASH_COLUMN, pa.array(hashes, pa.uint64()))
+            if name_column:
+                name_hashes.append(key_hashes(partition[name_column]))
+                name_keys.append(hashes)
+
+            shards = shards_of(hashes, shard_bits)
+            for shard in np.unique(shards):
+                pq.write_table(table.filter(pa.array(shards == shard)),
+                               os.path.join(scratch_dir, f"{shard:05d}.{number:06d}.parquet"))
+            logger.info("Split partition %s of %s, %s rows", number + 1, dataframe.npartitions,
+                        len(partition))
+
+        total = 0
+        for shard in range(2 ** shard_bits):
+            parts = sorted(name for name in os.listdir(scratch_dir)
+                           if name.startswith(f"{shard:05d}."))
+            table = pa.concat_tables(
+                [pq.read_table(os.path.join(scratch_dir, name)) for name in parts]) if parts \
+                else schema.append(pa.field(HASH_COLUMN, pa.uint64())).empty_table()
+            table = table.sort_by(HASH_COLUMN)
+            # only the statistics of the hash column are used, the footer stays small
+            pq.write_table(table, shard_path(output, shard), row_group_size=row_group_size,
+                           write_statistics=[HASH_COLUMN])
+            total += len(table)
+            logger.info("Wrote shard %s of %s, %s rows", shard + 1, 2 ** shard_bits,
+                        len(table))
+            for name in parts:
+                os.remove(os.path.join(scratch_dir, name))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if name_column:
+        hashes = np.concatenate(name_hashes) if name_hashes else np.array([], np.uint64)
+        keys = np.concatenate(name_keys) if name_keys else np.array([], np.uint64)
+        order = np.argsort(hashes, kind="stable")
+        np.save(os.path.join(output, "name_hashes.npy"), hashes[order])
+        np.save(os.path.join(output, "name_keys.npy"), keys[order])
+
+    metadata = {"version": INDEX_VERSION, "rows": total, "shard_bits": shard_bits,
+                "key_column": key_column, "name_column": name_column,
+                "row_group_size": row_group_size,
+                "columns": list(schema.names) if schema else []}
+    # the metadata is written last, an interrupted build is never read
+    with open(os.path.join(output, METADATA_FILE), "w") as file:
+        json.dump(metadata, file, indent=2)
+    return metadata
+
+
+class FeatureIndex:
+    """
+    The FeatureIndex reads the rows of a feature index by `sequence_checksum` or by name. The
+    shards are opened on their first lookup, or all at once with `preload`, and stay open, so
+    a long-lived FeatureIndex only reads the row groups of a lookup.
+    """
+
+    def __init__(self, path: str, preload: bool = False):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE), "r") as file:
+            self.metadata = json.load(file)
+        if self.metadata["version"] != INDEX_VERSION:
+            raise ValueError(f"The index in {path} has version {self.metadata['version']}, "
+                             f"this version reads version {INDEX_VERSION}.")
+        self.key_column = self.metadata["key_column"]
+        self.name_column = self.metadata["name_column"]
+        self.columns = self.metadata["columns"]
+        self._shards: Dict[int, Tuple[pq.ParquetFile, np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._names = None
+        if preload:
+            for shard in range(2 ** self.metadata["shard_bits"]):
+                self._shard(shard)
+
+    def get(self, checksums: Iterable[str],
+            columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        The rows of the checksums, in the order of the checksums, with all columns or the
+        given ones (the checksum and name columns are always included). Checksums that are
+        not in the index have no rows, a checksum of several rows returns all of them, and a
+        checksum that is requested more than once returns its rows every time.
+        """
+        checksums = [str(checksum) for checksum in checksums]
+        table = self._read(key_hashes(checksums), columns)
+        return self._ordered(table, self.key_column, checksums)
+
+    def get_by_name(self, names: Iterable[str],
+                    columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """The rows of the names, in the order of the names, see `get`."""
+        if not self.name_column:
+            raise ValueError("The index was built without a name column.")
+        names = [str(name) for name in names]
+        if self._names is None:
+            # memory-mapped, a lookup only reads the pages of its binary search
+            self._names = (np.load(os.path.join(self.path, "name_hashes.npy"), mmap_mode="r"),
+                           np.load(os.path.join(self.path, "name_keys.npy"), mmap_mode="r"))
+        name_hashes, name_keys = self._names
+        hashes = key_hashes(names)
+        starts = np.searchsorted(name_hashes, hashes, "left")
+        ends = np.searchsorted(name_hashes, hashes, "right")
+        keys = np.concatenate([name_keys[start:end] for start, end in zip(starts, ends)] or
+                              [np.array([], np.uint64)])
+        table = self._read(keys, columns)
+        return self._ordered(table, self.name_column, names)
+
+    def _read(self, hashes: np.ndarray, columns: Optional[List[str]]) -> pa.Table:
+        """The rows of the key hashes, read from the row groups that can hold them."""
+        if columns is None:
+            columns = self.columns
+        unknown = set(columns) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown columns {sorted(unknown)}.")
+        columns = list(dict.fromkeys(
+            [self.key_column, *([self.name_column] if self.name_column else []), *columns,
+             HASH_COLUMN]))
+
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        shards = shards_of(hashes, self.metadata["shard_bits"])
+        tables = []
+        for shard in np.unique(shards):
+            wanted = hashes[shards == shard]
+            file, numbers, minimums, maximums = self._shard(int(shard))
+            # the row groups whose range of hashes holds a wanted hash
+            starts = np.searchsorted(maximums, wanted, "left")
+            ends = np.searchsorted(minimums, wanted, "right")
+            row_groups = sorted({int(numbers[i]) for start, end in zip(starts, ends)
+                                 for i in range(start, end)})
+            if not row_groups:
+                continue
+            table = file.read_row_groups(row_groups, columns=columns)
+            tables.append(table.filter(
+                pc.is_in(table[HASH_COLUMN], value_set=pa.array(wanted, pa.uint64()))))
+
+        if not tables:
+            return self._shard(0)[0].schema_arrow.empty_table().select(columns)
+        return pa.concat_tables(tables)
+
+    def _shard(self, shard: int) -> Tuple[pq.ParquetFile, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The Parquet file of a shard, with the number and the min and max hash of every row
+        group. The row group of an empty shard has no statistics and is left out.
+        """
+        if shard not in self._shards:
+            file = pq.ParquetFile(shard_path(self.path, shard), memory_map=True)
+            column = file.schema_arrow.get_field_index(HASH_COLUMN)
+            statistics = [(i, file.metadata.row_group(i).column(column).statistics)
+                          for i in range(file.num_row_groups)]
+            statistics = [(i, s) for i, s in statistics if s is not None and s.has_min_max]
+            self._shards[shard] = (
+                file, np.array([i for i, _ in statistics], dtype=np.int64),
+                np.array([s.min for _, s in statistics], dtype=np.uint64),
+                np.array([s.max for _, s in statistics], dtype=np.uint64))
+        return self._shards[shard]
+
+    @staticmethod
+    def _ordered(table: pa.Table, column: str, keys: List[str]) -> pd.DataFrame:
+        """
+        The rows of the keys in the order of the keys, without the rows of hash collisions. A
+        key that is given more than once gets its rows every time.
+        """
+        # the rows are ordered in Arrow, the dataframe is only created once
+        unique_keys = list(dict.fromkeys(keys))
+        positions = pc.index_in(pc.cast(table[column], pa.string()),
+                                value_set=pa.array(unique_keys, pa.string()))
+        found = pc.is_valid(positions)
+        table = table.filter(found)
+        positions = positions.filter(found).to_numpy()
+        # the rows grouped by the position of their key, then one group per requested key
+        order = np.argsort(positions, kind="stable")
+        sorted_positions = positions[order]
+        key_positions = dict(zip(unique_keys, range(len(unique_keys))))
+        key_positions = np.array([key_positions[key] for key in keys], dtype=np.int64)
+        starts = np.searchsorted(sorted_positions, key_positions, "left")
+        ends = np.searchsorted(sorted_positions, key_positions, "right")
+        rows = np.concatenate([order[start:end] for start, end in zip(starts, ends)] or
+                              [np.array([], np.int64)])
+        table = table.take(pa.array(rows, pa.int64()))
+        return table.drop_columns([HASH_COLUMN]).to_pandas(ignore_metadata=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build the index of the output of a pipeline")
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="The manifest.json of the last component of a run")
+    source.add_argument("--input", help="A Parquet file or folder with all the columns")
+    build.add_argument("--output", required=True, help="The folder of the index")
+    build.add_argument("--key-column", default="sequence_checksum")
+    build.add_argument("--name-column", default=DEFAULT_INDEX_NAME,
+                       help="The column of the names, an empty string for none")
+    build.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS,
+                       help="The number of rows per shard, every shard is sorted in memory")
+    build.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+
+    get = commands.add_parser("get", help="Print the rows of checksums or names as json lines")
+    get.add_argument("--index", required=True)
+    get.add_argument("--checksums", nargs="+", default=[])
+    get.add_argument("--names", nargs="+", default=[])
+    get.add_argument("--columns", nargs="+")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    args = parse_args()
+    if args.command == "build":
+        rows = count_rows(args.manifest, args.input)
+        metadata = build_index(load_output(args.manifest, args.input), args.output, rows,
+                               args.key_column, args.name_column or None, args.shard_rows,
+                               args.row_group_size)
+        logging.info("Indexed %s rows in %s shards", metadata["rows"],
+                     2 ** metadata["shard_bits"])
+        return
+
+    index = FeatureIndex(args.index)
+    frames = [index.get(args.checksums, args.columns)] if args.checksums else []
+    if args.names:
+        frames.append(index.get_by_name(args.names, args.columns))
+    for frame in frames:
+        print(frame.to_json(orient="records", lines=True, default_handler=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,295 @@
-import pandas as pd
+"""
+Generates a synthetic dataset of protein sequences of any size for the pipeline, and optionally
+the matching inputs of the other stages, so the pipeline can be load tested offline:
+
+- a Parquet file with the `sequence` and `name` of every row. The rows are generated and
+  written in batches, one row group per batch, so the memory does not grow with the dataset.
+- the PDB structures of a fraction of the unique sequences in a structure store directory
+  (`<checksum>.pdb`, like the `store_pdb_component`), as ideal alpha helices or random coils.
+  The `filter_pdb_component` finds these and the other sequences go to the prediction.
+- a json file with the SMILES of the target molecules of the `unikp_component`.
+
+The sequence lengths follow a lognormal (default), uniform or fixed distribution, the residues
+follow the amino acid composition of UniProtKB/Swiss-Prot (or a uniform or given composition),
+and a fraction of the rows repeats an earlier sequence. Everything is deterministic for a seed.
+
+Usage:
+    python utils/generate_mock_data.py --count 100000 --duplicate-rate 0.1 \\
+        --pdb-dir data/pdb_files --pdb-fraction 0.3 --smiles-path data/protein_smiles.json
+"""
+import argparse
+import json
+import logging
+import math
 import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from Bio.SeqUtils.CheckSum import crc64
+
+from stub_endpoints import BACKBONE_ATOMS, fake_pdb, format_pdb, unit_hash
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOCK_DATA_PATH_LOCAL = os.path.join(ROOT_PATH, "data", "mock_data.parquet")
+
+# the amino acid composition of UniProtKB/Swiss-Prot, in percent
+UNIPROT_COMPOSITION = {
+    "A": 8.25, "R": 5.53, "N": 4.06, "D": 5.45, "C": 1.37, "Q": 3.93, "E": 6.75,
+    "G": 7.07, "H": 2.27, "I": 5.96, "L": 9.66, "K": 5.84, "M": 2.42, "F": 3.86,
+    "P": 4.70, "S": 6.56, "T": 5.34, "W": 1.08, "Y": 2.92, "V": 6.87,
+}
+LENGTH_DISTRIBUTIONS = ["lognormal", "uniform", "fixed"]
+# the substrates of the SMILES files, more molecules are derived from their carbon chains
+SUBSTRATES = ["CC(=O)O", "CCO", "CC(=O)OC1=CC=CC=C1C(=O)O", "CC(=O)Nc1ccc(O)cc1",
+              "OC(=O)CCC(=O)O", "C(C1C(C(C(C(O1)O)O)O)O)O", "CC(C)CC(N)C(=O)O",
+              "c1ccc2c(c1)cc[nH]2", "OC(=O)C(O)CC(=O)O", "NC(CCC(=O)O)C(=O)O"]
+# the functional groups at the start and at the end of a carbon chain
+FIRST_GROUPS = ["O", "OC(=O)", "N", "NC(=O)", "O=C", "c1ccccc1"]
+LAST_GROUPS = ["O", "C(=O)O", "N", "C(=O)N", "C=O", "c1ccccc1"]
+
+
+class SequenceGenerator:
+    """
+    Generates protein sequences in batches. A duplicate repeats one of the last
+    `reservoir_size` unique sequences, so the memory of the generator is bounded.
+    """
+
+    def __init__(self, count: int, mean_length: float = 350, length_sigma: float = 0.6,
+                 min_length: int = 30, max_length: int = 2500,
+                 length_distribution: str = "lognormal", duplicate_rate: float = 0.0,
+                 composition: Optional[Dict[str, float]] = None, reservoir_size: int = 10000,
+                 seed: int = 0):
+        # pylint: disable=too-many-arguments
+        if length_distribution not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(f"length_distribution must be one of {LENGTH_DISTRIBUTIONS}")
+        if not 0 <= duplicate_rate < 1:
+            raise ValueError("duplicate_rate must be in [0, 1)")
+        self.count = count
+        self.mean_length = mean_length
+        self.length_sigma = length_sigma
+        self.min_length = min_length
+        self.max_length = max_length
+        self.length_distribution = length_distribution
+        self.duplicate_rate = duplicate_rate
+        self.reservoir_size = reservoir_size
+
+        composition = composition or UNIPROT_COMPOSITION
+        self.residues = np.array(list(composition))
+        self.weights = np.array(list(composition.values()), dtype=float)
+        self.weights /= self.weights.sum()
+        self.rng = np.random.default_rng(seed)
+
+    def lengths(self, size: int) -> np.ndarray:
+        if self.length_distribution == "lognormal":
+            # the mean of the lognormal distribution is the mean length
+            mu = math.log(self.mean_length) - self.length_sigma ** 2 / 2
+            lengths = self.rng.lognormal(mu, self.length_sigma, size)
+        elif self.length_distribution == "uniform":
+            lengths = self.rng.integers(self.min_length, self.max_length + 1, size)
+        else:
+            lengths = np.full(size, self.mean_length)
+        return np.clip(np.rint(lengths), self.min_length, self.max_length).astype(int)
+
+    def random_sequences(self, size: int) -> List[str]:
+        """New sequences, starting with a methionine like the sequences of UniProt."""
+        lengths = self.lengths(size)
+        residues = self.rng.choice(self.residues, size=int(lengths.sum()), p=self.weights)
+        ends = np.cumsum(lengths)
+        return ["M" + "".join(residues[end - length + 1:end])
+                for end, length in zip(ends, lengths)]
+
+    def batches(self, batch_size: int) -> Iterator[pd.DataFrame]:
+        """The rows in batches of `batch_size`, with a `new` column for the first occurrences."""
+        reservoir: List[str] = []
+        for start in range(0, self.count, batch_size):
+            size = min(batch_size, self.count - start)
+            duplicate = self.rng.random(size) < self.duplicate_rate
+            if not reservoir:
+                duplicate[0] = False
+            new_sequences = iter(self.random_sequences(int((~duplicate).sum())))
+
+            sequences, new = [], []
+            for is_duplicate in duplicate:
+                if is_duplicate and reservoir:
+                    sequences.append(reservoir[self.rng.integers(len(reservoir))])
+                    new.append(False)
+                    continue
+                sequence = next(new_sequences)
+                sequences.append(sequence)
+                new.append(True)
+                if len(reservoir) < self.reservoir_size:
+                    reservoir.append(sequence)
+                else:
+                    reservoir[self.rng.integers(self.reservoir_size)] = sequence
+
+            yield pd.DataFrame({
+                "sequence": sequences,
+                "name": [f"Seq{start + i + 1}" for i in range(size)],
+                "new": new,
+            })
+
+
+def coil_pdb(sequence: str) -> str:
+    """
+    The backbone of the sequence as a random coil: a chain of CA atoms 3.8 A apart with a
+    CA-CA-CA angle of about 120 degrees and a random torsion, seeded by the sequence.
+    """
+    rng = np.random.default_rng(int(unit_hash("coil", sequence) * 2 ** 32))
+    positions = [np.zeros(3), np.array([3.8, 0.0, 0.0]), np.array([5.7, 3.29, 0.0])]
+    while len(positions) < len(sequence):
+        # place the next atom from the last three (natural extension reference frame)
+        a, b, c = positions[-3:]
+        bc = (c - b) / np.linalg.norm(c - b)
+        normal = np.cross(b - a, bc)
+        normal /= np.linalg.norm(normal)
+        angle = math.radians(rng.normal(120, 10))
+        torsion = rng.uniform(-math.pi, math.pi)
+        step = 3.8 * np.array([-math.cos(angle), math.sin(angle) * math.cos(torsion),
+                               math.sin(angle) * math.sin(torsion)])
+        frame = np.column_stack([bc, np.cross(normal, bc), normal])
+        positions.append(c + frame @ step)
+    positions = positions[:len(sequence)]
+
+    coordinates = []
+    for i, ca in enumerate(positions):
+        backward = positions[i - 1] - ca if i > 0 else ca - positions[1]
+        forward = positions[i + 1] - ca if i + 1 < len(positions) else -backward
+        nitrogen = ca + 1.46 * backward / np.linalg.norm(backward)
+        carbon = ca + 1.52 * forward / np.linalg.norm(forward)
+        side = np.cross(backward, forward)
+        side = side / np.linalg.norm(side) if np.linalg.norm(side) > 0 else np.array([0, 0, 1])
+        oxygen = carbon + 1.23 * side
+        for name, position in zip([atom[0] for atom in BACKBONE_ATOMS],
+                                  [nitrogen, ca, carbon, oxygen]):
+            coordinates.append((i, name, *position))
+    return format_pdb(sequence, coordinates)
+
+
+def synthetic_pdb(sequence: str, coil_fraction: float = 0.5) -> str:
+    """An ideal helix or a random coil, the same one for the same sequence."""
+    if len(sequence) >= 3 and unit_hash("fold", sequence) < coil_fraction:
+        return coil_pdb(sequence)
+    return fake_pdb(sequence)
+
+
+def synthetic_smiles(count: int) -> Dict[str, str]:
+    """
+    The target molecules of the `unikp_component`: the substrates first, then alkyl chains
+    with a functional group on both ends.
+    """
+    molecules = list(SUBSTRATES)
+    chain = 1
+    while len(molecules) < count:
+        for first in FIRST_GROUPS:
+            for last in LAST_GROUPS:
+                molecules.append(f"{first}{'C' * chain}{last}")
+        chain += 1
+    return {f"mol_{i + 1}": smiles for i, smiles in enumerate(molecules[:count])}
+
+
+def generate_mock_data(output_path: str = MOCK_DATA_PATH_LOCAL, count: int = 8,
+                       row_group_size: int = 10000, pdb_dir: Optional[str] = None,
+                       pdb_fraction: float = 0.5, coil_fraction: float = 0.5,
+                       smiles_path: Optional[str] = None, smiles_count: int = 2,
+                       **generator_arguments) -> None:
+    """Generate the dataset, and the structures and SMILES when their paths are given."""
+    # pylint: disable=too-many-arguments,too-many-locals
+    generator = SequenceGenerator(count, **generator_arguments)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if pdb_dir:
+        os.makedirs(pdb_dir, exist_ok=True)
+
+    schema = pa.schema([("sequence", pa.string()), ("name", pa.string())])
+    rows = unique = structures = residues = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for batch in generator.batches(row_group_size):
+            writer.write_table(pa.Table.from_pandas(batch[["sequence", "name"]], schema=schema,
+                                                    preserve_index=False))
+            rows += len(batch)
+            unique += int(batch["new"].sum())
+            residues += int(batch["sequence"].str.len().sum())
+
+            if not pdb_dir:
+                continue
+            for sequence in batch.loc[batch["new"], "sequence"]:
+                if unit_hash("pdb", sequence) < pdb_fraction:
+                    with open(os.path.join(pdb_dir, f"{crc64(sequence)}.pdb"), "w") as file:
+                        file.write(synthetic_pdb(sequence, coil_fraction))
+                    structures += 1
+            logging.info("Generated %s rows", rows)
+
+    logging.info("Wrote %s rows (%s unique sequences, %s residues) to %s", rows, unique,
+                 residues, output_path)
+    if pdb_dir:
+        logging.info("Wrote %s structures to %s", structures, pdb_dir)
+    if smiles_path:
+        with open(smiles_path, "w") as file:
+            json.dump(synthetic_smiles(smiles_count), file, indent=4)
+        logging.info("Wrote %s target molecules to %s", smiles_count, smiles_path)
+
+
+def parse_composition(value: str) -> Optional[Dict[str, float]]:
+    """`uniprot`, `uniform`, a json object or a json file with the frequency per residue."""
+    if value == "uniprot":
+        return None
+    if value == "uniform":
+        return {residue: 1.0 for residue in UNIPROT_COMPOSITION}
+    if os.path.exists(value):
+        with open(value, "r") as file:
+            return json.load(file)
+    return json.loads(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=MOCK_DATA_PATH_LOCAL)
+    parser.add_argument("--count", type=int, default=8, help="The number of rows")
+    parser.add_argument("--row-group-size", type=int, default=10000,
+                        help="The number of rows generated and written at once")
+    parser.add_argument("--length-distribution", choices=LENGTH_DISTRIBUTIONS,
+                        default="lognormal")
+    parser.add_argument("--mean-length", type=float, default=350)
+    parser.add_argument("--length-sigma", type=float, default=0.6,
+                        help="The sigma of the lognormal distribution")
+    parser.add_argument("--min-length", type=int, default=30)
+    parser.add_argument("--max-length", type=int, default=2500)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="The fraction of rows that repeat an earlier sequence")
+    parser.add_argument("--composition", type=parse_composition, default="uniprot",
+                        help="uniprot, uniform, or a json object (or file) of frequencies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdb-dir", help="The directory to write the structures to")
+    parser.add_argument("--pdb-fraction", type=float, default=0.5,
+                        help="The fraction of the unique sequences with a structure")
+    parser.add_argument("--coil-fraction", type=float, default=0.5,
+                        help="The fraction of the structures that are a coil, not a helix")
+    parser.add_argument("--smiles-path", help="The json file to write the target molecules to")
+    parser.add_argument("--smiles-count", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    generate_mock_data(
+        args.output, args.count, row_group_size=args.row_group_size, pdb_dir=args.pdb_dir,
+        pdb_fraction=args.pdb_fraction, coil_fraction=args.coil_fraction,
+        smiles_path=args.smiles_path, smiles_count=args.smiles_count,
+        mean_length=args.mean_length, length_sigma=args.length_sigma,
+        min_length=args.min_length, max_length=args.max_length,
+        length_distribution=args.length_distribution, duplicate_rate=args.duplicate_rate,
+        composition=args.composition, seed=args.seed)
 
-# having a problem with importing from config.py, placing this here hard-coded. This entire file will disappear once the real data is available
-MOCK_DATA_PATH_LOCAL = "./data/mock_data.parquet"
-
-# create the data folder if it doesn't exist
-if not os.path.exists('./data'):
-    os.makedirs('./data')
-
-def generate_mock_data() -> None:
-    data = {
-        'sequence': [
-            'MNQRGMPIQSLVTNVKINRLEENDCIHTRHRVRPGRTDGKNLHAMMIQHCVSGSARNYQCRGTNELEHGLTEIARLVRSNDTNPDDHIGGAELVAILGNESYTELDIEVMCEASIKPTAARVAVKAVVSLDNMEYDLLFGRETLYAGTPLDLMFESEGPAAAVADLDPHYKLNLTGPRNVELGCRPKRAADDQIKMRWECEALSRVYYQGHEALSLKFDMVEAAIIVEILEWINNEEPTRLAAYIACFIAIQQHVGVFTGVAANEKLEARLGVQQKAKTDRCTENNSTGAEKQAEGLHFRVKPNALPEETLESTLPMAVSLGYPTAMRVLISEKRIRYGYDALVSTGALVSFGLSQGEKNYPWLKQSSLLGLLLHVFGYETEPGILRGARAQYGKGEQLLDFMTLPKTDEGPYKKNRYDSENAGQGEGGAIEVNGKIEKQLHEMLWTQDKKDVLGNAKHEFKLPIAQTEELKMRPPMLELNHTIELTEDPKVRASVLSLAGPLRWTIDLKFCAIFDGAVEEMYSKTSYKETACMKGLMPLDENKIEAPMILGCQLPAGLCLAAGVAGPGDRPGKEAGDDRTSLGVLPLLAEESNVRNDLF',
-            'MAGLKPEVPLHDGINKFGKSDFAGQEGPKIVTTTDKALLVANGALKEPSSHEYHNGLVQQPLEPAGLSTLINGLLFTTTEAELTMPGAYSGDGVIIDANELIYNIDVEKIPAAEEMTTGATNSNPNNEAMYGLERPVTFWGPHPLTASVAQINGPERIRAPKDVQSIPAATPLGLKSMLKMTGPINALHYSCILIGSDPSLKVIVETAGLSGSCEGAPESHAHIAHVWTFYMCSATYNVAPQKGAKLNRLRGDTGSHARGSDCKHARDIDCVDKRVQMVLPYPVSYSSPESAAMKLNDEQKVYYGDPARLADPERHETRSSLLLVIKLEKIKYSGTPTDLELSPEITNFGHQGDNKILIYSLDASIRTNILVNVRIMKDMYPQSTAGIEASKKRILLGQL',
-            'MVDLKKELKNFVDSDFPGSPKQEAQGIDVRILLSFNNAAFREALIISSAEAASGRKLMRAMMKASDSHDTSNTRKTIEILVSICTDPFVLIAEHDTKDERTPNRERHLLKASVLVNEFFEDKYTNLGDNLLKIIPCSKIAFVGMADPQTSEEFAAKDTGEGSAEDQNCVLNEGLPQDNDEVQALRAGAIIIDSPMASPTTVYINKVIGLPYDGDPRLSVLGMRVDHVRGKERVDGLYGLLAIKLRVTFEGLAGVTQNFRALSYTLNIGRLIHIQNMHDPGVYGPESTFNAIDKAINIIEVDAYTTSPEPWMASPDTGFANPSAPLQFKIANAASERQCANEEPFKDAVATSAYIAAEIRHAVNALNSAGGGQQPGCLVSSPGITIRFAAEAGKHTSELAIVMFIVYAINSKSVAFSQGRQLTLTSPERGDGPDDQTEETKDASAFLAFSIRNALRTFLELRQSEMLKTKLYGLPSSEPVFQLPYMSFGLEEVRYIEHSKGFTQAYALKLLEASIVAVRDIRKSLNIRKAGAPWDAAPLKDPLYVMGMTQV',
-            'MELILAKARLEFECDWGLLMLEPCVPPTKIFADRNYAVGVMFESDKAGEGGTISSAIETENLTAGFDTAKFHQNDGLDEVQMEDAMITSSGAIGKLRMQTLEPNRVFRALYEVLLWPMPENSHISQEGNWKIGAKRMEAAIQLLEVEEKGENYFVWLEQTGISFKVLMSGYMEIACDWERSYLELSENALMQTTLGESTSFTGMSLLMEHWDDIYFTPGPYLWRGKTESIWLEKDPVKATMISSPNFGSQERRTCLTLLKVQIIHRALRTLEYEMEEEPQIGGKAVLGSKETINEFLMMGAVDCPALARVFTGRSQKAFIWIRNGTFERKLSNDHVMAGAQTPCELDRPT',
-            'MRVLCDGSTGYACAKNTRIRFREKVASVLAKIQGYEQTFPHHMPNMAYGLVIALKGDNCGLYVEQKAFTTLIWASPFAPPVTKANEANYDKQILDNEEAYMAVPADIAEPRDSLAAENHFWSRQAEAVVTAFTWIRNNLMHVDESGLVHRQTLKVLFPEQQADYAVYSVDEQTIDDDFFKGWYCMHDKGIEPSAGILYLYVRVIAEEGHTVKSRQDDINIYGAKGYKAPEAAGITENQRKYELYLREQDRDVGNWRTPLHSEKMWASKINGIIAPDDLTIEFDRHTGDAQYRPLLRAHEAPTDRKGIFRNGGKVIADHEQASDNDSGGNHPAKNPEENPDGGHDELHEHLRSGRIRVDLDAEHLRDHVKLLIFKTANEILIIASDSQPALLSGPFLVECNPQDLPQAITYLVFKLQDPSA',
-            'MRVLCDGSTGYACAKNTRIRFREKVASVLAKIQGYEQTFPHHMPNMAYGLVIALKGDNCGLYVEQKAFTTLIWASPFAPPVTKANEANYDKQILDNEEAYMAVPADIAEPRDSLAAENHFWSRQAEAVVTAFTWIRNNLMHVDESGLVHRQTLKVLFPEQQADYAVYSVDEQTIDDDFFKGWYCMHDKGIEPSAGILYLYVRVIAEEGHTVKSRQDDINIYGAKGYKAPEAAGITENQRKYELYLREQDRDVGNWRTPLHSEKMWASKINGIIAPDDLTIEFDRHTGDAQYRPLLRAHEAPTDRKGIFRNGGKVIADHEQASDNDSGGNHPAKNPEENPDGGHDELHEHLRSGRIRVDLDAEHLRDHVKLLIFKTANEILIIASDSQPALLSGPFLVECNPQDLPQAITYLVFKLQDPSA',
-            'MRVLCDGSTGYACAKNTRIRFREKVASVLAKIQGYEQTFPHHMPNMAYGLVIALKGDNCGLYVEQKAFTTLIWASPFAPPVTKANEANYDKQILDNEEAYMAVPADIAEPRDSLAAENHFWSRQAEAVVTAFTWIRNNLMHVDESGLVHRQTLKVLFPEQQADYAVYSVDEQTIDDDFFKGWYCMHDKGIEPSAGILYLYVRVIAEEGHTVKSRQDDINIYGAKGYKAPEAAGITENQRKYELYLREQDRDVGNWRTPLHSEKMWASKINGIIAPDDLTIEFDRHTGDAQYRPLLRAHEAPTDRKGIFRNGGKVIADHEQASDNDSGGNHPAKNPEENPDGGHDELHEHLRSGRIRVDLDAEHLRDHVKLLIFKTANEILIIASDSQPALLSGPFLVECNPQDLPQAITYLVFKLQDPSA',
-            'MRVLCDGSTGYACAKNTRIRFREKVASVLAKIQGYEQTFPHHMPNMAYGLVIALKGDNCGLYVEQKAFTTLIWASPFAPPVTKANEANYDKQILDNEEAYMAVPADIAEPRDSLAAENHFWSRQAEAVVTAFTWIRNNLMHVDESGLVHRQTLKVLFPEQQADYAVYSVDEQTIDDDFFKGWYCMHDKGIEPSAGILYLYVRVIAEEGHTVKSRQDDINIYGAKGYKAPEAAGITENQRKYELYLREQDRDVGNWRTPLHSEKMWASKINGIIAPDDLTIEFDRHTGDAQYRPLLRAHEAPTDRKGIFRNGGKVIADHEQASDNDSGGNHPAKNPEENPDGGHDELHEHLRSGRIRVDLDAEHLRDHVKLLIFKTANEILIIASDSQPALLSGPFLVECNPQDLPQAITYLVFKLQDPSA'
-        ],
-        'name': ['Seq1', 'Seq2', 'Seq3', 'Seq4', 'Seq5','Seq6', 'Seq7', 'Seq8']
-    }
-
-    df = pd.DataFrame(data)
-    df.to_parquet(MOCK_DATA_PATH_LOCAL, index=False)
 
 # run the file to generate the mock data
 if __name__ == "__main__":
-    generate_mock_data()
\ No newline at end of file
+    main()
@@ -0,0 +1,158 @@
+"""
+Reports the import time of every component, per module, and fails when the cold start of a
+component is over its budget.
+
+The `src/main.py` of every component is imported in a fresh interpreter with
+`python -X importtime`, from the `src` folder of the component, like in its Docker image.
+Every partition task of a new worker pays this import, so the heavy optional packages of
+a component (torch, google-cloud-storage, ...) should be imported in the code path that
+needs them. The budgets are in `import_time_budgets.yaml`, in milliseconds.
+
+Usage:
+    python utils/import_time_report.py --components DeepTMpred_component filter_pdb_component
+"""
+import argparse
+import logging
+import os
+import re
+import subprocess  # nosec
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import yaml
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPONENTS_PATH = os.path.join(ROOT_PATH, "components")
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "import_time_budgets.yaml")
+
+# import time:       self [us] |  cumulative | imported package
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+@dataclass
+class ImportRecord:
+    """The import of one module: its own time and the time including its imports, in ms."""
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+@dataclass
+class ImportReport:
+    """The import of the main module of a component."""
+    component: str
+    records: List[ImportRecord]
+    error: Optional[str] = None
+
+    @property
+    def total_ms(self) -> float:
+        return sum(record.self_ms for record in self.records)
+
+    def slowest(self, top: int) -> List[ImportRecord]:
+        """The slowest modules imported by the interpreter itself or by the main module."""
+        packages = [record for record in self.records
+                    if record.depth <= 1 and record.module != "main"]
+        return sorted(packages, key=lambda record: -record.cumulative_ms)[:top]
+
+
+def parse_import_times(stderr: str) -> List[ImportRecord]:
+    """Parse the output of `python -X importtime`."""
+    records = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(module, int(self_us) / 1000, int(cumulative_us) / 1000,
+                                        (len(indent) - 1) // 2))
+    return records
+
+
+def measure_component(component: str) -> ImportReport:
+    """Import the main module of a component in a fresh interpreter."""
+    src_path = os.path.join(COMPONENTS_PATH, component, "src")
+    env = {**os.environ, "PYTHONPATH": src_path}
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],  # nosec
+                             cwd=src_path, env=env, capture_output=True, text=True, check=False)
+    records = parse_import_times(process.stderr)
+    if process.returncode != 0:
+        error = [line for line in process.stderr.splitlines()
+                 if not line.startswith("import time:")]
+        return ImportReport(component, records, error[-1] if error else "import failed")
+    return ImportReport(component, records)
+
+
+def measure(component: str, repeat: int) -> ImportReport:
+    """The fastest of several imports, the others include the noise of the host."""
+    reports = [measure_component(component) for _ in range(repeat)]
+    return min(reports, key=lambda report: (report.error is not None, report.total_ms))
+
+
+def check_reports(reports: List[ImportReport], budgets: Dict[str, float]) -> List[str]:
+    """The components that can not be imported or are over their budget."""
+    failures = []
+    for report in reports:
+        if report.error:
+            failures.append(f"{report.component}: {report.error}")
+        elif report.component in budgets and report.total_ms > budgets[report.component]:
+            failures.append(f"{report.component}: {report.total_ms:.0f} ms is over the budget "
+                            f"of {budgets[report.component]:.0f} ms")
+    return failures
+
+
+def print_report(report: ImportReport, budget: Optional[float], top: int) -> None:
+    budget_text = f" (budget {budget:.0f} ms)" if budget is not None else ""
+    print(f"{report.component}: {report.total_ms:.1f} ms{budget_text}")
+    if report.error:
+        print(f"    failed: {report.error}")
+    for record in report.slowest(top):
+        print(f"    {record.cumulative_ms:9.1f} ms  {record.module}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--components", nargs="+",
+                        help="The components to measure (default: all components)")
+    parser.add_argument("--budgets", default=BUDGETS_PATH,
+                        help="A yaml file with the budget of every component in ms")
+    parser.add_argument("--top", type=int, default=10,
+                        help="The number of slowest modules to report per component")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="The number of imports per component, the fastest one is reported")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="Do not fail on components whose requirements are not installed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.budgets, "r") as file:
+        budgets = yaml.safe_load(file) or {}
+    components = args.components or sorted(
+        name for name in os.listdir(COMPONENTS_PATH)
+        if os.path.exists(os.path.join(COMPONENTS_PATH, name, "src", "main.py")))
+
+    reports = [measure(component, args.repeat) for component in components]
+    for report in reports:
+        print_report(report, budgets.get(report.component), args.top)
+
+    if args.allow_missing:
+        reports = [report for report in reports
+                   if not (report.error or "").startswith("ModuleNotFoundError")]
+    failures = check_reports(reports, budgets)
+    for failure in failures:
+        logging.error(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Runs the pipeline of `pipeline.py` in one process, without building or starting a Docker
+image per component.
+
+The runner loads `pipeline.py` with a local stand-in for the Fondant `Pipeline`, which
+records the `read` and `apply` calls. It then imports the transform class of every applied
+component from its `src/main.py` and chains them over the partitions of one Dask dataframe.
+The `fondant_component.yaml` of every component is the contract of the stage, as it is in
+Fondant: a stage only receives the columns it consumes, and the columns it produces are
+checked and cast to the types of its spec.
+
+Usage:
+    python utils/run_local.py --dataset-uri data/mock_data.parquet --output data/local_run
+"""
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import runpy
+import sys
+import time
+import types
+from typing import Any, Dict, List, Optional, Tuple
+
+import dask
+import dask.dataframe as dd
+import pandas as pd
+import pyarrow as pa
+from fondant.component import DaskTransformComponent, PandasTransformComponent
+from fondant.core.component_spec import ComponentSpec, OperationSpec
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the reusable Fondant components that the runner can read a dataset with
+READ_COMPONENTS = ["load_from_parquet"]
+
+
+class LocalDataset:
+    """Records the `apply` calls of the pipeline, in place of a Fondant dataset."""
+
+    def __init__(self, pipeline: "LocalPipeline"):
+        self.pipeline = pipeline
+
+    def apply(self, ref: str, *, consumes: Optional[Dict[str, Any]] = None,
+              produces: Optional[Dict[str, Any]] = None,
+              arguments: Optional[Dict[str, Any]] = None, **_) -> "LocalDataset":
+        """Record the application of a component, the other Fondant options are ignored."""
+        self.pipeline.operations.append(("apply", ref, consumes, produces, arguments or {}))
+        return self
+
+
+class LocalPipeline:
+    """Records the operations of the pipeline, in place of the Fondant `Pipeline`."""
+
+    def __init__(self, name: str, **_):
+        self.name = name
+        self.operations: List[Tuple[str, str, Optional[Dict], Optional[Dict], Dict]] = []
+
+    def read(self, ref: str, *, produces: Optional[Dict[str, Any]] = None,
+             arguments: Optional[Dict[str, Any]] = None, **_) -> LocalDataset:
+        """Record the component that reads the dataset."""
+        self.operations.append(("read", ref, None, produces, arguments or {}))
+        return LocalDataset(self)
+
+
+def load_pipeline(pipeline_path: str) -> LocalPipeline:
+    """Load the pipeline definition, with `fondant.pipeline.Pipeline` replaced by LocalPipeline."""
+    local_module = types.ModuleType("fondant.pipeline")
+    local_module.Pipeline = LocalPipeline
+    previous_module = sys.modules.get("fondant.pipeline")
+    sys.modules["fondant.pipeline"] = local_module
+    sys.path.insert(0, os.path.dirname(os.path.abspath(pipeline_path)))
+    try:
+        namespace = runpy.run_path(pipeline_path)
+    finally:
+        sys.path.pop(0)
+        if previous_module is None:
+            del sys.modules["fondant.pipeline"]
+        else:
+            sys.modules["fondant.pipeline"] = previous_module
+
+    pipelines = [value for value in namespace.values() if isinstance(value, LocalPipeline)]
+    if len(pipelines) != 1:
+        raise ValueError(f"Expected one pipeline in {pipeline_path}, found {len(pipelines)}.")
+    return pipelines[0]
+
+
+def read_dataset(ref: str, produces: Dict[str, Any], arguments: Dict[str, Any],
+                 partition_rows: Optional[int]) -> dd.DataFrame:
+    """Read the dataset the way the Fondant `load_from_parquet` component does."""
+    if ref not in READ_COMPONENTS:
+        raise ValueError(f"The local runner can not read a dataset with '{ref}'. "
+                         f"Choose from {READ_COMPONENTS}.")
+
+    columns = list(produces)
+    index_column = arguments.get("index_column")
+    dataframe = dd.read_parquet(arguments["dataset_uri"],
+                                columns=columns + ([index_column] if index_column else []))
+    if arguments.get("n_rows_to_load"):
+        dataframe = dd.from_pandas(dataframe.head(arguments["n_rows_to_load"], npartitions=-1),
+                                   npartitions=1)
+
+    if index_column:
+        dataframe = dataframe.set_index(index_column, drop=True)
+    else:
+        # a globally unique index, like the one of load_from_parquet
+        def set_unique_index(partition: pd.DataFrame, partition_info=None) -> pd.DataFrame:
+            number = partition_info["number"] if partition_info else 0
+            partition.index = pd.Index([f"{number}_{i}" for i in range(len(partition))],
+                                       name="id")
+            return partition
+        meta = dataframe._meta.set_axis(pd.Index([], name="id", dtype="object"))
+        dataframe = dataframe.map_partitions(set_unique_index, meta=meta)
+
+    if partition_rows:
+        dataframe = dataframe.repartition(
+            npartitions=max(1, math.ceil(len(dataframe) / partition_rows)))
+    return dataframe.astype({name: pd.ArrowDtype(value) for name, value in produces.items()
+                             if isinstance(value, pa.DataType)})
+
+
+class LocalStage:
+    """
+    One component of the pipeline: its transform class, imported from its `src` folder, and
+    its operation spec, from its `fondant_component.yaml` and the mappings of the pipeline.
+    """
+
+    def __init__(self, component_path: str, consumes: Optional[Dict[str, Any]],
+                 produces: Optional[Dict[str, Any]], arguments: Dict[str, Any]):
+        # normalized, the modules of the component are found by the prefix of their path
+        self.path = os.path.normpath(os.path.join(ROOT_PATH, component_path))
+        self.name = os.path.basename(os.path.normpath(self.path))
+        self.spec = ComponentSpec.from_file(os.path.join(self.path, "fondant_component.yaml"))
+        self.operation_spec = OperationSpec(self.spec, consumes=consumes, produces=produces)
+        self.consumes = consumes
+        # string values rename a column of the dataset for the component
+        self.consumes_renames = {dataset: name for name, dataset in (consumes or {}).items()
+                                 if isinstance(dataset, str)}
+        self.produces_renames = {name: dataset for name, dataset in (produces or {}).items()
+                                 if isinstance(dataset, str)}
+
+        unknown = set(arguments) - set(self.spec.args)
+        if unknown:
+            raise ValueError(f"{self.name} has no arguments {sorted(unknown)}.")
+        # the defaults of the spec, like the arguments the Fondant executor passes, without
+        # the arguments of the executor itself
+        self.arguments = {name: arg.default for name, arg in self.spec.args.items()
+                          if name not in self.spec.default_arguments}
+        self.arguments.update(arguments)
+
+    def load_component(self):
+        """Import the transform class of the component and instantiate it."""
+        src_path = os.path.join(self.path, "src")
+        # the components use the same module names (main, structure_store, ...) for
+        # different code, so the modules of the previous component, and the modules with the
+        # name of a module of this component, are removed first
+        components_path = os.path.join(ROOT_PATH, "components") + os.sep
+        own_modules = {os.path.splitext(name)[0] for name in os.listdir(src_path)}
+        for name, module in list(sys.modules.items()):
+            module_file = getattr(module, "__file__", None)
+            if module_file and (os.path.abspath(module_file).startswith(components_path)
+                                or name.split(".")[0] in own_modules):
+                del sys.modules[name]
+
+        sys.path.insert(0, src_path)
+        try:
+            spec = importlib.util.spec_from_file_location("main",
+                                                          os.path.join(src_path, "main.py"))
+            module = importlib.util.module_from_spec(spec)
+            sys.modules["main"] = module
+            spec.loader.exec_module(module)
+        finally:
+            sys.path.remove(src_path)
+
+        classes = [value for value in vars(module).values() if isinstance(value, type)
+                   and issubclass(value, (PandasTransformComponent, DaskTransformComponent))
+                   and value.__module__ == module.__name__]
+        if len(classes) != 1:
+            raise ValueError(f"Expected one transform component in {self.name}, "
+                             f"found {len(classes)}.")
+
+        component = classes[0](**self.arguments)
+        component.consumes = self.operation_spec.operation_consumes
+        component.produces = self.operation_spec.operation_produces
+        return component
+
+    def consumed_columns(self, dataframe: dd.DataFrame) -> List[str]:
+        """The columns of the dataset the component consumes, checked against its spec."""
+        if self.spec.consumes_additional_properties and not self.consumes:
+            return list(dataframe.columns)
+
+        # the consumed fields have the names of the component, the dataset the mapped ones
+        dataset_names = {name: dataset for dataset, name in self.consumes_renames.items()}
+        columns = [dataset_names.get(name, name)
+                   for name in self.operation_spec.operation_consumes]
+        missing = [name for name in columns if name not in dataframe.columns]
+        if missing:
+            raise ValueError(f"{self.name} consumes {missing}, which are not in the dataset "
+                             f"(columns: {list(dataframe.columns)}).")
+        return columns
+
+    def check_produces(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """Select the produced columns of a result and cast them to the types of the spec."""
+        produces = self.operation_spec.operation_produces
+        missing = [name for name in produces if name not in dataframe.columns]
+        if missing:
+            raise ValueError(f"{self.name} does not produce the columns {missing} of its spec.")
+        try:
+            dataframe = dataframe[list(produces)].astype(
+                {name: pd.ArrowDtype(field.type.value) for name, field in produces.items()})
+        except (TypeError, ValueError, pa.ArrowException) as error:
+            raise ValueError(f"{self.name} produces columns that do not match the types of "
+                             f"its spec: {error}") from error
+        return dataframe.rename(columns=self.produces_renames)
+
+    def produces_meta(self) -> pd.DataFrame:
+        """An empty dataframe with the produced columns, as Dask metadata."""
+        return pd.DataFrame(
+            {self.produces_renames.get(name, name): pd.Series(dtype=pd.ArrowDtype(field.type.value))
+             for name, field in self.operation_spec.operation_produces.items()},
+            index=pd.Index([], name="id", dtype="object"))
+
+    def run(self, dataframe: dd.DataFrame) -> dd.DataFrame:
+        """
+        Apply the component to the dataset, and keep the columns it does not consume. The
+        result is computed before the component is torn down, like a stage of Fondant.
+        """
+        columns = self.consumed_columns(dataframe)
+        component = self.load_component()
+        # the setup of the Fondant base classes starts a Dask cluster per stage, the runner
+        # uses one scheduler for all stages
+        own_setup = not type(component).setup.__module__.startswith("fondant.")
+        state = component.setup() if own_setup else None
+        try:
+            return self.apply(component, dataframe, columns).persist()
+        finally:
+            if own_setup:
+                component.teardown(state)
+
+    def apply(self, component, dataframe: dd.DataFrame, columns: List[str]) -> dd.DataFrame:
+        """Chain the transform of the component to the dataframe."""
+        renames = self.consumes_renames
+        rest = dataframe.columns.difference(list(self.produces_meta().columns))
+
+        if isinstance(component, DaskTransformComponent):
+            result = component.transform(dataframe[columns].rename(columns=renames))
+            result = result.map_partitions(self.check_produces, meta=self.produces_meta())
+            rest = rest.difference(list(result.columns))
+            if len(rest) == 0:
+                return result
+            # the component may repartition the dataset, so the other columns are joined to
+            # the partitions of the result instead of realigning both dataframes
+            others = dataframe[list(rest)].compute()
+            return result.map_partitions(lambda partition: partition.join(others, how="left"),
+                                         meta=result._meta.join(others.iloc[:0], how="left"))
+
+        def transform_partition(partition: pd.DataFrame) -> pd.DataFrame:
+            if partition.empty:
+                # like Fondant, empty partitions are not passed to the component
+                produced = self.produces_meta()
+            else:
+                produced = self.check_produces(
+                    component.transform(partition[columns].rename(columns=renames)))
+            # components may drop rows, the other columns are joined to the remaining ones
+            return produced.join(partition[list(rest)], how="left")
+
+        meta = self.produces_meta().join(dataframe._meta[list(rest)], how="left")
+        return dataframe.map_partitions(transform_partition, meta=meta)
+
+
+def run_pipeline(pipeline: LocalPipeline, dataset_uri: Optional[str] = None,
+                 partition_rows: Optional[int] = None, until: Optional[str] = None
+                 ) -> dd.DataFrame:
+    """
+    Run the operations of the pipeline in order. Every stage is computed before the next one
+    starts, like the stages of Fondant, so errors and durations belong to one component.
+    """
+    dataframe = None
+    for kind, ref, consumes, produces, arguments in pipeline.operations:
+        start = time.perf_counter()
+        if kind == "read":
+            if dataset_uri:
+                arguments = {**arguments, "dataset_uri": dataset_uri}
+            dataframe = read_dataset(ref, produces or {}, arguments, partition_rows).persist()
+            name = ref
+        else:
+            stage = LocalStage(ref, consumes, produces, arguments)
+            dataframe = stage.run(dataframe)
+            name = stage.name
+
+        logging.info("%s: %d partitions, %.2f s", name, dataframe.npartitions,
+                     time.perf_counter() - start)
+        if until and name == until:
+            break
+    return dataframe
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", default=os.path.join(ROOT_PATH, "pipeline.py"),
+                        help="The pipeline definition (default: pipeline.py)")
+    parser.add_argument("--dataset-uri", help="Overrides the dataset of the read operation")
+    parser.add_argument("--output", help="A directory to write the resulting dataset to")
+    parser.add_argument("--partition-rows", type=int,
+                        help="The number of rows per partition of the dataset that is read")
+    parser.add_argument("--until", help="The last component to run, e.g. store_pdb_component")
+    parser.add_argument("--scheduler", default="threads", choices=["threads", "synchronous"],
+                        help="The Dask scheduler (default: threads)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pipeline = load_pipeline(args.pipeline)
+    start = time.perf_counter()
+    # like Fondant, do not assume every object column holds strings
+    with dask.config.set({"scheduler": args.scheduler, "dataframe.convert-string": False}):
+        dataframe = run_pipeline(pipeline, args.dataset_uri, args.partition_rows, args.until)
+        if args.output:
+            dataframe.to_parquet(args.output, write_index=True)
+    logging.info("%s: %d rows in %.2f s", pipeline.name, len(dataframe),
+                 time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
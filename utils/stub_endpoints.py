@@ -0,0 +1,162 @@
+"""
+A local stub of the ESMFold and UniKP endpoints on Hugging Face, for offline runs and
+benchmarks of the pipeline. The answers are deterministic fakes of the same format:
+
+- `POST /esmfold` with `{"inputs": "<sequence>"}` returns a PDB string with the backbone of
+  an ideal alpha helix, and a pLDDT derived from the sequence in the B-factor column.
+- `POST /unikp` with `{"inputs": {"sequence": ..., "smiles": ...}}`, or a list of inputs,
+  returns the Km, Kcat and Vmax derived from the hash of the pair.
+
+Point the components at the stub with `ESMFOLD_ENDPOINT_URL=http://<host>:<port>/esmfold` and
+`UNIKP_ENDPOINT_URL=http://<host>:<port>/unikp`, and set `transport_mode` to `record` to fill a
+replay store without the real endpoints. `--cold-start` answers with a 503 for the first seconds, like a scaled-down
+endpoint, and `--latency` delays every answer.
+
+Usage:
+    python utils/stub_endpoints.py --port 8080 --latency 0.2
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+THREE_LETTER_CODES = {
+    "A": "ALA", "C": "CYS", "D": "ASP", "E": "GLU", "F": "PHE", "G": "GLY", "H": "HIS",
+    "I": "ILE", "K": "LYS", "L": "LEU", "M": "MET", "N": "ASN", "P": "PRO", "Q": "GLN",
+    "R": "ARG", "S": "SER", "T": "THR", "V": "VAL", "W": "TRP", "Y": "TYR",
+}
+# the backbone atoms of a residue of an ideal alpha helix: radius (A), angle offset (degrees)
+# and rise (A) relative to the CA atom
+BACKBONE_ATOMS = [("N", 1.55, -28.0, -0.9), ("CA", 2.3, 0.0, 0.0), ("C", 1.6, 28.0, 0.9),
+                  ("O", 1.9, 40.0, 2.0)]
+
+
+def unit_hash(*values: str) -> float:
+    """A deterministic number in [0, 1) for the values."""
+    digest = hashlib.sha256("\x1f".join(values).encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def format_pdb(sequence: str,
+               coordinates: Iterable[Tuple[int, str, float, float, float]]) -> str:
+    """
+    A PDB file in the format of ESMFold from the (residue index, atom name, x, y, z) of the
+    atoms, with a pLDDT derived from the sequence in the B-factor column.
+    """
+    lines = []
+    for serial, (i, name, x, y, z) in enumerate(coordinates, start=1):
+        plddt = 50 + 45 * unit_hash(sequence, str(i))
+        lines.append(
+            f"ATOM  {serial:5d}  {name:<3} {THREE_LETTER_CODES.get(sequence[i], 'UNK')} A"
+            f"{i + 1:4d}    {x:8.3f}{y:8.3f}{z:8.3f}  1.00{plddt:6.2f}"
+            f"           {name[0]}")
+    lines.append(f"TER   {len(lines) + 1:5d}      {THREE_LETTER_CODES.get(sequence[-1:], 'UNK')} A"
+                 f"{len(sequence):4d}")
+    lines.append("END")
+    return "\n".join(lines) + "\n"
+
+
+def fake_pdb(sequence: str) -> str:
+    """The backbone of the sequence as an ideal alpha helix, in the PDB format of ESMFold."""
+    coordinates = []
+    for i in range(len(sequence)):
+        for name, radius, offset, rise in BACKBONE_ATOMS:
+            angle = math.radians(100.0 * i + offset)
+            coordinates.append((i, name, radius * math.cos(angle), radius * math.sin(angle),
+                                1.5 * i + rise))
+    return format_pdb(sequence, coordinates)
+
+
+def fake_kinetics(inputs: Dict[str, str]) -> Dict[str, float]:
+    """Km, Kcat and Vmax of a (sequence, SMILES) pair, spread over realistic magnitudes."""
+    sequence, smiles = inputs["sequence"], inputs["smiles"]
+    return {"Km": 10 ** (-2 + 3 * unit_hash("km", sequence, smiles)),
+            "Kcat": 10 ** (-1 + 3 * unit_hash("kcat", sequence, smiles)),
+            "Vmax": 10 ** (-1 + 2 * unit_hash("vmax", sequence, smiles))}
+
+
+class StubEndpoints:
+    """Serves the fake ESMFold and UniKP endpoints on a local port, in a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0,
+                 cold_start: float = 0):
+        self.latency = latency
+        self.cold_until = time.monotonic() + cold_start
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, answer = server.answer(self.path.rstrip("/"), body)
+                payload = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *_):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def answer(self, path: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        self.requests += 1
+        if time.monotonic() < self.cold_until:
+            return 503, {"error": "Service Unavailable"}
+        time.sleep(self.latency)
+
+        inputs = body.get("inputs")
+        if path == "/esmfold" and isinstance(inputs, str):
+            return 200, fake_pdb(inputs)
+        if path == "/unikp" and isinstance(inputs, list):
+            return 200, [fake_kinetics(pair) for pair in inputs]
+        if path == "/unikp" and isinstance(inputs, dict):
+            return 200, fake_kinetics(inputs)
+        return 400, {"error": f"Unexpected request for {path}"}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake ESMFold and UniKP endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0,
+                        help="The number of seconds before every answer")
+    parser.add_argument("--cold-start", type=float, default=0,
+                        help="The number of seconds the endpoints answer with a 503 at start")
+    args = parser.parse_args()
+
+    with StubEndpoints(args.host, args.port, args.latency, args.cold_start) as stub:
+        logging.info("Serving %s/esmfold and %s/unikp", stub.url, stub.url)
+        try:
+            stub.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
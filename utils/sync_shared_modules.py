@@ -0,0 +1,74 @@
+"""
+Keeps the copies of the shared modules in line with their original in `utils`. Every image
+only gets the folder of its own component, so a module that several components use is copied
+to the `src` folder of each of them.
+
+Without arguments, the original in `utils` is copied over every copy that differs from it.
+With `--check`, nothing is written and the script fails when a copy differs, the lint pipeline
+runs it like that.
+
+Usage:
+    python utils/sync_shared_modules.py [--check]
+"""
+import argparse
+import filecmp
+import glob
+import logging
+import os
+import shutil
+import sys
+from typing import List
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UTILS_PATH = os.path.join(ROOT_PATH, "utils")
+# the modules in utils that are copied to the components that use them
+SHARED_MODULES = ["descriptor_engine.py", "encoding.py", "endpoint_warmer.py",
+                  "feature_cache.py", "instrumentation.py", "replay_transport.py",
+                  "structure_store.py"]
+
+
+def copies(module: str) -> List[str]:
+    """The copies of a shared module in the `src` folders of the components."""
+    return sorted(glob.glob(os.path.join(ROOT_PATH, "components", "*", "src", module)))
+
+
+def drifted_copies(module: str) -> List[str]:
+    """The copies of a shared module that differ from the original."""
+    original = os.path.join(UTILS_PATH, module)
+    return [path for path in copies(module) if not filecmp.cmp(original, path, shallow=False)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true",
+                        help="Only report the copies that differ, and fail when there are any")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    drifted = []
+    for module in SHARED_MODULES:
+        for path in drifted_copies(module):
+            relative_path = os.path.relpath(path, ROOT_PATH)
+            drifted.append(relative_path)
+            if not args.check:
+                shutil.copyfile(os.path.join(UTILS_PATH, module), path)
+                logging.info("Copied utils/%s to %s", module, relative_path)
+
+    if args.check:
+        for relative_path in drifted:
+            logging.error("%s differs from its original in utils, run "
+                          "python utils/sync_shared_modules.py", relative_path)
+        sys.exit(1 if drifted else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+pytest.importorskip("Bio")
+
+# pylint: disable=wrong-import-position
+from benchmark_components import compare, save_baselines
+
+BASELINE = {"rows_per_s": 100.0, "residues_per_s": 25000.0, "latency_p95_ms": 10.0,
+            "transform_rss_growth_mb": 50.0}
+
+
+def result(rows=1000, length=250, **metrics):
+    return {"component": "biopython_component", "rows": rows, "length": length,
+            **BASELINE, **metrics}
+
+
+def baselines(**metrics):
+    return {"biopython_component": {"1000x250": {**BASELINE, **metrics}}}
+
+
+def test_throughput_regresses_when_it_is_lower():
+    assert compare([result(rows_per_s=85.0)], baselines(), 0.2) == []
+    assert compare([result(rows_per_s=1000.0)], baselines(), 0.2) == []
+    regressions = compare([result(rows_per_s=70.0)], baselines(), 0.2)
+    assert len(regressions) == 1 and "rows_per_s 70 vs baseline 100" in regressions[0]
+
+
+def test_latency_and_memory_regress_when_they_are_higher():
+    assert compare([result(latency_p95_ms=1.0, transform_rss_growth_mb=0.0)],
+                   baselines(), 0.2) == []
+    regressions = compare([result(latency_p95_ms=13.0, transform_rss_growth_mb=70.0)],
+                          baselines(), 0.2)
+    assert [regression.split(": ")[1].split()[0] for regression in regressions] == \
+        ["latency_p95_ms", "transform_rss_growth_mb"]
+
+
+def test_a_zero_baseline_is_compared_with_the_floor_of_the_metric():
+    zero = baselines(transform_rss_growth_mb=0.0, latency_p95_ms=0.0)
+    # a small growth of the RSS is noise, a larger one is a regression
+    assert compare([result(transform_rss_growth_mb=12.0)], zero, 0.2) == []
+    regressions = compare([result(transform_rss_growth_mb=40.0)], zero, 0.2)
+    assert len(regressions) == 1 and "transform_rss_growth_mb" in regressions[0]
+    # without a floor, a metric with a baseline of 0 is not compared
+    assert compare([result(latency_p95_ms=5.0, transform_rss_growth_mb=0.0)], zero, 0.2) == []
+
+
+def test_cases_and_metrics_without_a_baseline_are_not_compared():
+    assert compare([result(rows=10, rows_per_s=1.0)], baselines(), 0.2) == []
+    assert compare([result(rows_per_s=1.0)], {}, 0.2) == []
+    assert compare([{"component": "biopython_component", "rows": 1000, "length": 250,
+                     "error": "timeout after 600s"}], baselines(), 0.2) == []
+    # a baseline saved before a metric was added
+    old = {"biopython_component": {"1000x250": {"rows_per_s": 100.0, "peak_rss_mb": 300.0}}}
+    assert compare([result(transform_rss_growth_mb=500.0)], old, 0.2) == []
+    assert len(compare([result(rows_per_s=10.0)], old, 0.2)) == 1
+
+
+def test_baselines_are_saved_next_to_the_other_cases(tmp_path):
+    path = tmp_path / "baselines.json"
+    path.write_text(json.dumps({"pdb_features_component": {"10x50": BASELINE}}))
+
+    save_baselines([result(), result(rows=10, error="timeout after 600s")], str(path))
+
+    saved = json.loads(path.read_text())
+    assert saved["pdb_features_component"] == {"10x50": BASELINE}
+    assert saved["biopython_component"] == {"1000x250": BASELINE}
+    assert "machine" in saved
+    assert compare([result(rows_per_s=50.0)], saved, 0.2)
@@ -0,0 +1,142 @@
+import json
+import os
+
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_index import (METADATA_FILE, FeatureIndex, build_index, key_hashes, shard_path,
+                           shards_of)
+
+
+@pytest.fixture
+def output():
+    """An output of 300 rows, the last 20 rows repeat the sequences of the first 20."""
+    rng = np.random.default_rng(0)
+    checksums = [f"CRC-{i:016X}" for i in range(280)]
+    checksums += checksums[:20]
+    return pd.DataFrame({
+        "id": [f"id_{i}" for i in range(len(checksums))],
+        "sequence_checksum": checksums,
+        "feature_0": rng.random(len(checksums)),
+        "feature_1": rng.integers(0, 100, len(checksums)),
+    }).set_index("id")
+
+
+def build(output, path, **kwargs):
+    build_index(dd.from_pandas(output, npartitions=4), str(path), len(output), **kwargs)
+    return FeatureIndex(str(path))
+
+
+def test_rows_are_returned_in_the_order_of_the_request(output, tmp_path):
+    index = build(output, tmp_path / "index", row_group_size=16)
+    checksums = output["sequence_checksum"].iloc[[250, 30, 120, 42]].tolist()
+
+    result = index.get(checksums)
+
+    assert result["sequence_checksum"].tolist() == checksums
+    expected = output.reset_index().set_index("sequence_checksum").loc[checksums]
+    np.testing.assert_array_equal(result["id"], expected["id"])
+    np.testing.assert_allclose(result["feature_0"], expected["feature_0"])
+    np.testing.assert_array_equal(result["feature_1"], expected["feature_1"])
+
+
+def test_names_are_returned_in_the_order_of_the_request(output, tmp_path):
+    index = build(output, tmp_path / "index", row_group_size=16)
+    names = ["id_299", "id_7", "id_150"]
+
+    result = index.get_by_name(names)
+
+    assert result["id"].tolist() == names
+    assert result["sequence_checksum"].tolist() == output.loc[names, "sequence_checksum"].tolist()
+
+
+def test_a_duplicate_checksum_returns_all_its_rows(output, tmp_path):
+    index = build(output, tmp_path / "index", row_group_size=16)
+    checksum = output["sequence_checksum"].iloc[5]
+
+    result = index.get([checksum, output["sequence_checksum"].iloc[100]])
+
+    assert sorted(result["id"][result["sequence_checksum"] == checksum]) == ["id_285", "id_5"]
+    assert result["sequence_checksum"].tolist() == [checksum, checksum,
+                                                    output["sequence_checksum"].iloc[100]]
+    # a name still has one row
+    assert index.get_by_name(["id_285"])["sequence_checksum"].tolist() == [checksum]
+
+
+def test_missing_keys_have_no_rows(output, tmp_path):
+    index = build(output, tmp_path / "index", row_group_size=16)
+    checksum = output["sequence_checksum"].iloc[40]
+
+    assert index.get(["CRC-UNKNOWN", checksum, "CRC-OTHER"])["sequence_checksum"].tolist() \
+        == [checksum]
+    assert index.get_by_name(["id_unknown", "id_40"])["id"].tolist() == ["id_40"]
+
+    empty = index.get(["CRC-UNKNOWN"])
+    assert empty.empty
+    assert list(empty.columns) == ["sequence_checksum", "id", "feature_0", "feature_1"]
+    assert index.get_by_name([]).empty
+
+
+def test_multi_shard_index_has_the_rows_of_a_single_shard_index(output, tmp_path):
+    single = build(output, tmp_path / "single")
+    sharded = build(output, tmp_path / "sharded", shard_rows=50, row_group_size=8)
+
+    with open(tmp_path / "sharded" / METADATA_FILE) as file:
+        metadata = json.load(file)
+    assert metadata["shard_bits"] == 3 and metadata["rows"] == len(output)
+    shard_rows = [len(pd.read_parquet(shard_path(str(tmp_path / "sharded"), shard)))
+                  for shard in range(8)]
+    assert sum(shard_rows) == len(output) and max(shard_rows) < len(output)
+
+    checksums = output["sequence_checksum"].drop_duplicates().tolist()
+    pd.testing.assert_frame_equal(sharded.get(checksums), single.get(checksums))
+    names = output.index[::-1].tolist()
+    pd.testing.assert_frame_equal(sharded.get_by_name(names), single.get_by_name(names))
+
+
+def test_only_the_requested_columns_are_returned(output, tmp_path):
+    index = build(output, tmp_path / "index", row_group_size=16)
+    checksum = output["sequence_checksum"].iloc[50]
+
+    result = index.get([checksum], columns=["feature_1"])
+
+    assert list(result.columns) == ["sequence_checksum", "id", "feature_1"]
+    assert result["feature_1"].tolist() == [output["feature_1"].iloc[50]]
+    assert list(index.get_by_name(["id_50"], columns=[]).columns) == ["sequence_checksum", "id"]
+    with pytest.raises(ValueError):
+        index.get([checksum], columns=["feature_2"])
+
+
+def test_index_without_names(output, tmp_path):
+    index = build(output, tmp_path / "index", name_column=None)
+
+    assert not os.path.exists(tmp_path / "index" / "name_hashes.npy")
+    assert len(index.get([output["sequence_checksum"].iloc[0]])) == 2
+    with pytest.raises(ValueError):
+        index.get_by_name(["id_0"])
+
+
+def test_a_key_in_an_empty_shard_has_no_rows(tmp_path):
+    output = pd.DataFrame({"id": ["id_0", "id_1", "id_2"], "sequence_checksum": ["A", "B", "C"],
+                           "feature_0": [0.0, 1.0, 2.0]}).set_index("id")
+    index = build(output, tmp_path / "index", shard_rows=1)
+    empty_shards = set(range(4)) - set(shards_of(key_hashes(["A", "B", "C"]), 2).tolist())
+    assert empty_shards
+    checksum = next(f"R{i}" for i in range(100)
+                    if shards_of(key_hashes([f"R{i}"]), 2)[0] in empty_shards)
+
+    assert index.get([checksum]).empty
+    assert index.get([checksum, "B"])["id"].tolist() == ["id_1"]
+
+
+def test_a_key_requested_more_than_once_returns_its_rows_every_time(output, tmp_path):
+    index = build(output, tmp_path / "index", row_group_size=16)
+    first, second = output["sequence_checksum"].iloc[[100, 5]]
+
+    result = index.get([first, second, first])
+
+    assert result["sequence_checksum"].tolist() == [first, second, second, first]
+    assert sorted(result["id"][1:3]) == ["id_285", "id_5"]
+    assert index.get_by_name(["id_7", "id_3", "id_7"])["id"].tolist() == ["id_7", "id_3", "id_7"]
@@ -0,0 +1,68 @@
+import json
+
+import dask.dataframe as dd
+import pandas as pd
+import pytest
+
+import instrumentation
+from instrumentation import METRICS_DIR_VARIABLE, instrumented, span
+
+
+class LengthComponent:
+    def transform(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        with span("length"):
+            dataframe["length"] = dataframe["sequence"].str.len()
+        return dataframe
+
+
+class DaskLengthComponent:
+    def transform(self, dataframe: dd.DataFrame) -> dd.DataFrame:
+        return dataframe.assign(length=dataframe["sequence"].str.len())
+
+
+def test_partitions_are_measured_and_exported(tmp_path, monkeypatch):
+    monkeypatch.setenv(METRICS_DIR_VARIABLE, str(tmp_path))
+    component = instrumented(LengthComponent)()
+
+    component.transform(pd.DataFrame({"sequence": ["MKV", "MKVLA"]}))
+    component.transform(pd.DataFrame({"sequence": ["MA"]}))
+
+    prefix = tmp_path / f"LengthComponent.{instrumentation.os.getpid()}"
+    partitions = [json.loads(line)
+                  for line in (tmp_path / f"{prefix.name}.partitions.jsonl").read_text()
+                  .splitlines()]
+    assert [(p["rows"], p["residues"]) for p in partitions] == [(2, 8), (1, 2)]
+    assert all(p["bytes_out"] > p["bytes_in"] > 0 for p in partitions)
+
+    totals = json.loads((tmp_path / f"{prefix.name}.json").read_text())
+    assert (totals["partitions"], totals["rows"], totals["residues"]) == (2, 3, 10)
+    assert totals["calls"]["length"]["count"] == 2
+    assert totals["calls"]["transform"]["buckets"]["600"] == 2
+
+    prometheus = (tmp_path / f"{prefix.name}.prom").read_text()
+    assert 'component_rows_total{stage="LengthComponent"' in prometheus
+    assert 'call="length",le="+Inf"} 2' in prometheus
+
+
+def test_failed_calls_are_counted(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_STAGE", "FailingStage")
+    registry = instrumentation.metrics()
+
+    with pytest.raises(RuntimeError), span("request"):
+        raise RuntimeError("endpoint is down")
+
+    assert registry.errors == {"request": 1}
+    assert registry.histograms["request"].count == 1
+
+
+def test_dask_components_are_measured_once(tmp_path, monkeypatch):
+    monkeypatch.setenv(METRICS_DIR_VARIABLE, str(tmp_path))
+    dataframe = dd.from_pandas(pd.DataFrame({"sequence": ["MKV"] * 10}), npartitions=2)
+    registry = instrumentation.metrics("DaskLengthComponent")
+    graphs = registry.histograms["graph"].count if "graph" in registry.histograms else 0
+
+    instrumented(DaskLengthComponent)().transform(dataframe)
+
+    totals = json.loads(next(tmp_path.glob("DaskLengthComponent.*.json")).read_text())
+    assert totals["partitions"] == 0
+    assert totals["calls"]["graph"]["count"] == graphs + 1
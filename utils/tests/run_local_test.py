@@ -0,0 +1,96 @@
+import os
+import sys
+
+import dask
+import pandas as pd
+import pytest
+import yaml
+
+pytest.importorskip("fondant")
+pytest.importorskip("Bio")
+pytest.importorskip("peptides")
+
+# pylint: disable=wrong-import-position
+from fondant.core.schema import Type
+
+import run_local
+
+SEQUENCES = ["MKTAYIAKQRQISFVKSHFSRQ", "MAGLKPEVVIRSQQWLLALAVAVLGLLVAGFIAYRW",
+             "mkvlaagivgllla", "ACDEFGHIKLMNPQRSTVWY" * 5] * 4
+
+RENAMES_PIPELINE = """
+import pyarrow as pa
+from fondant.pipeline import Pipeline
+
+pipeline = Pipeline(name="renames", base_path=".fondant")
+dataset = pipeline.read("load_from_parquet", arguments={{"dataset_uri": "{dataset_uri}"}},
+                        produces={{"protein": pa.string(), "length": pa.int32()}})
+dataset.apply("./components/partition_by_length_component",
+              consumes={{"sequence": "protein"}}, produces={{"sequence": "protein"}},
+              arguments={{"max_residues_per_partition": 100}})
+"""
+
+
+@pytest.fixture(autouse=True)
+def local_run():
+    """The Dask settings of the runner, and the imported modules of the components removed."""
+    modules = dict(sys.modules)
+    with dask.config.set({"scheduler": "synchronous", "dataframe.convert-string": False}):
+        yield
+    components_path = os.path.join(run_local.ROOT_PATH, "components") + os.sep
+    for name, module in list(sys.modules.items()):
+        if (getattr(module, "__file__", None) or "").startswith(components_path):
+            del sys.modules[name]
+    sys.modules.update({name: module for name, module in modules.items()
+                        if name not in sys.modules})
+
+
+def produces(component):
+    path = os.path.join(run_local.ROOT_PATH, "components", component, "fondant_component.yaml")
+    with open(path) as file:
+        return {name: pd.ArrowDtype(Type.from_dict(field).value)
+                for name, field in yaml.safe_load(file)["produces"].items()
+                if isinstance(field, dict)}
+
+
+def test_pipeline_runs_until_a_stage(tmp_path):
+    dataset_uri = str(tmp_path / "data.parquet")
+    pd.DataFrame({"sequence": SEQUENCES}).to_parquet(dataset_uri)
+    pipeline = run_local.load_pipeline(os.path.join(run_local.ROOT_PATH, "pipeline.py"))
+
+    features = run_local.run_pipeline(pipeline, dataset_uri, partition_rows=4,
+                                      until="sequence_features_component")
+    assert features.npartitions == 4
+    features = features.compute()
+    result = run_local.run_pipeline(pipeline, dataset_uri, partition_rows=4,
+                                    until="partition_by_length_component")
+    # the Dask component repartitions, the columns it does not consume are joined back
+    assert result.npartitions == 1
+    result = result.compute()
+
+    expected = {**produces("sequence_features_component"),
+                **produces("partition_by_length_component")}
+    assert set(result.columns) == set(expected)
+    assert result.dtypes.to_dict() == {name: expected[name] for name in result.columns}
+    pd.testing.assert_frame_equal(result[features.columns].sort_index(), features.sort_index())
+    assert sorted(result["sequence"]) == sorted(SEQUENCES)
+
+    # only the modules of the last component are loaded
+    component_files = [getattr(module, "__file__", None) or "" for module in sys.modules.values()]
+    assert not any("sequence_features_component" in path for path in component_files)
+    assert "partition_by_length_component" in sys.modules["instrumentation"].__file__
+
+
+def test_columns_are_renamed_and_cast_to_the_types_of_the_spec(tmp_path):
+    dataset_uri = str(tmp_path / "data.parquet")
+    pd.DataFrame({"protein": SEQUENCES,
+                  "length": [len(sequence) for sequence in SEQUENCES]}).to_parquet(dataset_uri)
+    pipeline_path = tmp_path / "pipeline.py"
+    pipeline_path.write_text(RENAMES_PIPELINE.format(dataset_uri=dataset_uri))
+
+    result = run_local.run_pipeline(run_local.load_pipeline(str(pipeline_path))).compute()
+
+    assert result.dtypes.to_dict() == {"protein": pd.ArrowDtype(Type("string").value),
+                                       "length": pd.ArrowDtype(Type("int32").value)}
+    assert (result["protein"].str.len() == result["length"]).all()
+    assert sorted(result["protein"]) == sorted(SEQUENCES)